@@ -0,0 +1,118 @@
+"""
+Corpus de PDF synthétiques (texte en français, tailles variées) pour les benchmarks.
+
+    python -m benchmarks.make_corpus --out benchmarks/corpus
+
+Les PDF sont écrits à la main (police Helvetica standard, encodage WinAnsi),
+sans dépendance supplémentaire.
+"""
+import argparse
+import os
+import random
+
+# nom -> nombre de pages
+CORPUS_SIZES = {"court": 2, "chapitre": 20, "cours": 100, "manuel": 300}
+
+LINES_PER_PAGE = 46
+WORDS_PER_LINE = 12
+
+_VOCABULARY = (
+    "la cellule produit énergie mitochondrie respiration photosynthèse enzyme protéine "
+    "membrane noyau chromosome gène division mitose méiose écosystème population espèce "
+    "évolution sélection naturelle marché prix offre demande équilibre inflation croissance "
+    "révolution empire traité guerre société économie politique culture théorème fonction "
+    "dérivée intégrale limite suite vecteur matrice probabilité variable hypothèse analyse "
+    "concept principe mécanisme processus structure système rôle effet cause conséquence"
+).split()
+
+_LINKS = "de du des et ou car donc ainsi mais avec pour dans par sur".split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_VOCABULARY) if i % 2 == 0 else rng.choice(_LINKS) for i in range(rng.randint(8, 18))]
+    return words[0].capitalize() + " " + " ".join(words[1:]) + "."
+
+
+def _page_lines(rng: random.Random, page_number: int):
+    lines = [f"Chapitre {page_number // 10 + 1} - Section {page_number + 1}", ""]
+    while len(lines) < LINES_PER_PAGE:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(2, 5))).split()
+        for start in range(0, len(paragraph), WORDS_PER_LINE):
+            lines.append(" ".join(paragraph[start : start + WORDS_PER_LINE]))
+        lines.append("")
+    lines = lines[:LINES_PER_PAGE]
+    lines.append(f"Page {page_number + 1}")
+    return lines
+
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + escaped.encode("cp1252", errors="replace") + b")"
+
+
+def write_pdf(path: str, n_pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    objects = []  # contenu des objets 1..N
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    catalog = add(b"")  # rempli plus bas
+    pages = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    page_ids = []
+    for page_number in range(n_pages):
+        stream = [b"BT /F1 10 Tf 14 TL 50 800 Td"]
+        for line in _page_lines(rng, page_number):
+            stream.append(_pdf_string(line) + b" Tj T*")
+        stream.append(b"ET")
+        content = b"\n".join(stream)
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(
+            add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages, font, content_id)
+            )
+        )
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[pages - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, n_pages)
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def build_corpus(out_dir: str, sizes=None):
+    """Écrit le corpus dans `out_dir` (sans réécrire les fichiers existants) ; retourne les chemins."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for seed, (name, n_pages) in enumerate((sizes or CORPUS_SIZES).items()):
+        path = os.path.join(out_dir, f"{name}_{n_pages}p.pdf")
+        if not os.path.exists(path):
+            write_pdf(path, n_pages, seed=seed)
+        paths[name] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "corpus"))
+    args = parser.parse_args()
+    for name, path in build_corpus(args.out).items():
+        print(f"{name:10s} {os.path.getsize(path) / 1024:8.1f} Ko  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Serveur local imitant l'endpoint `POST /v1/responses` d'OpenAI, pour mesurer
+l'application sous charge sans consommer de crédits.
+
+    python -m benchmarks.mock_openai_server --port 8765 --latency 0.4 --error-rate 0.05
+
+Puis lancer l'application (ou le benchmark) avec :
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock
+
+Réglages : latence de base, latence par token de sortie, taux d'erreurs 429/500,
+réponses en streaming (SSE) ou non. `GET /stats` renvoie les compteurs
+(requêtes, erreurs, tokens) utilisés pour l'estimation des coûts.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+
+CANNED_CARDS = [
+    {
+        "question": "Quel est le rôle de la mitochondrie dans la cellule ?",
+        "answer": "Elle produit l’essentiel de l’ATP par la respiration cellulaire.",
+    },
+    {
+        "question": "Pourquoi la photosynthèse est-elle indispensable aux écosystèmes ?",
+        "answer": "Elle convertit l’énergie lumineuse en énergie chimique et libère du dioxygène.",
+    },
+    {
+        "question": "Quelle différence entre mitose et méiose ?",
+        "answer": "La mitose produit deux cellules identiques ; la méiose quatre gamètes haploïdes.",
+    },
+    {
+        "question": "Qu’est-ce qu’une enzyme ?",
+        "answer": "Une protéine qui catalyse une réaction en abaissant son énergie d’activation.",
+    },
+    {
+        "question": "Que décrit la loi de l’offre et de la demande ?",
+        "answer": "La formation du prix d’équilibre par la rencontre de l’offre et de la demande.",
+    },
+]
+
+
+class MockSettings:
+    def __init__(self, latency: float, latency_per_token: float, error_rate: float, chunk_chars: int):
+        self.latency = latency
+        self.latency_per_token = latency_per_token
+        self.error_rate = error_rate
+        self.chunk_chars = chunk_chars
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0}
+        self.ids = itertools.count(1)
+
+    def record(self, **amounts):
+        with self.lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+
+def _requested_cards(prompt: str) -> int:
+    marker = "génère "
+    start = prompt.find(marker)
+    if start != -1:
+        digits = "".join(itertools.takewhile(str.isdigit, prompt[start + len(marker):]))
+        if digits:
+            return int(digits)
+    return 5
+
+
+_DETAILS = (
+    "membrane noyau chromosome gène division mitose méiose écosystème population espèce "
+    "évolution sélection marché prix offre demande équilibre inflation croissance révolution "
+    "empire traité guerre société culture théorème fonction dérivée intégrale limite suite "
+    "vecteur matrice probabilité variable hypothèse analyse principe mécanisme processus"
+).split()
+
+
+def _cards_payload(n_cards: int, structured: bool, salt: int) -> str:
+    rng = random.Random(salt)
+    cards = []
+    for i in range(n_cards):
+        card = dict(CANNED_CARDS[i % len(CANNED_CARDS)])
+        # Détails variés : sinon la déduplication (MinHash) fusionnerait les cartes répétées.
+        details = rng.sample(_DETAILS, 8)
+        card["question"] = f"{card['question']} Relie-le à : {', '.join(details[:4])} (#{salt}-{i + 1})."
+        card["answer"] = f"{card['answer']} Exemples : {', '.join(details[4:])}."
+        cards.append(card)
+    return json.dumps({"cards": cards} if structured else cards, ensure_ascii=False)
+
+
+def _response_object(response_id: str, model: str, text: str, input_tokens: int, output_tokens: int, status: str = "completed"):
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": status,
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_{response_id}",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def make_handler(settings: MockSettings):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with settings.lock:
+                    self._send_json(200, dict(settings.stats))
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/responses"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length", "0"))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            settings.record(requests=1)
+
+            roll = random.random()
+            if roll < settings.error_rate:
+                settings.record(errors=1)
+                if roll < settings.error_rate / 2:
+                    self._send_json(
+                        429,
+                        {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                        {"retry-after": "0.5"},
+                    )
+                else:
+                    self._send_json(500, {"error": {"message": "Internal error", "type": "server_error"}})
+                return
+
+            prompt = request.get("input") or ""
+            if not isinstance(prompt, str):
+                prompt = json.dumps(prompt, ensure_ascii=False)
+            model = request.get("model", "gpt-4o-mini")
+            structured = bool((request.get("text") or {}).get("format"))
+            response_id = f"resp_mock_{next(settings.ids)}"
+            text = _cards_payload(_requested_cards(prompt), structured, salt=hash(prompt) % 10_000)
+            input_tokens = len(prompt) // CHARS_PER_TOKEN + 1
+            output_tokens = len(text) // CHARS_PER_TOKEN + 1
+            settings.record(input_tokens=input_tokens, output_tokens=output_tokens)
+
+            time.sleep(settings.latency)
+            if request.get("stream"):
+                self._stream(response_id, model, text, input_tokens, output_tokens)
+            else:
+                time.sleep(settings.latency_per_token * output_tokens)
+                self._send_json(200, _response_object(response_id, model, text, input_tokens, output_tokens))
+
+        def _stream(self, response_id, model, text, input_tokens, output_tokens):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            sequence = itertools.count()
+
+            def send(event_type, payload):
+                payload = {"type": event_type, "sequence_number": next(sequence), **payload}
+                data = json.dumps(payload, ensure_ascii=False)
+                self.wfile.write(f"event: {event_type}\ndata: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            send(
+                "response.created",
+                {"response": _response_object(response_id, model, "", 0, 0, status="in_progress")},
+            )
+            for start in range(0, len(text), settings.chunk_chars):
+                delta = text[start : start + settings.chunk_chars]
+                time.sleep(settings.latency_per_token * max(1, len(delta) // CHARS_PER_TOKEN))
+                send(
+                    "response.output_text.delta",
+                    {"item_id": f"msg_{response_id}", "output_index": 0, "content_index": 0, "delta": delta},
+                )
+            send(
+                "response.completed",
+                {"response": _response_object(response_id, model, text, input_tokens, output_tokens)},
+            )
+            self.close_connection = True
+
+    return Handler
+
+
+def start_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.3,
+    latency_per_token: float = 0.002,
+    error_rate: float = 0.0,
+    chunk_chars: int = 24,
+):
+    """Démarre le serveur dans un thread ; retourne `(serveur, réglages)`. Port 0 = port libre."""
+    settings = MockSettings(latency, latency_per_token, error_rate, chunk_chars)
+    server = ThreadingHTTPServer((host, port), make_handler(settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server, settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="latence de base (s)")
+    parser.add_argument("--latency-per-token", type=float, default=0.002, help="latence par token de sortie (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="proportion de réponses 429/500")
+    args = parser.parse_args()
+
+    server, _ = start_server(args.host, args.port, args.latency, args.latency_per_token, args.error_rate)
+    print(f"Mock OpenAI sur http://{args.host}:{server.server_address[1]}/v1 (Ctrl+C pour arrêter)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
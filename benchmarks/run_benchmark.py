@@ -0,0 +1,259 @@
+"""
+Benchmark de bout en bout : extraction PDF, générateur hors ligne et génération
+OpenAI (contre le serveur local `mock_openai_server`, sans coût réel).
+
+    python -m benchmarks.run_benchmark --iterations 5 --json bench.json
+    python -m benchmarks.run_benchmark --baseline bench.json --max-regression 0.2
+
+Chaque étape rapporte la latence p50/p95, le débit, le pic mémoire Python
+(tracemalloc) ; le rapport inclut le pic RSS du processus et une estimation du
+coût OpenAI aux tarifs de `--price-input` / `--price-output` (USD par million
+de tokens). Avec `--baseline`, le script échoue si un p95 régresse au-delà du seuil.
+
+Les étapes appellent les mêmes fonctions que l'application, hors interface
+Streamlit : `iter_document_pages` (derrière `extract_text_from_pdf`),
+`build_flashcards_from_text`, et `stream_cards` / `generate_deck` (derrière
+`generate_flashcards_with_openai` et son mode par morceaux).
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+from benchmarks.make_corpus import build_corpus
+from benchmarks.mock_openai_server import start_server
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class StageResult:
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.latencies = []
+        self.items = 0
+        self.peak_bytes = 0
+
+    def measure(self, fn):
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            items = fn()
+        finally:
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.latencies.append(elapsed)
+        self.items += items
+        self.peak_bytes = max(self.peak_bytes, peak)
+        return elapsed
+
+    def summary(self) -> dict:
+        total = sum(self.latencies)
+        return {
+            "p50_s": _percentile(self.latencies, 0.5),
+            "p95_s": _percentile(self.latencies, 0.95),
+            "mean_s": statistics.fmean(self.latencies) if self.latencies else 0.0,
+            "throughput": self.items / total if total else 0.0,
+            "unit": self.unit,
+            "python_peak_mb": self.peak_bytes / (1024 * 1024),
+            "runs": len(self.latencies),
+        }
+
+
+def _bench_extraction(paths, iterations: int, workers: int, results: dict):
+    from caching import TieredCache
+    from pdf_extraction import ExtractionPool, iter_document_pages
+
+    documents = []
+    for path in paths.values():
+        with open(path, "rb") as f:
+            documents.append((os.path.basename(path), f.read()))
+
+    pool = ExtractionPool(max_workers=workers) if workers > 0 else None
+    cold = StageResult(f"extraction ({workers} workers)", "pages/s")
+    warm = StageResult("extraction (cache)", "pages/s")
+    texts = {}
+    try:
+        for _ in range(iterations):
+            cache = TieredCache(256 * 1024 * 1024, None, 0)
+
+            def _cold():
+                pages = list(iter_document_pages(documents, cache=cache, pool=pool))
+                return len(pages)
+
+            def _warm():
+                return sum(1 for _ in iter_document_pages(documents, cache=cache, pool=pool))
+
+            cold.measure(_cold)
+            warm.measure(_warm)
+        for name, data in documents:
+            texts[name] = "\n".join(iter_document_pages([(name, data)], pool=pool))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    results[cold.name] = cold.summary()
+    results[warm.name] = warm.summary()
+    return texts
+
+
+def _bench_offline(texts, iterations: int, n_cards: int, results: dict):
+    from offline_generator import build_flashcards_from_text
+
+    for name, text in texts.items():
+        stage = StageResult(f"hors ligne {name}", "cartes/s")
+        for _ in range(iterations):
+            stage.measure(lambda: len(build_flashcards_from_text(text, n_cards)))
+        results[stage.name] = stage.summary()
+
+
+def _bench_openai(texts, iterations: int, n_cards: int, results: dict):
+    from generation import generate_deck, iter_paragraphs, stream_cards
+    from openai_scheduler import RequestScheduler
+
+    scheduler = RequestScheduler(api_key=os.environ.get("OPENAI_API_KEY", "mock"))
+    shortest = min(texts.values(), key=len)
+
+    single = StageResult("openai streaming", "cartes/s")
+    first_card = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        arrivals = []
+        single.measure(
+            lambda: len(stream_cards(scheduler, shortest, n_cards, lambda card: arrivals.append(time.perf_counter())))
+        )
+        if arrivals:
+            first_card.append(arrivals[0] - started)
+    summary = single.summary()
+    summary["first_card_p50_s"] = _percentile(first_card, 0.5)
+    summary["first_card_p95_s"] = _percentile(first_card, 0.95)
+    results[single.name] = summary
+
+    for name, text in texts.items():
+        stage = StageResult(f"openai par morceaux {name}", "cartes/s")
+        for _ in range(iterations):
+            stage.measure(lambda: len(generate_deck(scheduler, iter_paragraphs([text]), n_cards)[0]))
+        results[stage.name] = stage.summary()
+
+
+def _mock_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(base_url.rsplit("/v1", 1)[0] + "/stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def _print_report(report: dict):
+    print(f"{'étape':40s} {'p50 (s)':>9s} {'p95 (s)':>9s} {'débit':>12s} {'pic Py (Mo)':>12s}")
+    for name, stage in report["stages"].items():
+        throughput = f"{stage['throughput']:.1f} {stage['unit']}"
+        print(
+            f"{name:40s} {stage['p50_s']:9.3f} {stage['p95_s']:9.3f} {throughput:>12s} "
+            f"{stage['python_peak_mb']:12.1f}"
+        )
+        if "first_card_p50_s" in stage:
+            print(f"{'  première carte':40s} {stage['first_card_p50_s']:9.3f} {stage['first_card_p95_s']:9.3f}")
+    print(f"\nPic RSS du processus : {report['max_rss_mb']:.1f} Mo")
+    if "cost" in report:
+        cost = report["cost"]
+        print(
+            f"OpenAI : {cost['requests']} requêtes, {cost['input_tokens']} tokens en entrée, "
+            f"{cost['output_tokens']} en sortie ≈ {cost['usd']:.4f} USD"
+        )
+
+
+def _compare(report: dict, baseline: dict, max_regression: float):
+    regressions = []
+    for name, stage in report["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous or previous["p95_s"] <= 0:
+            continue
+        ratio = stage["p95_s"] / previous["p95_s"] - 1
+        if ratio > max_regression:
+            regressions.append(f"{name} : p95 {previous['p95_s']:.3f}s → {stage['p95_s']:.3f}s (+{ratio:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--cards", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(__file__), "corpus"))
+    parser.add_argument("--skip", action="append", default=[], choices=["extraction", "offline", "openai"])
+    parser.add_argument("--base-url", help="serveur OpenAI à utiliser (par défaut : mock local)")
+    parser.add_argument("--latency", type=float, default=0.3, help="latence du mock (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="taux d'erreurs du mock")
+    parser.add_argument("--price-input", type=float, default=0.15, help="USD / million de tokens en entrée")
+    parser.add_argument("--price-output", type=float, default=0.60, help="USD / million de tokens en sortie")
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--baseline", help="rapport JSON de référence")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Aucun cache disque partagé avec une installation réelle.
+    os.environ.setdefault("FLASHCARDS_CACHE_DIR", tempfile.mkdtemp(prefix="flashcards-bench-"))
+
+    server = None
+    base_url = args.base_url
+    if "openai" not in args.skip and base_url is None:
+        server, _ = start_server(latency=args.latency, error_rate=args.error_rate)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    if base_url:
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "mock")
+
+    paths = build_corpus(args.corpus)
+    stages = {}
+    texts = {}
+    if "extraction" not in args.skip:
+        texts = _bench_extraction(paths, args.iterations, args.workers, stages)
+    else:
+        from pdf_extraction import iter_document_pages
+
+        for path in paths.values():
+            with open(path, "rb") as f:
+                texts[os.path.basename(path)] = "\n".join(iter_document_pages([(path, f.read())]))
+    if "offline" not in args.skip:
+        _bench_offline(texts, args.iterations, args.cards, stages)
+    if "openai" not in args.skip:
+        _bench_openai(texts, args.iterations, args.cards, stages)
+
+    report = {
+        "stages": stages,
+        # ru_maxrss est en kilo-octets sous Linux.
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if server is not None:
+        mock = _mock_stats(base_url)
+        mock["usd"] = (
+            mock["input_tokens"] * args.price_input + mock["output_tokens"] * args.price_output
+        ) / 1_000_000
+        report["cost"] = mock
+        server.shutdown()
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRégressions :", *regressions, sep="\n  ")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
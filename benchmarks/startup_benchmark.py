@@ -0,0 +1,159 @@
+"""
+Benchmark du démarrage : démarrage à froid et reruns de `streamlit_app.py`.
+
+    python -m benchmarks.startup_benchmark --iterations 5 --json startup.json
+    python -m benchmarks.startup_benchmark --baseline startup.json --max-regression 0.2
+
+Chaque itération lance un interpréteur neuf (`streamlit.testing.v1.AppTest`,
+sans serveur ni navigateur) et mesure :
+- « démarrage à froid » : du lancement du processus à la fin du premier rendu
+  (imports compris) ;
+- « import streamlit » et « premier rendu » séparément ;
+- « rerun » : les rendus suivants, ressources partagées déjà construites.
+
+Le rapport liste aussi les bibliothèques lourdes (pdfplumber, yake, openai)
+chargées par le premier rendu : elles ne doivent l'être qu'à la première
+extraction ou génération. Avec `--importtime`, les imports les plus coûteux du
+premier rendu sont affichés (`python -X importtime`).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run_benchmark import _compare, _percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pdfplumber", "yake", "openai")
+
+
+def _child(reruns: int):
+    """Exécuté dans l'interpréteur neuf : premier rendu puis `reruns` reruns."""
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    imported = time.perf_counter()
+    app = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=120)
+    app.run()
+    first = time.perf_counter()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    timings = []
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - t0)
+    print(
+        json.dumps(
+            {
+                "import_s": imported - started,
+                "first_run_s": first - imported,
+                "reruns_s": timings,
+                "heavy_modules": loaded,
+            }
+        )
+    )
+
+
+def _run_child(reruns: int, importtime: bool, env: dict):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-m", "benchmarks.startup_benchmark", "--child", "--reruns", str(reruns)]
+    started = time.perf_counter()
+    result = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - started
+    payload = json.loads(result.stdout.strip().splitlines()[-1])
+    payload["cold_start_s"] = elapsed
+    payload["importtime"] = result.stderr if importtime else ""
+    return payload
+
+
+def _top_imports(stderr: str, limit: int = 15):
+    """Imports de plus fort coût cumulé (µs) d'une sortie `-X importtime`."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    # Seuls les modules de premier niveau : leurs sous-modules sont déjà comptés.
+    top_level = [(us, name) for us, name in rows if "." not in name]
+    return sorted(top_level, reverse=True)[:limit]
+
+
+def _stage(values, unit: str = "s") -> dict:
+    return {
+        "p50_s": _percentile(values, 0.5),
+        "p95_s": _percentile(values, 0.95),
+        "runs": len(values),
+        "unit": unit,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3, help="démarrages à froid (processus neufs)")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns mesurés par démarrage")
+    parser.add_argument("--importtime", action="store_true", help="affiche les imports les plus coûteux")
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--baseline", help="rapport JSON de référence")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.reruns)
+        return
+
+    # Aucune donnée partagée avec une installation réelle.
+    scratch = tempfile.mkdtemp(prefix="flashcards-startup-")
+    env = dict(os.environ)
+    env.setdefault("FLASHCARDS_CACHE_DIR", os.path.join(scratch, "cache"))
+    env.setdefault("FLASHCARDS_DATA_DIR", os.path.join(scratch, "data"))
+
+    runs = [_run_child(args.reruns, args.importtime and i == 0, env) for i in range(args.iterations)]
+    report = {
+        "stages": {
+            "démarrage à froid": _stage([run["cold_start_s"] for run in runs]),
+            "import streamlit": _stage([run["import_s"] for run in runs]),
+            "premier rendu": _stage([run["first_run_s"] for run in runs]),
+            "rerun": _stage([t for run in runs for t in run["reruns_s"]]),
+        },
+        "heavy_modules": sorted({name for run in runs for name in run["heavy_modules"]}),
+    }
+
+    print(f"{'étape':24s} {'p50 (s)':>9s} {'p95 (s)':>9s} {'mesures':>8s}")
+    for name, stage in report["stages"].items():
+        print(f"{name:24s} {stage['p50_s']:9.3f} {stage['p95_s']:9.3f} {stage['runs']:8d}")
+    loaded = ", ".join(report["heavy_modules"]) or "aucune"
+    print(f"\nBibliothèques lourdes chargées au premier rendu : {loaded}")
+    if args.importtime:
+        print("\nImports les plus coûteux (cumulé) :")
+        for us, name in _top_imports(runs[0]["importtime"]):
+            print(f"  {us / 1000:9.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    failed = False
+    if report["heavy_modules"]:
+        print("\nÉchec : ces bibliothèques doivent être importées à la demande.")
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRégressions :", *regressions, sep="\n  ")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Cache à deux niveaux pour les résultats coûteux (texte extrait des PDF,
+réponses OpenAI, etc.) :
+- un niveau mémoire LRU limité en octets, propre au processus ;
+- un niveau disque SQLite limité en taille, partagé entre les processus.
+Les clés sont des empreintes SHA-256 du contenu, les valeurs des chaînes.
+Une durée de vie (TTL) optionnelle s'applique aux deux niveaux.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def default_cache_dir() -> str:
+    return os.getenv(
+        "FLASHCARDS_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "flashcards-generator"),
+    )
+
+
+def default_data_dir() -> str:
+    """Dossier des données durables (files d'attente, decks), à ne pas purger comme un cache."""
+    return os.getenv(
+        "FLASHCARDS_DATA_DIR",
+        os.path.join(os.path.expanduser("~"), ".local", "share", "flashcards-generator"),
+    )
+
+
+def sha256_digest(data) -> str:
+    """Empreinte SHA-256 (hex) de bytes, d'un memoryview ou d'une chaîne."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _value_size(value: str) -> int:
+    return len(value.encode("utf-8"))
+
+
+class MemoryLRU:
+    """LRU en mémoire dont le budget est exprimé en octets (UTF-8) et non en entrées."""
+
+    def __init__(self, max_bytes: int, ttl: float | None = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size, created_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl is not None and time.time() - entry[2] > self.ttl:
+                del self._entries[key]
+                self.current_bytes -= entry[1]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: str) -> int:
+        """Insère la valeur et retourne le nombre d'entrées évincées."""
+        size = _value_size(value)
+        if size > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (value, size, time.time())
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, old_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= old_size
+                evicted += 1
+        return evicted
+
+    def discard(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskStore:
+    """
+    Stockage SQLite avec plafond de taille ; évince les entrées les moins récemment
+    lues. Les entrées plus vieilles que `ttl` secondes sont traitées comme absentes.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: float | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and time.time() - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str) -> int:
+        """Écrit la valeur et retourne le nombre d'entrées évincées pour tenir le plafond."""
+        size = _value_size(value)
+        if size > self.max_bytes:
+            return 0
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            evicted = self._evict_locked()
+            self._conn.commit()
+        return evicted
+
+    def _evict_locked(self) -> int:
+        if self.ttl is not None:
+            self._conn.execute(
+                "DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        evicted = 0
+        if total <= self.max_bytes:
+            return 0
+        rows = self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed_at ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        return evicted
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+
+
+class TieredCache:
+    """
+    Façade mémoire + disque. Une lecture disque réussie réchauffe le niveau mémoire.
+    Les compteurs (hits, misses, évictions) sont exposés par `stats()`.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int,
+        disk_path: str | None,
+        disk_bytes: int,
+        ttl: float | None = None,
+    ):
+        self.memory = MemoryLRU(memory_bytes, ttl)
+        self.disk = DiskStore(disk_path, disk_bytes, ttl) if disk_path else None
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, amount: int = 1):
+        if amount:
+            with self._lock:
+                self._counters[name] += amount
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error:
+                value = None
+            if value is not None:
+                self._count("disk_hits")
+                self._count("memory_evictions", self.memory.put(key, value))
+                return value
+        self._count("misses")
+        return None
+
+    def put(self, key: str, value: str):
+        self._count("memory_evictions", self.memory.put(key, value))
+        if self.disk is not None:
+            try:
+                self._count("disk_evictions", self.disk.put(key, value))
+            except sqlite3.Error:
+                pass
+
+    def invalidate(self, key: str):
+        self.memory.discard(key)
+        if self.disk is not None:
+            try:
+                self.disk.delete(key)
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (
+            (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        )
+        stats["memory_entries"] = len(self.memory)
+        stats["memory_bytes"] = self.memory.current_bytes
+        return stats
@@ -0,0 +1,634 @@
+"""
+Stockage persistant des jeux de cartes (SQLite en mode WAL).
+
+Les jeux sont rangés par utilisateur et par nom ; les cartes sont lues par
+pages (`window`) pour que la session Streamlit ne garde qu'une petite fenêtre
+compacte du jeu en cours. Import / export en JSON ou CSV.
+
+Les clés de bande MinHash de chaque carte (`card_bands`, voir `dedup`) sont
+gardées avec elle : un ajout avec `dedupe=True` écarte les quasi-doublons des
+cartes déjà présentes en n'examinant que celles qui partagent une bande.
+
+Chaque carte a aussi un état de répétition espacée (`card_state`, indexé par
+date d'échéance) et un journal des révisions, écrits par lots (`save_reviews`).
+Un remplacement garde l'état et l'historique des cartes dont la question et la
+réponse n'ont pas changé ; les entrées du journal des cartes retirées restent,
+avec la position -1.
+
+Les cartes et les paragraphes des documents sources (`sources`) sont indexés
+en plein texte (FTS5, score BM25, normalisation `search`) dans la même
+transaction que leur écriture : `search` interroge tous les jeux d'un
+utilisateur sans les parcourir.
+"""
+import csv
+import heapq
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dedup import DEFAULT_THRESHOLD, NearDuplicateIndex, band_keys, card_text, signature, similarity
+from search import fts_query, normalize
+
+DEFAULT_EASE = 2.5
+
+# Clé d'une entrée de l'index : rowid = (deck_id << 32) | (type << 31) | position,
+# pour supprimer ou filtrer les entrées d'un jeu par intervalle de rowid.
+SEARCH_CARD = 0
+SEARCH_SOURCE = 1
+# Poids BM25 des colonnes (titre : question ou nom du document ; corps).
+SEARCH_WEIGHTS = (2.0, 1.0)
+
+
+def _search_rowid(deck_id: int, kind: int, position: int) -> int:
+    return (deck_id << 32) | (kind << 31) | position
+
+
+def _search_range(deck_id: int, kind: int):
+    return _search_rowid(deck_id, kind, 0), _search_rowid(deck_id, kind, (1 << 31) - 1)
+
+
+def _search_ranges(deck_ids):
+    """Intervalles de rowid couvrant les entrées des jeux `deck_ids` : un par suite d'identifiants consécutifs."""
+    ranges = []
+    for deck_id in sorted(deck_ids):
+        if ranges and ranges[-1][1] == deck_id - 1:
+            ranges[-1][1] = deck_id
+        else:
+            ranges.append([deck_id, deck_id])
+    return [(_search_rowid(first, 0, 0), _search_rowid(last + 1, 0, 0) - 1) for first, last in ranges]
+
+
+class CardWindow:
+    """
+    Cartes consécutives `[offset, offset + len)` d'un jeu, stockées en deux
+    tuples de chaînes plutôt qu'en liste de dicts (moins d'objets par session).
+    """
+
+    __slots__ = ("offset", "questions", "answers")
+
+    def __init__(self, offset: int = 0, questions=(), answers=()):
+        self.offset = offset
+        self.questions = tuple(questions)
+        self.answers = tuple(answers)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __contains__(self, idx: int) -> bool:
+        return self.offset <= idx < self.offset + len(self.questions)
+
+    def card(self, idx: int):
+        """Retourne `(question, réponse)` de la carte `idx` (indice dans le jeu)."""
+        return self.questions[idx - self.offset], self.answers[idx - self.offset]
+
+
+class DeckStore:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS decks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user TEXT NOT NULL,
+                name TEXT NOT NULL,
+                card_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (user, name)
+            );
+            CREATE TABLE IF NOT EXISTS cards (
+                deck_id INTEGER NOT NULL REFERENCES decks (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                PRIMARY KEY (deck_id, position)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS card_bands (
+                deck_id INTEGER NOT NULL REFERENCES decks (id) ON DELETE CASCADE,
+                band INTEGER NOT NULL,
+                key INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (deck_id, band, key, position)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS card_state (
+                deck_id INTEGER NOT NULL REFERENCES decks (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                ease REAL NOT NULL,
+                interval REAL NOT NULL,
+                repetitions INTEGER NOT NULL,
+                lapses INTEGER NOT NULL,
+                due REAL NOT NULL,
+                PRIMARY KEY (deck_id, position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS card_state_due ON card_state (deck_id, due);
+            CREATE TABLE IF NOT EXISTS review_log (
+                deck_id INTEGER NOT NULL REFERENCES decks (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                grade INTEGER NOT NULL,
+                reviewed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS review_log_card ON review_log (deck_id, position);
+            CREATE TABLE IF NOT EXISTS sources (
+                deck_id INTEGER NOT NULL REFERENCES decks (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                document TEXT NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (deck_id, position)
+            ) WITHOUT ROWID;
+            """
+        )
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5 ("
+                "title, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '3 4 5')"
+            )
+            self.search_enabled = True
+        except sqlite3.OperationalError:
+            # SQLite compilé sans FTS5 : le reste du stockage fonctionne, sans recherche.
+            self.search_enabled = False
+        # Jeux créés avant la répétition espacée : leurs cartes deviennent « nouvelles ».
+        self._conn.execute(
+            "INSERT OR IGNORE INTO card_state (deck_id, position, ease, interval, repetitions, lapses, due) "
+            "SELECT deck_id, position, ?, 0, 0, 0, position * 1e-6 FROM cards",
+            (DEFAULT_EASE,),
+        )
+        if self.search_enabled:
+            self._backfill_search_index()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _deck_id(self, user: str, name: str, create: bool = False):
+        row = self._conn.execute(
+            "SELECT id FROM decks WHERE user = ? AND name = ?", (user, name)
+        ).fetchone()
+        if row is not None:
+            return row["id"]
+        if not create:
+            return None
+        now = time.time()
+        return self._conn.execute(
+            "INSERT INTO decks (user, name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (user, name, now, now),
+        ).lastrowid
+
+    def create_deck(self, user: str, name: str):
+        with self._lock:
+            self._deck_id(user, name, create=True)
+
+    def list_decks(self, user: str):
+        rows = self._execute(
+            "SELECT name, card_count, updated_at FROM decks WHERE user = ? ORDER BY name", (user,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _backfill_search_index(self):
+        """Indexe, une seule fois, les cartes enregistrées avant la recherche."""
+        if self._conn.execute("SELECT 1 FROM search_index LIMIT 1").fetchone() is not None:
+            return
+        rows = self._conn.execute("SELECT deck_id, position, question, answer FROM cards").fetchall()
+        if not rows:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT INTO search_index (rowid, title, body) VALUES (?, ?, ?)",
+                (
+                    (_search_rowid(deck_id, SEARCH_CARD, position), normalize(question), normalize(answer))
+                    for deck_id, position, question, answer in rows
+                ),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _index(self, deck_id: int, kind: int, entries, replace: bool):
+        """Met à jour l'index d'un jeu ; `entries` : `(position, titre, corps)`."""
+        if not self.search_enabled:
+            return
+        if replace:
+            self._conn.execute(
+                "DELETE FROM search_index WHERE rowid BETWEEN ? AND ?", _search_range(deck_id, kind)
+            )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO search_index (rowid, title, body) VALUES (?, ?, ?)",
+            (
+                (_search_rowid(deck_id, kind, position), normalize(title), normalize(body))
+                for position, title, body in entries
+            ),
+        )
+
+    def _insert_bands(self, deck_id: int, start: int, signatures):
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO card_bands (deck_id, band, key, position) VALUES (?, ?, ?, ?)",
+            (
+                (deck_id, band, key, position)
+                for position, sig in enumerate(signatures, start=start)
+                for band, key in enumerate(band_keys(sig))
+            ),
+        )
+
+    def _ensure_bands(self, deck_id: int, count: int):
+        """Clés de bande d'un jeu enregistré avant leur introduction (une seule fois par jeu)."""
+        has_bands = self._conn.execute(
+            "SELECT 1 FROM card_bands WHERE deck_id = ? LIMIT 1", (deck_id,)
+        ).fetchone()
+        if count and has_bands is None:
+            rows = self._conn.execute(
+                "SELECT question, answer FROM cards WHERE deck_id = ? ORDER BY position", (deck_id,)
+            ).fetchall()
+            self._insert_bands(deck_id, 0, (signature(f"{q} {a}") for q, a in rows))
+
+    def _is_stored_duplicate(self, deck_id: int, sig, threshold: float) -> bool:
+        """Vrai si une carte du jeu partageant une bande avec `sig` est un quasi-doublon."""
+        candidates = set()
+        for band, key in enumerate(band_keys(sig)):
+            candidates.update(
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT position FROM card_bands WHERE deck_id = ? AND band = ? AND key = ?",
+                    (deck_id, band, key),
+                )
+            )
+        for position in candidates:
+            row = self._conn.execute(
+                "SELECT question, answer FROM cards WHERE deck_id = ? AND position = ?",
+                (deck_id, position),
+            ).fetchone()
+            if row is not None and similarity(sig, signature(f"{row[0]} {row[1]}")) >= threshold:
+                return True
+        return False
+
+    def _clear_cards(self, deck_id: int):
+        """
+        Vide le jeu avant un remplacement. Retourne, par couple (question, réponse),
+        les anciennes positions et états (dans l'ordre du jeu). Le journal des
+        révisions est gardé : ses positions passent à `-2 - position` jusqu'à
+        `_carry_over`.
+        """
+        previous = {}
+        for row in self._conn.execute(
+            "SELECT c.position, c.question, c.answer, s.ease, s.interval, s.repetitions, s.lapses, s.due "
+            "FROM cards c LEFT JOIN card_state s ON s.deck_id = c.deck_id AND s.position = c.position "
+            "WHERE c.deck_id = ? ORDER BY c.position",
+            (deck_id,),
+        ):
+            previous.setdefault((row[1], row[2]), []).append((row[0], tuple(row[3:])))
+        for table in ("cards", "card_bands", "card_state"):
+            self._conn.execute(f"DELETE FROM {table} WHERE deck_id = ?", (deck_id,))
+        self._conn.execute(
+            "UPDATE review_log SET position = -2 - position WHERE deck_id = ? AND position >= 0", (deck_id,)
+        )
+        return previous
+
+    def _carry_over(self, deck_id: int, cards, previous):
+        """
+        Reprend l'état et le journal des cartes inchangées d'un remplacement ;
+        retourne leurs nouvelles positions.
+        """
+        states, moves = [], []
+        for position, card in enumerate(cards):
+            matches = previous.get((card["question"], card["answer"]))
+            if not matches:
+                continue
+            old_position, state = matches.pop(0)
+            moves.append((position, deck_id, -2 - old_position))
+            if state[0] is not None:
+                states.append((deck_id, position, *state))
+        self._conn.executemany(
+            "UPDATE review_log SET position = ? WHERE deck_id = ? AND position = ?", moves
+        )
+        self._conn.executemany(
+            "INSERT INTO card_state (deck_id, position, ease, interval, repetitions, lapses, due) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            states,
+        )
+        # Entrées du journal des cartes retirées.
+        self._conn.execute("UPDATE review_log SET position = -1 WHERE deck_id = ? AND position < -1", (deck_id,))
+        return {row[1] for row in states}
+
+    def _write_cards(
+        self, user: str, name: str, cards, replace: bool, dedupe: bool, threshold: float
+    ) -> tuple[int, int]:
+        """Écrit `cards` (remplacement ou ajout) ; retourne `(cartes enregistrées, taille du jeu)`."""
+        cards = list(cards)
+        # MinHash calculé hors verrou : c'est la partie coûteuse de l'écriture.
+        signatures = [signature(card_text(card)) for card in cards]
+        if dedupe:
+            batch = NearDuplicateIndex(threshold)
+            kept = [i for i, sig in enumerate(signatures) if batch.add_signature(sig)]
+            cards = [cards[i] for i in kept]
+            signatures = [signatures[i] for i in kept]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deck_id = self._deck_id(user, name, create=True)
+                kept_states = set()
+                if replace:
+                    previous = self._clear_cards(deck_id)
+                    start = 0
+                else:
+                    start = self._conn.execute(
+                        "SELECT card_count FROM decks WHERE id = ?", (deck_id,)
+                    ).fetchone()[0]
+                    if dedupe and start:
+                        self._ensure_bands(deck_id, start)
+                        kept = [
+                            i
+                            for i, sig in enumerate(signatures)
+                            if not self._is_stored_duplicate(deck_id, sig, threshold)
+                        ]
+                        cards = [cards[i] for i in kept]
+                        signatures = [signatures[i] for i in kept]
+                self._conn.executemany(
+                    "INSERT INTO cards (deck_id, position, question, answer) VALUES (?, ?, ?, ?)",
+                    (
+                        (deck_id, position, card["question"], card["answer"])
+                        for position, card in enumerate(cards, start=start)
+                    ),
+                )
+                self._insert_bands(deck_id, start, signatures)
+                self._index(
+                    deck_id,
+                    SEARCH_CARD,
+                    (
+                        (position, card["question"], card["answer"])
+                        for position, card in enumerate(cards, start=start)
+                    ),
+                    replace,
+                )
+                if replace:
+                    kept_states = self._carry_over(deck_id, cards, previous)
+                count = self._conn.execute(
+                    "SELECT COUNT(*) FROM cards WHERE deck_id = ?", (deck_id,)
+                ).fetchone()[0]
+                # Nouvelles cartes : à réviser tout de suite, dans l'ordre du jeu.
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO card_state "
+                    "(deck_id, position, ease, interval, repetitions, lapses, due) "
+                    "VALUES (?, ?, ?, 0, 0, 0, ?)",
+                    (
+                        (deck_id, position, DEFAULT_EASE, now + position * 1e-6)
+                        for position in range(start, count)
+                        if position not in kept_states
+                    ),
+                )
+                self._conn.execute(
+                    "UPDATE decks SET card_count = ?, updated_at = ? WHERE id = ?",
+                    (count, time.time(), deck_id),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(cards), count
+
+    def replace_cards(
+        self, user: str, name: str, cards, dedupe: bool = False, threshold: float = DEFAULT_THRESHOLD
+    ) -> int:
+        """
+        Remplace le contenu du jeu (créé au besoin) en une transaction ; retourne sa taille.
+        Avec `dedupe`, les quasi-doublons de `cards` ne sont pas enregistrés. Les
+        cartes déjà présentes (même question, même réponse) gardent leur état de
+        répétition espacée et leur historique.
+        """
+        return self._write_cards(user, name, cards, True, dedupe, threshold)[1]
+
+    def append_cards(
+        self, user: str, name: str, cards, dedupe: bool = False, threshold: float = DEFAULT_THRESHOLD
+    ) -> int:
+        """
+        Ajoute des cartes à la fin du jeu (créé au besoin) ; retourne sa taille.
+        Avec `dedupe`, les quasi-doublons (entre elles ou d'une carte du jeu) sont écartés.
+        """
+        return self._write_cards(user, name, cards, False, dedupe, threshold)[1]
+
+    def count(self, user: str, name: str) -> int:
+        row = self._execute(
+            "SELECT card_count FROM decks WHERE user = ? AND name = ?", (user, name)
+        ).fetchone()
+        return row["card_count"] if row is not None else 0
+
+    def _page_rows(self, user: str, name: str, offset: int, limit: int):
+        return self._execute(
+            "SELECT c.question, c.answer FROM cards c JOIN decks d ON d.id = c.deck_id "
+            "WHERE d.user = ? AND d.name = ? AND c.position >= ? ORDER BY c.position LIMIT ?",
+            (user, name, offset, limit),
+        ).fetchall()
+
+    def page(self, user: str, name: str, offset: int, limit: int):
+        """Cartes `[offset, offset + limit)` du jeu, dans l'ordre."""
+        return [dict(row) for row in self._page_rows(user, name, offset, limit)]
+
+    def window(self, user: str, name: str, offset: int, limit: int) -> CardWindow:
+        """Comme `page`, sous forme de `CardWindow`."""
+        rows = self._page_rows(user, name, offset, limit)
+        return CardWindow(offset, (row[0] for row in rows), (row[1] for row in rows))
+
+    def iter_cards(self, user: str, name: str, batch: int = 500):
+        offset = 0
+        while True:
+            cards = self.page(user, name, offset, batch)
+            if not cards:
+                return
+            yield from cards
+            offset += len(cards)
+
+    def delete_deck(self, user: str, name: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deck_id = self._deck_id(user, name)
+                if deck_id is not None:
+                    for table in ("cards", "card_bands", "card_state", "review_log", "sources"):
+                        self._conn.execute(f"DELETE FROM {table} WHERE deck_id = ?", (deck_id,))
+                    if self.search_enabled:
+                        self._conn.execute(
+                            "DELETE FROM search_index WHERE rowid BETWEEN ? AND ?",
+                            (_search_range(deck_id, SEARCH_CARD)[0], _search_range(deck_id, SEARCH_SOURCE)[1]),
+                        )
+                    self._conn.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def due_states(self, user: str, name: str, limit: int):
+        """
+        États des `limit` cartes à l'échéance la plus proche (index `card_state_due`) :
+        liste de `(position, ease, interval, repetitions, lapses, due)`.
+        """
+        rows = self._execute(
+            "SELECT s.position, s.ease, s.interval, s.repetitions, s.lapses, s.due "
+            "FROM card_state s JOIN decks d ON d.id = s.deck_id "
+            "WHERE d.user = ? AND d.name = ? ORDER BY s.due LIMIT ?",
+            (user, name, limit),
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def due_count(self, user: str, name: str, now: float) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM card_state s JOIN decks d ON d.id = s.deck_id "
+            "WHERE d.user = ? AND d.name = ? AND s.due <= ?",
+            (user, name, now),
+        ).fetchone()[0]
+
+    def save_reviews(self, user: str, name: str, states, events):
+        """
+        Enregistre en une transaction les nouveaux états `(position, ease, interval,
+        repetitions, lapses, due)` et le journal `(position, note, horodatage)`.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deck_id = self._deck_id(user, name)
+                if deck_id is not None:
+                    self._conn.executemany(
+                        "UPDATE card_state SET ease = ?, interval = ?, repetitions = ?, lapses = ?, due = ? "
+                        "WHERE deck_id = ? AND position = ?",
+                        (
+                            (ease, interval, repetitions, lapses, due, deck_id, position)
+                            for position, ease, interval, repetitions, lapses, due in states
+                        ),
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO review_log (deck_id, position, grade, reviewed_at) VALUES (?, ?, ?, ?)",
+                        ((deck_id, position, grade, reviewed_at) for position, grade, reviewed_at in events),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def replace_sources(self, user: str, name: str, documents):
+        """
+        Remplace les paragraphes sources du jeu (créé au besoin) : `documents` est
+        une suite de `(nom du document, paragraphes)`. Retourne le nombre de paragraphes.
+        """
+        entries = [
+            (position, document, paragraph)
+            for position, (document, paragraph) in enumerate(
+                (document, paragraph) for document, paragraphs in documents for paragraph in paragraphs
+            )
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deck_id = self._deck_id(user, name, create=True)
+                self._conn.execute("DELETE FROM sources WHERE deck_id = ?", (deck_id,))
+                self._conn.executemany(
+                    "INSERT INTO sources (deck_id, position, document, text) VALUES (?, ?, ?, ?)",
+                    ((deck_id, position, document, text) for position, document, text in entries),
+                )
+                self._index(deck_id, SEARCH_SOURCE, entries, replace=True)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(entries)
+
+    def search(self, user: str, query: str, limit: int = 20, kinds=("card", "source")):
+        """
+        Cartes et paragraphes sources des jeux de `user` correspondant à `query`,
+        du plus pertinent au moins pertinent (BM25). Chaque résultat est un dict
+        `kind` ("card" ou "source"), `deck`, `position`, `score`, plus `question` /
+        `answer` pour une carte, `document` / `text` pour une source.
+        """
+        match = fts_query(query)
+        if match is None or not self.search_enabled:
+            return []
+        wanted = {"card": SEARCH_CARD, "source": SEARCH_SOURCE}
+        kind_filter = sorted({wanted[kind] for kind in kinds})
+        if not kind_filter:
+            return []
+        with self._lock:
+            decks = dict(
+                self._conn.execute("SELECT id, name FROM decks WHERE user = ?", (user,)).fetchall()
+            )
+            if not decks:
+                return []
+            # La contrainte de rowid est transmise à FTS5 avec le MATCH : seules les
+            # entrées des jeux de l'utilisateur sont lues et classées, pas tout l'index.
+            rows = []
+            for low, high in _search_ranges(decks):
+                rows.extend(
+                    self._conn.execute(
+                        "SELECT rowid, bm25(search_index, ?, ?) AS score FROM search_index "
+                        "WHERE search_index MATCH ? AND rowid BETWEEN ? AND ? "
+                        f"AND ((rowid >> 31) & 1) IN ({', '.join('?' * len(kind_filter))}) "
+                        "ORDER BY score LIMIT ?",
+                        (*SEARCH_WEIGHTS, match, low, high, *kind_filter, limit),
+                    ).fetchall()
+                )
+            rows = heapq.nsmallest(limit, rows, key=lambda row: row[1])
+            results = []
+            for rowid, score in rows:
+                deck_id, kind, position = rowid >> 32, (rowid >> 31) & 1, rowid & ((1 << 31) - 1)
+                result = {"deck": decks[deck_id], "position": position, "score": -score}
+                if kind == SEARCH_CARD:
+                    row = self._conn.execute(
+                        "SELECT question, answer FROM cards WHERE deck_id = ? AND position = ?",
+                        (deck_id, position),
+                    ).fetchone()
+                    if row is not None:
+                        result.update(kind="card", question=row[0], answer=row[1])
+                else:
+                    row = self._conn.execute(
+                        "SELECT document, text FROM sources WHERE deck_id = ? AND position = ?",
+                        (deck_id, position),
+                    ).fetchone()
+                    if row is not None:
+                        result.update(kind="source", document=row[0], text=row[1])
+                if row is not None:
+                    results.append(result)
+        return results
+
+    def export_deck(self, user: str, name: str, fmt: str = "json") -> bytes:
+        cards = self.iter_cards(user, name)
+        if fmt == "csv":
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(["question", "answer"])
+            writer.writerows((card["question"], card["answer"]) for card in cards)
+            return out.getvalue().encode("utf-8")
+        return json.dumps({"deck": name, "cards": list(cards)}, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def parse_deck_file(data: bytes, filename: str = ""):
+    """
+    Lit un export JSON (`{"cards": [...]}` ou liste de cartes) ou CSV
+    (colonnes question, answer) ; les lignes incomplètes sont ignorées.
+    """
+    text = data.decode("utf-8-sig")
+    if filename.lower().endswith(".csv"):
+        rows = csv.reader(io.StringIO(text))
+        items = [
+            {"question": row[0], "answer": row[1]}
+            for row in rows
+            if len(row) >= 2 and row[:2] != ["question", "answer"]
+        ]
+    else:
+        payload = json.loads(text)
+        items = payload.get("cards", []) if isinstance(payload, dict) else payload
+    cards = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        question = str(item.get("question", "")).strip()
+        answer = str(item.get("answer", "")).strip()
+        if question and answer:
+            cards.append({"question": question, "answer": answer})
+    return cards
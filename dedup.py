@@ -0,0 +1,129 @@
+"""
+Détection des cartes quasi identiques (MinHash + LSH).
+
+Chaque carte (question + réponse, sans accents ni ponctuation) est découpée en
+paires de mots tronqués ; sa signature MinHash retient, pour chacune de
+NUM_HASHES fonctions de hachage, la plus petite valeur. Les signatures sont
+indexées par bandes (LSH) : seules les cartes partageant une bande sont
+comparées, ce qui évite la comparaison de toutes les paires sur les gros jeux.
+
+Les signatures ne dépendent pas du processus (CRC-32 des paires de mots) : le
+DeckStore persiste les clés de bande (`band_keys`) de chaque carte, si bien
+qu'un ajout n'est comparé qu'aux cartes du jeu qui partagent une bande.
+"""
+import os
+import random
+import re
+import unicodedata
+import zlib
+
+NUM_HASHES = 36
+BANDS = 12  # 12 bandes de 3 valeurs : candidats dès ~45 % de similarité, puis vérification
+DEFAULT_THRESHOLD = float(os.getenv("FLASHCARDS_DEDUP_THRESHOLD", "0.7"))
+
+# Préfixe gardé de chaque mot : « mitochondrie » et « mitochondries » se confondent.
+STEM_CHARS = 6
+
+# Une fonction de hachage par masque XOR (graine fixe).
+_UINT30 = (1 << 30) - 1  # entiers d’un seul « chiffre » CPython : XOR plus rapides
+_INT63 = (1 << 63) - 1
+_rng = random.Random(20240611)
+_MASKS = tuple(_rng.getrandbits(30) for _ in range(NUM_HASHES))
+del _rng
+_NON_WORD_RE = re.compile(r"\W+")
+# Diacritiques combinants (accents) supprimés après décomposition NFKD.
+_STRIP_ACCENTS = dict.fromkeys(range(0x300, 0x370))
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower()).translate(_STRIP_ACCENTS)
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def card_text(card) -> str:
+    return f"{card['question']} {card['answer']}"
+
+
+def _shingles(text: str):
+    """Paires de mots consécutifs (tronqués à STEM_CHARS caractères)."""
+    words = [word[:STEM_CHARS] for word in _normalize(text).split()]
+    if len(words) < 2:
+        return words or [""]
+    return [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def signature(text: str):
+    """Signature MinHash (tuple de NUM_HASHES entiers) d'un texte, stable d'un processus à l'autre."""
+    hashes = {zlib.crc32(shingle.encode("utf-8")) & _UINT30 for shingle in _shingles(text)}
+    return tuple(min(map(mask.__xor__, hashes)) for mask in _MASKS)
+
+
+def band_keys(sig):
+    """Clé entière (64 bits signés) de chacune des BANDS bandes d'une signature, pour SQLite."""
+    rows = NUM_HASHES // BANDS
+    keys = []
+    for band in range(BANDS):
+        key = 0
+        for value in sig[band * rows : (band + 1) * rows]:
+            key = ((key << 17) ^ value) & _INT63
+        keys.append(key)
+    return keys
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Estimation de la similarité de Jaccard entre deux signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_HASHES
+
+
+class NearDuplicateIndex:
+    """Index LSH incrémental : `add` refuse une carte trop proche d'une carte déjà indexée."""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._rows = NUM_HASHES // BANDS
+        self._bands = [dict() for _ in range(BANDS)]  # clé de bande -> ids de signatures
+        self._signatures = []
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _keys(self, sig):
+        rows = self._rows
+        return [sig[band * rows : (band + 1) * rows] for band in range(BANDS)]
+
+    def find(self, sig):
+        """Indice d'une signature indexée similaire à `sig`, ou None."""
+        checked = set()
+        for band, key in zip(self._bands, self._keys(sig)):
+            for candidate in band.get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if similarity(sig, self._signatures[candidate]) >= self.threshold:
+                    return candidate
+        return None
+
+    def add(self, text: str) -> bool:
+        """Indexe `text` et retourne True, sauf s'il est un quasi-doublon (False)."""
+        return self.add_signature(signature(text))
+
+    def add_signature(self, sig) -> bool:
+        """Comme `add`, pour une signature déjà calculée."""
+        if self.find(sig) is not None:
+            return False
+        ident = len(self._signatures)
+        self._signatures.append(sig)
+        for band, key in zip(self._bands, self._keys(sig)):
+            band.setdefault(key, []).append(ident)
+        return True
+
+
+def dedupe_cards(cards, threshold: float = DEFAULT_THRESHOLD, existing=()):
+    """
+    Retourne les cartes de `cards` sans leurs quasi-doublons (la première
+    occurrence est gardée), ni celles proches d'une carte de `existing`.
+    """
+    index = NearDuplicateIndex(threshold)
+    for card in existing:
+        index.add(card_text(card))
+    return [card for card in cards if index.add(card_text(card))]
@@ -0,0 +1,707 @@
+"""
+Génération de cartes avec OpenAI, sans dépendance à l'interface Streamlit :
+construction du prompt, lecture de la réponse, et mode map-reduce pour les
+longs documents (découpage en morceaux, génération par morceau, fusion).
+"""
+import hashlib
+import itertools
+import json
+import math
+import queue
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, wait
+
+from dedup import NearDuplicateIndex, card_text
+from metrics import METRICS
+
+DEFAULT_MODEL = "gpt-4o-mini"
+# À incrémenter à chaque modification du prompt : invalide le cache des générations.
+PROMPT_VERSION = "2"
+DEFAULT_CHUNK_TOKENS = 6000
+DEFAULT_OVERLAP_TOKENS = 200
+DEFAULT_CONCURRENCY = 4
+
+# Approximation sans tokenizer : ~4 caractères par token pour du français.
+CHARS_PER_TOKEN = 4
+TOKENS_PER_CARD = 150
+# Cartes candidates demandées par morceau : une pour CHUNK_TOKENS_PER_CANDIDATE tokens
+# de texte, bornée. Pour un deck plus grand que ce que donnent les morceaux, la part
+# de chacun (avec une marge pour les doublons retirés) est arrondie à la puissance
+# de deux supérieure : le nombre, et donc la clé de cache, change rarement.
+CHUNK_TOKENS_PER_CANDIDATE = 300
+MIN_CHUNK_CANDIDATES = 3
+MAX_CHUNK_CANDIDATES = 40
+CHUNK_OVERSAMPLING = 1.5
+
+
+# Sortie structurée : l'API garantit un objet {"cards": [{"question","answer"}, ...]}.
+CARDS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "cards": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "answer": {"type": "string"},
+                },
+                "required": ["question", "answer"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["cards"],
+    "additionalProperties": False,
+}
+
+STRUCTURED_TEXT_FORMAT = {
+    "format": {
+        "type": "json_schema",
+        "name": "flashcards",
+        "schema": CARDS_SCHEMA,
+        "strict": True,
+    }
+}
+
+
+class ParseStats:
+    """
+    Compteurs (process) de la qualité des réponses : réponses lues sans erreur,
+    réponses partiellement récupérées, réponses inexploitables, objets écartés.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {"responses": 0, "clean": 0, "salvaged": 0, "failed": 0, "dropped_objects": 0}
+
+    def record(self, outcome: str, dropped_objects: int = 0):
+        with self._lock:
+            self._counters["responses"] += 1
+            self._counters[outcome] += 1
+            self._counters["dropped_objects"] += dropped_objects
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        responses = stats["responses"]
+        stats["failure_rate"] = stats["failed"] / responses if responses else 0.0
+        stats["salvage_rate"] = stats["salvaged"] / responses if responses else 0.0
+        return stats
+
+
+PARSE_STATS = ParseStats()
+
+
+class GenerationError(Exception):
+    """Échec d'une génération ; `raw` contient la sortie brute du modèle si disponible."""
+
+    def __init__(self, message: str, raw: str = ""):
+        super().__init__(message)
+        self.raw = raw
+
+
+def build_prompt(text: str, n_cards: int) -> str:
+    return f"""
+Tu es un expert pédagogique. À partir du texte suivant, génère {n_cards} cartes mémoire.
+Chaque carte mémoire doit contenir:
+- Une question claire, précise et difficile
+- Une réponse courte mais complète
+
+Format attendu (JSON strict) :
+{{"cards": [
+    {{"question": "...", "answer": "..."}},
+    ...
+]}}
+
+Texte fourni :
+{text}
+"""
+
+
+def extract_response_text(response) -> str:
+    """Récupère le texte d'une réponse de l'API Responses, quelle que soit sa forme."""
+    # Try common SDK output_text field first
+    raw = getattr(response, "output_text", "") or ""
+
+    # If SDK returned structured "output", try to extract textual pieces
+    if not raw and hasattr(response, "output"):
+        parts = []
+        try:
+            for item in response.output:
+                if isinstance(item, dict):
+                    # Newer SDKs may nest content blocks
+                    content = item.get("content") or item.get("text") or item.get("message")
+                    if isinstance(content, list):
+                        for c in content:
+                            if isinstance(c, dict):
+                                parts.append(c.get("text", ""))
+                            else:
+                                parts.append(str(c))
+                    elif content is not None:
+                        parts.append(str(content))
+                    else:
+                        # fallback to stringifying item
+                        parts.append(json.dumps(item, ensure_ascii=False))
+                else:
+                    parts.append(str(item))
+        except Exception:
+            parts = []
+        raw = " ".join([p for p in parts if p]).strip()
+
+    return (raw or "").replace("```json", "").replace("```", "").strip()
+
+
+def parse_cards(raw: str):
+    """
+    Transforme la sortie JSON du modèle en liste de {"question","answer"}.
+    Accepte une liste ou un objet {"cards": [...]} ; si le JSON est cassé,
+    récupère les cartes complètes et valides qu'il contient. Lève
+    GenerationError seulement si aucune carte n'est exploitable.
+    """
+    try:
+        cards_data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        cards, dropped = salvage_cards(raw)
+        if not cards:
+            PARSE_STATS.record("failed", dropped)
+            raise GenerationError(f"JSON invalide : {e}", raw) from e
+        PARSE_STATS.record("salvaged", dropped)
+        return cards
+
+    if isinstance(cards_data, dict) and isinstance(cards_data.get("cards"), list):
+        cards_data = cards_data["cards"]
+    if not isinstance(cards_data, list):
+        PARSE_STATS.record("failed")
+        raise GenerationError("Réponse OpenAI inattendue (attendu: liste JSON).", raw)
+
+    cards = []
+    for item in cards_data:
+        card = _card_from_item(item)
+        if card is not None:
+            cards.append(card)
+    dropped = len(cards_data) - len(cards)
+    if not cards:
+        PARSE_STATS.record("failed", dropped)
+    else:
+        PARSE_STATS.record("salvaged" if dropped else "clean", dropped)
+    return cards
+
+
+def salvage_cards(raw: str):
+    """Récupère les objets carte complets d'une sortie JSON cassée ; retourne (cartes, écartés)."""
+    parser = CardStreamParser()
+    cards = parser.feed(raw)
+    return cards, parser.dropped
+
+
+def _card_from_item(item):
+    if not isinstance(item, dict):
+        return None
+    q = item.get("question") or item.get("q")
+    a = item.get("answer") or item.get("a")
+    if q and a:
+        return {"question": str(q).strip(), "answer": str(a).strip()}
+    return None
+
+
+class CardBatch(list):
+    """Liste de cartes accompagnée de l'usage (tokens) rapporté par l'API, si connu."""
+
+    def __init__(self, cards=(), usage=None):
+        super().__init__(cards)
+        self.usage = usage
+
+
+class CardStreamParser:
+    """
+    Analyseur JSON incrémental : reçoit la sortie du modèle par fragments et
+    restitue chaque objet {"question","answer"} dès que son accolade fermante
+    arrive. Seuls les objets éléments d'un tableau sont retenus ; le texte hors
+    JSON (balises ```json, etc.) est ignoré.
+    """
+
+    def __init__(self):
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._capture_depth = None
+        self._buffer = []
+        self.dropped = 0  # objets complets mais invalides (JSON cassé, champs manquants)
+
+    def feed(self, fragment: str):
+        cards = []
+        for ch in fragment:
+            if self._capture_depth is not None:
+                self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == "[" or ch == "{":
+                if ch == "{" and self._capture_depth is None and self._stack and self._stack[-1] == "[":
+                    self._capture_depth = len(self._stack)
+                    self._buffer = ["{"]
+                self._stack.append(ch)
+            elif ch == "]" or ch == "}":
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and self._capture_depth is not None and len(self._stack) == self._capture_depth:
+                    card = self._close_object("".join(self._buffer))
+                    if card is not None:
+                        cards.append(card)
+                    self._capture_depth = None
+                    self._buffer = []
+        return cards
+
+    def _close_object(self, text: str):
+        try:
+            card = _card_from_item(json.loads(text))
+        except json.JSONDecodeError:
+            card = None
+        if card is None:
+            self.dropped += 1
+        return card
+
+    @property
+    def complete(self) -> bool:
+        """Vrai si toutes les structures ouvertes ont été refermées (sortie non tronquée)."""
+        return not self._stack and self._capture_depth is None
+
+
+def submit_cards_request(
+    scheduler,
+    text: str,
+    n_cards: int,
+    model: str = DEFAULT_MODEL,
+    max_output_tokens: int = 1200,
+    sink: queue.Queue | None = None,
+    structured: bool = True,
+):
+    """
+    Planifie un appel via l'ordonnanceur ; le Future renvoie un `CardBatch`.
+    Avec `sink`, la réponse est lue en streaming et chaque carte y est déposée
+    dès qu'elle est complète (une nouvelle tentative peut redéposer des cartes).
+    `structured` demande une sortie conforme à `CARDS_SCHEMA`.
+    """
+    with METRICS.span("prompt"):
+        prompt = build_prompt(text, n_cards)
+    options = {"text": STRUCTURED_TEXT_FORMAT} if structured else {}
+
+    async def _call(client):
+        started = time.perf_counter()
+        response = await client.responses.create(
+            model=model,
+            input=prompt,
+            max_output_tokens=max_output_tokens,
+            **options,
+        )
+        METRICS.record_usage(model, response.usage, time.perf_counter() - started)
+        return CardBatch(parse_cards(extract_response_text(response)), response.usage)
+
+    async def _call_streaming(client):
+        parser = CardStreamParser()
+        raw = []
+        cards = CardBatch()
+        started = time.perf_counter()
+        stream = await client.responses.create(
+            model=model,
+            input=prompt,
+            max_output_tokens=max_output_tokens,
+            stream=True,
+            **options,
+        )
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                raw.append(event.delta)
+                for card in parser.feed(event.delta):
+                    cards.append(card)
+                    sink.put(card)
+            elif event.type == "response.completed":
+                cards.usage = event.response.usage
+                METRICS.record_usage(model, cards.usage, time.perf_counter() - started)
+        if not cards:
+            # Rien d'exploitable : on relit le tout pour remonter l'erreur avec la sortie brute.
+            raw_text = "".join(raw).replace("```json", "").replace("```", "").strip()
+            cards.extend(parse_cards(raw_text))
+        else:
+            clean = parser.complete and not parser.dropped
+            PARSE_STATS.record("clean" if clean else "salvaged", parser.dropped)
+        return cards
+
+    return scheduler.submit(
+        _call if sink is None else _call_streaming,
+        estimate_tokens(prompt) + max_output_tokens,
+    )
+
+
+def _wait_draining(futures, sink, on_card, return_when=FIRST_COMPLETED, poll: float = 0.1):
+    """
+    Attend des futures en transmettant à `on_card`, dans le thread appelant,
+    les cartes déposées entre-temps dans `sink`. Retourne les futures encore en cours.
+    """
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=poll, return_when=return_when)
+        while True:
+            try:
+                on_card(sink.get_nowait())
+            except queue.Empty:
+                break
+        if done and return_when == FIRST_COMPLETED:
+            break
+    return pending
+
+
+def stream_cards(scheduler, text: str, n_cards: int, on_card, model: str = DEFAULT_MODEL, max_output_tokens: int = 1200):
+    """
+    Comme `request_cards`, mais en streaming : `on_card(carte)` est appelé dans le
+    thread appelant pour chaque nouvelle carte, dès sa réception.
+    """
+    sink = queue.Queue()
+    seen = set()
+
+    def _emit(card):
+        key = _normalize_question(card["question"])
+        if key not in seen:
+            seen.add(key)
+            on_card(card)
+
+    future = submit_cards_request(scheduler, text, n_cards, model, max_output_tokens, sink=sink)
+    _wait_draining([future], sink, _emit, return_when=ALL_COMPLETED)
+    return future.result()
+
+
+def request_cards(scheduler, text: str, n_cards: int, model: str = DEFAULT_MODEL, max_output_tokens: int = 1200):
+    """Un appel OpenAI complet ; lève GenerationError si la sortie est inexploitable."""
+    return submit_cards_request(scheduler, text, n_cards, model, max_output_tokens).result()
+
+
+def text_digest(parts) -> str:
+    """Empreinte SHA-256 d'une suite de textes (morceaux), sans les concaténer."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def generation_cache_key(digest: str, n_cards: int, model: str = DEFAULT_MODEL, **options) -> str:
+    """Clé de cache : texte, nombre de cartes, modèle, version du prompt et options du mode."""
+    extras = ",".join(f"{name}={options[name]}" for name in sorted(options))
+    return f"cards:{PROMPT_VERSION}:{model}:{n_cards}:{extras}:{digest}"
+
+
+def cached_generation(cache, key: str, produce, force: bool = False):
+    """
+    Retourne `(cartes, depuis_le_cache)`. `produce()` n'est appelé que si la clé
+    est absente (ou si `force` est vrai) ; un résultat non vide est mis en cache.
+    """
+    if cache is not None and not force:
+        cached = cache.get(key)
+        if cached is not None:
+            return json.loads(cached), True
+    cards = produce()
+    if cache is not None and cards:
+        cache.put(key, json.dumps(cards, ensure_ascii=False))
+    return cards, False
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def iter_paragraphs(pages, max_chars: int = 8000):
+    """
+    Découpe un flux de pages en paragraphes (comme `_split_into_paragraphs` sur
+    le texte assemblé) sans jamais garder plus d'un paragraphe en mémoire.
+    Un paragraphe trop long est coupé au dernier saut de ligne avant `max_chars`.
+    """
+    carry = None
+    for page_text in pages:
+        text = page_text if carry is None else carry + "\n" + page_text
+        pieces = re.split(r"\n{2,}", text)
+        carry = pieces.pop()
+        for piece in pieces:
+            if piece.strip():
+                yield piece.strip()
+        while len(carry) > max_chars:
+            cut = carry.rfind("\n", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            if carry[:cut].strip():
+                yield carry[:cut].strip()
+            carry = carry[cut:]
+    if carry is not None and carry.strip():
+        yield carry.strip()
+
+
+# Un paragraphe sur BOUNDARY_PERIOD (selon son empreinte) peut clore un morceau.
+BOUNDARY_PERIOD = 4
+
+
+def _is_boundary(paragraph: str) -> bool:
+    digest = hashlib.blake2b(paragraph.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % BOUNDARY_PERIOD == 0
+
+
+def iter_chunks(paragraphs, chunk_tokens: int = DEFAULT_CHUNK_TOKENS, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS):
+    """
+    Regroupe un flux de paragraphes en morceaux d'au plus `chunk_tokens` tokens,
+    coupés sur les frontières de paragraphes. Les derniers paragraphes d'un morceau
+    (jusqu'à `overlap_tokens`) sont répétés au début du suivant.
+
+    Passé la moitié de la taille cible, un morceau se termine sur le premier
+    paragraphe « frontière » (choisi d'après son contenu, pas sa position) :
+    après une modification du document, le découpage se recale sur les mêmes
+    frontières et les morceaux inchangés gardent la même empreinte.
+    """
+    chunk_chars = max(1, chunk_tokens) * CHARS_PER_TOKEN
+    overlap_chars = max(0, overlap_tokens) * CHARS_PER_TOKEN
+    min_chars = chunk_chars // 2
+
+    current = []
+    current_chars = 0
+    fresh = False  # le morceau courant contient-il autre chose que le chevauchement ?
+    for paragraph in paragraphs:
+        # Un paragraphe plus grand qu'un morceau est coupé brutalement.
+        pieces = [paragraph[i : i + chunk_chars] for i in range(0, len(paragraph), chunk_chars)]
+        for piece in pieces:
+            if current and current_chars + len(piece) > chunk_chars and fresh:
+                yield "\n\n".join(current)
+                current, current_chars = _overlap_tail(current, overlap_chars)
+                fresh = False
+            current.append(piece)
+            current_chars += len(piece) + 2
+            fresh = True
+            if current_chars >= min_chars and _is_boundary(piece):
+                yield "\n\n".join(current)
+                current, current_chars = _overlap_tail(current, overlap_chars)
+                fresh = False
+    if current and fresh:
+        yield "\n\n".join(current)
+
+
+def _overlap_tail(paragraphs, overlap_chars: int):
+    tail = []
+    size = 0
+    for paragraph in reversed(paragraphs):
+        if size + len(paragraph) > overlap_chars:
+            break
+        tail.insert(0, paragraph)
+        size += len(paragraph) + 2
+    return tail, size
+
+
+def _normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\W+", " ", text).strip()
+
+
+def chunk_candidates(chunk: str, n_cards: int = 0, n_chunks: int = 1) -> int:
+    """
+    Nombre de cartes candidates demandées pour un morceau : selon sa longueur,
+    ou sa part de `n_cards` sur `n_chunks` morceaux si elle est plus grande.
+    """
+    wanted = math.ceil(estimate_tokens(chunk) / CHUNK_TOKENS_PER_CANDIDATE)
+    share = math.ceil(n_cards * CHUNK_OVERSAMPLING / max(1, n_chunks))
+    if share > wanted:
+        wanted = 1 << (share - 1).bit_length()
+    return max(MIN_CHUNK_CANDIDATES, min(MAX_CHUNK_CANDIDATES, wanted))
+
+
+def _larger_candidate_counts(per_chunk: int):
+    """Nombres de candidates supérieurs à `per_chunk` que `chunk_candidates` peut demander."""
+    count = 1 << per_chunk.bit_length()
+    while count < MAX_CHUNK_CANDIDATES:
+        yield count
+        count <<= 1
+    if per_chunk < MAX_CHUNK_CANDIDATES:
+        yield MAX_CHUNK_CANDIDATES
+
+
+def reduce_cards(cards_per_chunk, n_cards: int):
+    """
+    Fusionne les cartes candidates de chaque morceau : supprime les quasi-doublons
+    (MinHash, y compris entre morceaux qui se chevauchent) puis choisit `n_cards`
+    cartes en alternant entre les morceaux, pour couvrir tout le document plutôt
+    que son début.
+    """
+    index = NearDuplicateIndex()
+    unique_per_chunk = []
+    for cards in cards_per_chunk:
+        unique = []
+        for card in cards:
+            if not _normalize_question(card["question"]) or not index.add(card_text(card)):
+                continue
+            unique.append(card)
+        unique_per_chunk.append(unique)
+
+    selected = []
+    depth = 0
+    while len(selected) < n_cards and any(depth < len(c) for c in unique_per_chunk):
+        for cards in unique_per_chunk:
+            if depth < len(cards):
+                selected.append(cards[depth])
+                if len(selected) >= n_cards:
+                    break
+        depth += 1
+    return selected
+
+
+def generate_cards_chunked(
+    scheduler,
+    chunks,
+    n_cards: int,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    model: str = DEFAULT_MODEL,
+    on_card=None,
+    cache=None,
+    force: bool = False,
+    report=None,
+):
+    """
+    Map-reduce : génère des cartes candidates pour chaque morceau (voir `iter_chunks`)
+    en parallèle (au plus `concurrency` appels simultanés pour cette génération,
+    en plus des limites globales de l'ordonnanceur), puis fusionne avec `reduce_cards`.
+    Avec `on_card`, les candidates sont transmises au fil du streaming.
+
+    Chaque morceau produit `chunk_candidates(morceau, n_cards, nombre de morceaux)`
+    candidates ; `reduce_cards` choisit ensuite les `n_cards` cartes. Avec `cache`,
+    les candidates de chaque morceau sont mises en cache par empreinte du morceau,
+    nombre de candidates et modèle, et une entrée plus fournie convient aussi :
+    pour une nouvelle version d'un document, seuls les morceaux modifiés ou
+    nouveaux sont envoyés à OpenAI, même si le nombre de morceaux a changé.
+    `report` (dict), s'il est fourni, reçoit `chunks`, `regenerated` et
+    `shortfall` (cartes manquantes pour atteindre `n_cards`).
+    Retourne `(cartes, erreurs)` ; les morceaux en échec sont ignorés.
+    """
+    if report is not None:
+        report.update(chunks=len(chunks), regenerated=0, shortfall=n_cards if not chunks else 0)
+    if not chunks:
+        return [], []
+
+    sink = queue.Queue() if on_card is not None else None
+    seen = set()
+
+    def _emit(card):
+        key = _normalize_question(card["question"])
+        if key not in seen:
+            seen.add(key)
+            on_card(card)
+
+    def _wait(in_flight, return_when):
+        if sink is None:
+            return wait(in_flight, return_when=return_when)[1]
+        return _wait_draining(in_flight, sink, _emit, return_when=return_when)
+
+    def _key(chunk: str, per_chunk: int) -> str:
+        return generation_cache_key(text_digest([chunk]), per_chunk, model, scope="chunk")
+
+    def _cached(chunk: str, per_chunk: int):
+        if cache is None or force:
+            return None
+        for count in itertools.chain([per_chunk], _larger_candidate_counts(per_chunk)):
+            cached = cache.get(_key(chunk, count))
+            if cached is not None:
+                return cached
+        return None
+
+    candidates = [chunk_candidates(chunk, n_cards, len(chunks)) for chunk in chunks]
+    keys = [_key(chunk, per_chunk) for chunk, per_chunk in zip(chunks, candidates)]
+    results = []  # cartes en cache ou Future, dans l'ordre des morceaux
+    in_flight = set()
+    for chunk, key, per_chunk in zip(chunks, keys, candidates):
+        cached = _cached(chunk, per_chunk)
+        if cached is not None:
+            cards = json.loads(cached)
+            if on_card is not None:
+                for card in cards:
+                    _emit(card)
+            results.append(cards)
+            continue
+        if len(in_flight) >= max(1, concurrency):
+            in_flight = _wait(in_flight, FIRST_COMPLETED)
+        max_output_tokens = TOKENS_PER_CARD * per_chunk + 200
+        future = submit_cards_request(scheduler, chunk, per_chunk, model, max_output_tokens, sink=sink)
+        results.append(future)
+        in_flight.add(future)
+    _wait(in_flight, ALL_COMPLETED)
+
+    cards_per_chunk = []
+    errors = []
+    for key, result in zip(keys, results):
+        if isinstance(result, list):
+            cards_per_chunk.append(result)
+            continue
+        if report is not None:
+            report["regenerated"] += 1
+        try:
+            cards = result.result()
+        except Exception as e:
+            errors.append(e)
+            cards_per_chunk.append([])
+            continue
+        if cache is not None and cards:
+            cache.put(key, json.dumps(list(cards), ensure_ascii=False))
+        cards_per_chunk.append(cards)
+
+    cards = reduce_cards(cards_per_chunk, n_cards)
+    if report is not None:
+        report["shortfall"] = n_cards - len(cards)
+    return cards, errors
+
+
+def generate_deck(
+    scheduler,
+    paragraphs,
+    n_cards: int,
+    cache=None,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    model: str = DEFAULT_MODEL,
+    force: bool = False,
+    on_card=None,
+    report=None,
+):
+    """
+    Génération map-reduce complète avec cache : découpe `paragraphs`, consulte
+    `cache` (sauf `force`), sinon génère et met en cache un résultat complet.
+    Si le document a changé, seuls ses morceaux modifiés sont régénérés (cache
+    par morceau, voir `generate_cards_chunked`) ; `report` reçoit le décompte.
+    Retourne `(cartes, depuis_le_cache, erreurs)` ; en cas d'erreurs sur certains
+    morceaux, les cartes partielles sont retournées mais pas mises en cache.
+    """
+    chunks = list(iter_chunks(paragraphs, chunk_tokens, overlap_tokens))
+    key = generation_cache_key(
+        text_digest(chunks), n_cards, model,
+        chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens,
+    )
+    errors = []
+    partial = []
+
+    def _produce():
+        cards, chunk_errors = generate_cards_chunked(
+            scheduler, chunks, n_cards, concurrency=concurrency, model=model, on_card=on_card,
+            cache=cache, force=force, report=report,
+        )
+        if chunk_errors:
+            errors.extend(chunk_errors)
+            partial.extend(cards)
+            return []
+        return cards
+
+    with METRICS.span("openai_deck"):
+        cards, from_cache = cached_generation(cache, key, _produce, force=force)
+    return cards or partial, from_cache, errors
@@ -0,0 +1,111 @@
+"""
+Mode hybride : un deck hors ligne (YAKE) disponible immédiatement, affiné en
+arrière-plan par les cartes OpenAI au fil de leur arrivée.
+
+Le deck reste toujours complet : chaque carte OpenAI remplace une carte hors
+ligne, en partant de la fin pour ne pas changer la carte en cours de révision.
+Si l'API échoue ou cesse de produire des cartes (aucune nouvelle carte pendant
+`card_timeout` secondes, avant la première comme entre deux), le deck garde
+ses cartes actuelles et l'exception est exposée dans `error`.
+Les cartes ne sont que des dicts `{"question", "answer"}` ; la session Streamlit
+relit l'état via `snapshot()` (aucun appel Streamlit depuis le thread).
+"""
+import threading
+import time
+
+STATUS_REFINING = "refining"
+STATUS_DONE = "done"
+STATUS_FALLBACK = "fallback"
+
+DEFAULT_CARD_TIMEOUT = 20.0
+
+
+class HybridDeck:
+    def __init__(self, deck: str, offline_cards, n_cards: int):
+        self.deck = deck
+        self.n_cards = n_cards
+        self._cards = list(offline_cards[:n_cards])
+        self._offline_slots = list(range(len(self._cards)))  # positions encore hors ligne
+        self._lock = threading.Lock()
+        self.status = STATUS_REFINING
+        self.error = None
+        self.version = 0
+        self.upgraded = 0
+        self.started_at = time.monotonic()
+        self.last_card_at = self.started_at
+
+    def _upgrade(self, card):
+        with self._lock:
+            if self.status != STATUS_REFINING:
+                return
+            if self._offline_slots:
+                self._cards[self._offline_slots.pop()] = card
+            elif len(self._cards) < self.n_cards:
+                self._cards.append(card)
+            else:
+                return
+            self.upgraded += 1
+            self.version += 1
+            self.last_card_at = time.monotonic()
+
+    def _finish(self, cards):
+        """Remplace le deck par le résultat final OpenAI, complété par des cartes hors ligne."""
+        with self._lock:
+            if self.status != STATUS_REFINING:
+                return
+            if cards:
+                remaining = [self._cards[i] for i in sorted(self._offline_slots)]
+                self._cards = list(cards[: self.n_cards]) + remaining[: max(0, self.n_cards - len(cards))]
+                self._offline_slots = list(range(len(cards[: self.n_cards]), len(self._cards)))
+                self.upgraded = min(len(cards), self.n_cards)
+                self.status = STATUS_DONE
+            else:
+                self.status = STATUS_FALLBACK
+                self.error = ValueError("aucune carte valide reçue")
+            self.version += 1
+
+    def _fall_back(self, error: Exception, idle_for: float | None = None):
+        """Abandonne l'affinage ; avec `idle_for`, seulement si aucune carte n'est arrivée depuis."""
+        with self._lock:
+            if self.status != STATUS_REFINING:
+                return
+            if idle_for is not None and time.monotonic() - self.last_card_at < idle_for:
+                return
+            self.status = STATUS_FALLBACK
+            self.error = error
+            self.version += 1
+
+    def refine(self, produce, card_timeout: float = DEFAULT_CARD_TIMEOUT):
+        """
+        Lance `produce(on_card) -> cartes` dans un thread. Si aucune carte
+        n'arrive pendant `card_timeout` secondes, le deck est gardé tel qu'il est
+        (la requête se termine quand même et alimente le cache de génération).
+        """
+
+        def _run():
+            try:
+                cards = produce(self._upgrade)
+            except Exception as e:
+                self._fall_back(e)
+                return
+            self._finish(cards)
+
+        def _watchdog():
+            while not self.finished:
+                idle = time.monotonic() - self.last_card_at
+                if idle >= card_timeout:
+                    self._fall_back(TimeoutError("délai de réponse dépassé"), idle_for=card_timeout)
+                else:
+                    time.sleep(card_timeout - idle)
+
+        threading.Thread(target=_run, name=f"hybrid-{self.deck}", daemon=True).start()
+        threading.Thread(target=_watchdog, name=f"hybrid-watchdog-{self.deck}", daemon=True).start()
+
+    def snapshot(self):
+        """Retourne `(version, statut, cartes)` de façon cohérente."""
+        with self._lock:
+            return self.version, self.status, list(self._cards)
+
+    @property
+    def finished(self) -> bool:
+        return self.status != STATUS_REFINING
@@ -0,0 +1,394 @@
+"""
+File d'attente persistante pour la génération de decks par lots (cours entiers).
+
+Les travaux et leurs PDF sont enregistrés sur disque (SQLite + fichiers) et
+traités par des threads workers du serveur, indépendamment des sessions
+Streamlit. Les résultats intermédiaires (cartes par fichier) sont sauvegardés :
+après un redémarrage, les travaux interrompus reprennent là où ils en étaient.
+
+Plusieurs serveurs peuvent partager la base : un travail « running » appartient
+au processus qui l'a pris (`owner`), qui renouvelle régulièrement son bail
+(`heartbeat_at`). Seuls les travaux dont le bail a expiré, donc dont le
+processus s'est arrêté, sont remis en attente.
+"""
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from dedup import dedupe_cards
+from generation import generate_deck, iter_paragraphs
+from pdf_extraction import iter_document_pages
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+DEFAULT_JOB_WORKERS = 2
+
+# Un travail dont le bail n'a pas été renouvelé depuis ce délai est repris par un autre worker.
+JOB_LEASE_SECONDS = 60.0
+
+
+class JobStore:
+    def __init__(self, path: str, files_dir: str):
+        self.files_dir = files_dir
+        os.makedirs(files_dir, exist_ok=True)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user TEXT,
+                deck TEXT NOT NULL,
+                n_cards INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                error TEXT,
+                result TEXT,
+                owner TEXT,
+                heartbeat_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id INTEGER NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                path TEXT NOT NULL,
+                chars INTEGER,
+                cards TEXT,
+                PRIMARY KEY (job_id, position)
+            );
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat_at", "REAL"), ("user", "TEXT")):
+            if column not in columns:  # base créée avant les baux ou les utilisateurs
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user, id)")
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def enqueue(self, user: str, deck: str, n_cards: int, files) -> int:
+        """Enregistre un travail de `user` ; `files` est une liste de `(nom, octets)`."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job_id = self._conn.execute(
+                    "INSERT INTO jobs (user, deck, n_cards, status, total, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user, deck, n_cards, STATUS_QUEUED, 2 * len(files), now, now),
+                ).lastrowid
+                job_dir = os.path.join(self.files_dir, str(job_id))
+                os.makedirs(job_dir, exist_ok=True)
+                for position, (name, data) in enumerate(files):
+                    path = os.path.join(job_dir, f"{position}.pdf")
+                    with open(path, "wb") as f:
+                        f.write(data)
+                    self._conn.execute(
+                        "INSERT INTO job_files (job_id, position, name, path) VALUES (?, ?, ?, ?)",
+                        (job_id, position, name, path),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim_next(self, owner: str):
+        """Passe le plus ancien travail en attente à l'état « running » pour `owner` et le retourne."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (STATUS_QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, heartbeat_at = ?, updated_at = ? "
+                        "WHERE id = ?",
+                        (STATUS_RUNNING, owner, now, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(row) if row is not None else None
+
+    def heartbeat(self, owner: str):
+        """Renouvelle le bail des travaux en cours de `owner`."""
+        self._execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?",
+            (time.time(), STATUS_RUNNING, owner),
+        )
+
+    def requeue_interrupted(self, lease: float = JOB_LEASE_SECONDS) -> int:
+        """
+        Remet en attente les travaux « running » dont le bail a expiré : leur
+        processus s'est arrêté. Ceux des autres serveurs actifs ne sont pas touchés.
+        """
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET status = ?, owner = NULL, message = ?, updated_at = ? "
+            "WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            (STATUS_QUEUED, "Reprise après l’arrêt du serveur", now, STATUS_RUNNING, now - lease),
+        ).rowcount
+
+    def update_progress(self, job_id: int, progress: int, message: str):
+        self._execute(
+            "UPDATE jobs SET progress = ?, message = ?, updated_at = ? WHERE id = ?",
+            (progress, message, time.time(), job_id),
+        )
+
+    def save_file_chars(self, job_id: int, position: int, chars: int):
+        self._execute(
+            "UPDATE job_files SET chars = ? WHERE job_id = ? AND position = ?",
+            (chars, job_id, position),
+        )
+
+    def save_file_cards(self, job_id: int, position: int, cards):
+        self._execute(
+            "UPDATE job_files SET cards = ? WHERE job_id = ? AND position = ?",
+            (json.dumps(cards, ensure_ascii=False), job_id, position),
+        )
+
+    def finish(self, job_id: int, cards, message: str = "Terminé"):
+        self._execute(
+            "UPDATE jobs SET status = ?, progress = total, message = ?, result = ?, updated_at = ? "
+            "WHERE id = ?",
+            (STATUS_DONE, message, json.dumps(cards, ensure_ascii=False), time.time(), job_id),
+        )
+
+    def fail(self, job_id: int, error: str):
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (STATUS_FAILED, error, time.time(), job_id),
+        )
+
+    def retry(self, user: str, job_id: int):
+        """
+        Remet en attente un travail en échec de `user`. Les fichiers restés sans texte ou sans
+        cartes sont refaits : les bases plus anciennes enregistraient un échec comme
+        un résultat vide.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                retried = self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = NULL, updated_at = ? "
+                    "WHERE id = ? AND user = ? AND status = ?",
+                    (STATUS_QUEUED, time.time(), job_id, user, STATUS_FAILED),
+                ).rowcount
+                if retried:
+                    self._conn.execute(
+                        "UPDATE job_files SET chars = NULL, cards = NULL WHERE job_id = ? AND chars = 0",
+                        (job_id,),
+                    )
+                    self._conn.execute(
+                        "UPDATE job_files SET cards = NULL WHERE job_id = ? AND cards = '[]'", (job_id,)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def list_jobs(self, user: str, limit: int = 20):
+        rows = self._execute(
+            "SELECT id, deck, n_cards, status, progress, total, message, error, created_at, updated_at "
+            "FROM jobs WHERE user = ? ORDER BY id DESC LIMIT ?",
+            (user, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def result(self, user: str, job_id: int):
+        row = self._execute(
+            "SELECT result FROM jobs WHERE id = ? AND user = ?", (job_id, user)
+        ).fetchone()
+        return json.loads(row["result"]) if row is not None and row["result"] else []
+
+    def job_files(self, job_id: int):
+        rows = self._execute(
+            "SELECT position, name, path, chars, cards FROM job_files WHERE job_id = ? ORDER BY position",
+            (job_id,),
+        ).fetchall()
+        files = []
+        for row in rows:
+            entry = dict(row)
+            entry["cards"] = json.loads(entry["cards"]) if entry["cards"] is not None else None
+            files.append(entry)
+        return files
+
+    def delete(self, user: str, job_id: int):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._conn.execute(
+                    "DELETE FROM jobs WHERE id = ? AND user = ?", (job_id, user)
+                ).rowcount
+                if deleted:
+                    self._conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if deleted:
+            shutil.rmtree(os.path.join(self.files_dir, str(job_id)), ignore_errors=True)
+
+
+class JobWorkers:
+    """
+    Threads qui dépilent les travaux de `store` et les confient à `handler(job, store)`.
+    Un thread supplémentaire renouvelle le bail des travaux en cours et reprend
+    ceux des processus arrêtés.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler,
+        n_workers: int = DEFAULT_JOB_WORKERS,
+        lease: float = JOB_LEASE_SECONDS,
+    ):
+        self.store = store
+        self.handler = handler
+        self.n_workers = max(1, n_workers)
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.store.requeue_interrupted(self.lease)
+        targets = [self._loop] * self.n_workers + [self._keep_lease]
+        for i, target in enumerate(targets):
+            name = f"job-worker-{i}" if i < self.n_workers else "job-lease"
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _keep_lease(self):
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                self.store.heartbeat(self.owner)
+                if self.store.requeue_interrupted(self.lease):
+                    self.notify()
+            except sqlite3.Error:
+                continue  # base momentanément verrouillée : nouvel essai au prochain tour
+
+    def _loop(self):
+        while True:
+            job = self.store.claim_next(self.owner)
+            if job is None:
+                self._wakeup.wait(timeout=2.0)
+                self._wakeup.clear()
+                continue
+            try:
+                self.handler(job, self.store)
+            except Exception as e:
+                self.store.fail(job["id"], str(e) or e.__class__.__name__)
+
+
+def split_card_budget(n_cards: int, weights):
+    """Répartit `n_cards` proportionnellement aux poids (méthode du plus fort reste)."""
+    total = sum(weights)
+    if not weights:
+        return []
+    if total <= 0:
+        weights = [1] * len(weights)
+        total = len(weights)
+    exact = [n_cards * w / total for w in weights]
+    shares = [int(x) for x in exact]
+    remainders = sorted(range(len(weights)), key=lambda i: exact[i] - shares[i], reverse=True)
+    for i in remainders[: n_cards - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+def process_generation_job(
+    job, store: JobStore, scheduler, extraction_cache=None, extraction_pool=None, ocr_pool=None, generation_cache=None
+):
+    """
+    Extraction puis génération, fichier par fichier. Chaque étape terminée est
+    enregistrée, si bien qu'une reprise ne refait que ce qui manque ; une étape
+    en échec ne l'est pas et sera refaite à la relance. Le texte extrait est relu
+    depuis le cache d'extraction.
+    """
+    job_id = job["id"]
+    files = store.job_files(job_id)
+    done_steps = 0
+    unextracted = set()  # fichiers dont l'extraction a échoué cette fois-ci
+
+    def _pages(entry):
+        with open(entry["path"], "rb") as f:
+            data = f.read()
+        failures = []
+        pages = iter_document_pages(
+            [(entry["name"], data)],
+            cache=extraction_cache,
+            pool=extraction_pool,
+            on_error=failures.append,
+            ocr=ocr_pool,
+        )
+        return pages, failures
+
+    for entry in files:
+        if entry["chars"] is None:
+            store.update_progress(job_id, done_steps, f"Extraction de « {entry['name']} »")
+            pages, failures = _pages(entry)
+            entry["chars"] = sum(len(page_text) for page_text in pages)
+            if failures:
+                # Pas de cartes pour ce fichier cette fois-ci, mais rien d'enregistré :
+                # une relance refera l'extraction.
+                entry["chars"] = 0
+                unextracted.add(entry["position"])
+            else:
+                store.save_file_chars(job_id, entry["position"], entry["chars"])
+        done_steps += 1
+
+    shares = split_card_budget(job["n_cards"], [entry["chars"] for entry in files])
+    errors = []
+    for entry, share in zip(files, shares):
+        if entry["cards"] is None:
+            store.update_progress(job_id, done_steps, f"Génération pour « {entry['name']} »")
+            cards, chunk_errors = [], []
+            if share > 0 and entry["chars"]:
+                pages, _ = _pages(entry)
+                cards, _, chunk_errors = generate_deck(
+                    scheduler, iter_paragraphs(pages), share, cache=generation_cache
+                )
+                errors.extend(chunk_errors)
+            entry["cards"] = cards
+            # Extraction ou tous les morceaux en échec : à refaire à la relance.
+            if entry["position"] not in unextracted and (cards or not chunk_errors):
+                store.save_file_cards(job_id, entry["position"], cards)
+        done_steps += 1
+
+    # Les fichiers d'un même cours se recoupent : quasi-doublons retirés entre fichiers.
+    cards = dedupe_cards([card for entry in files for card in entry["cards"]])
+    if not cards:
+        raise RuntimeError(str(errors[0]) if errors else "Aucun texte exploitable dans ces PDF.")
+    message = "Terminé" if not errors else f"Terminé ({len(errors)} morceau(x) en échec)"
+    store.finish(job_id, cards, message)
@@ -0,0 +1,287 @@
+"""
+Mesures du pipeline : durée des étapes, tokens et coût OpenAI, taux de succès
+des caches, exposés au format Prometheus.
+
+Tout est en mémoire, par processus : un enregistrement coûte une prise de
+verrou et quelques additions, assez peu pour rester actif en production.
+`span("étape")` chronomètre un bloc, `timed(itérable, "étape")` le temps passé
+à produire les éléments d'un générateur (hors temps du consommateur).
+Les collecteurs (`register_collector`) fournissent des jauges calculées à la
+lecture, par exemple les statistiques des caches.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes des histogrammes de durée (secondes).
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# USD par million de tokens (entrée, sortie) ; FLASHCARDS_PRICE_INPUT / _OUTPUT priment.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+RECENT_REQUESTS = 50
+
+_DESCRIPTIONS = {
+    "flashcards_stage_seconds": ("histogram", "Durée des étapes du pipeline (secondes)."),
+    "flashcards_stage_errors_total": ("counter", "Étapes terminées par une exception."),
+    "flashcards_openai_requests_total": ("counter", "Réponses OpenAI reçues."),
+    "flashcards_openai_retries_total": ("counter", "Nouvelles tentatives après une erreur transitoire."),
+    "flashcards_openai_input_tokens_total": ("counter", "Tokens envoyés à OpenAI."),
+    "flashcards_openai_output_tokens_total": ("counter", "Tokens produits par OpenAI."),
+    "flashcards_openai_cost_usd_total": ("counter", "Coût OpenAI estimé (USD)."),
+    "flashcards_prompt_original_tokens_total": ("counter", "Tokens estimés des textes avant compression."),
+    "flashcards_prompt_sent_tokens_total": ("counter", "Tokens estimés des textes envoyés après compression."),
+    "flashcards_cache_hit_ratio": ("gauge", "Part des lectures servies par le cache."),
+    "flashcards_cache_lookups": ("gauge", "Lectures du cache depuis le démarrage."),
+    "flashcards_cache_memory_bytes": ("gauge", "Taille du niveau mémoire du cache."),
+}
+
+
+def _price(model: str):
+    default_in, default_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (
+        float(os.getenv("FLASHCARDS_PRICE_INPUT", str(default_in))),
+        float(os.getenv("FLASHCARDS_PRICE_OUTPUT", str(default_out))),
+    )
+
+
+def _labels_key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # dernier : au-delà de la plus grande borne
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Borne supérieure du seau contenant le quantile `q` (estimation)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (nom, labels) -> valeur
+        self._histograms = {}  # (nom, labels) -> _Histogram
+        self._collectors = []
+        self.recent_requests = deque(maxlen=RECENT_REQUESTS)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("flashcards_stage_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("flashcards_stage_seconds", time.perf_counter() - started, stage=stage)
+
+    def timed(self, iterable, stage: str):
+        """Relaie `iterable` en cumulant le temps passé à produire ses éléments."""
+        elapsed = 0.0
+        iterator = iter(iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - started
+                    return
+                elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            self.observe("flashcards_stage_seconds", elapsed, stage=stage)
+
+    def record_usage(self, model: str, usage, seconds: float | None = None):
+        """Compte les tokens et le coût d'une réponse OpenAI (`usage` de l'API, éventuellement None)."""
+        input_tokens = getattr(usage, "input_tokens", None) or 0
+        output_tokens = getattr(usage, "output_tokens", None) or 0
+        price_in, price_out = _price(model)
+        cost = (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+        self.inc("flashcards_openai_requests_total", model=model)
+        self.inc("flashcards_openai_input_tokens_total", input_tokens, model=model)
+        self.inc("flashcards_openai_output_tokens_total", output_tokens, model=model)
+        self.inc("flashcards_openai_cost_usd_total", cost, model=model)
+        self.recent_requests.append(
+            {
+                "at": time.time(),
+                "model": model,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cost_usd": cost,
+                "seconds": seconds,
+            }
+        )
+
+    def register_collector(self, collect):
+        """`collect()` retourne des `(nom, labels, valeur)`, publiés comme jauges à chaque lecture."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def _collected(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        gauges = []
+        for collect in collectors:
+            try:
+                gauges.extend(collect())
+            except Exception:
+                continue  # une source indisponible ne doit pas casser l'export
+        return gauges
+
+    def snapshot(self) -> dict:
+        """Vue résumée pour le panneau d'administration."""
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {
+                dict(labels).get("stage", name): {
+                    "count": h.count,
+                    "total_s": h.total,
+                    "mean_s": h.total / h.count if h.count else 0.0,
+                    "p95_s": h.quantile(0.95),
+                }
+                for (name, labels), h in self._histograms.items()
+                if name == "flashcards_stage_seconds"
+            }
+            recent = list(self.recent_requests)
+
+        def _total(name):
+            return sum(value for (n, _), value in counters.items() if n == name)
+
+        return {
+            "stages": stages,
+            "openai": {
+                "requests": _total("flashcards_openai_requests_total"),
+                "retries": _total("flashcards_openai_retries_total"),
+                "input_tokens": _total("flashcards_openai_input_tokens_total"),
+                "output_tokens": _total("flashcards_openai_output_tokens_total"),
+                "cost_usd": _total("flashcards_openai_cost_usd_total"),
+            },
+            "gauges": [(name, dict(labels), value) for name, labels, value in self._collected()],
+            "recent_requests": recent,
+        }
+
+    def render_prometheus(self) -> str:
+        """Texte au format d'exposition Prometheus (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h.counts), h.total, h.count)) for key, h in self._histograms.items()
+            )
+        series = {}
+        for (name, labels), value in counters:
+            series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (counts, total, count) in histograms:
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name, labels, value in self._collected():
+            series.setdefault(name, []).append(
+                f"{name}{_format_labels(_labels_key(labels))} {_format_value(value)}"
+            )
+
+        out = []
+        for name, lines in series.items():
+            kind, description = _DESCRIPTIONS.get(name, ("untyped", ""))
+            if description:
+                out.append(f"# HELP {name} {description}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+METRICS = Metrics()
+
+
+def cache_gauges(name: str, cache):
+    """Jauges d'un `TieredCache` (taux de succès, lectures, taille mémoire) pour `register_collector`."""
+    stats = cache.stats()
+    lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+    return [
+        ("flashcards_cache_hit_ratio", {"cache": name}, stats["hit_ratio"]),
+        ("flashcards_cache_lookups", {"cache": name}, lookups),
+        ("flashcards_cache_memory_bytes", {"cache": name}, stats["memory_bytes"]),
+    ]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_exporter(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Sert `GET /metrics` dans un thread dédié ; retourne le serveur (`shutdown()` pour l'arrêter)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
@@ -0,0 +1,168 @@
+"""
+OCR des pages scannées (sans couche texte), en complément de pdf_extraction.
+
+Seules les pages dont le texte extrait est (quasi) vide sont rastérisées avec
+`pdftoppm` (poppler-utils) puis lues par `tesseract` ; ces outils sont installés
+par le Dockerfile. Les pages sont traitées par un pool de processus borné et le
+résultat est mis en cache par (empreinte du document, numéro de page, DPI), de
+sorte qu'une page n'est passée à l'OCR qu'une seule fois.
+"""
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+DEFAULT_OCR_WORKERS = 2
+DEFAULT_DPI = 300
+DEFAULT_LANG = "fra+eng"
+DEFAULT_PAGE_TIMEOUT = 90.0
+
+# En deçà, la page est considérée comme sans couche texte (numéro de page, en-tête...).
+MIN_TEXT_CHARS = 16
+
+
+def ocr_available() -> bool:
+    return shutil.which("pdftoppm") is not None and shutil.which("tesseract") is not None
+
+
+def needs_ocr(page_text: str) -> bool:
+    return len(page_text.strip()) < MIN_TEXT_CHARS
+
+
+def ocr_cache_key(digest: str, page_number: int, dpi: int, lang: str) -> str:
+    return f"ocr:{digest}:{page_number}:{dpi}:{lang}"
+
+
+def _ocr_page(pdf_path: str, page_number: int, dpi: int, lang: str, timeout: float) -> str:
+    """Rastérise puis lit une page (numérotée à partir de 0) ; exécuté dans un processus du pool."""
+    with tempfile.TemporaryDirectory(prefix="flashcards-ocr-") as tmp:
+        prefix = os.path.join(tmp, "page")
+        subprocess.run(
+            [
+                "pdftoppm", "-f", str(page_number + 1), "-l", str(page_number + 1),
+                "-r", str(dpi), "-gray", "-png", "-singlefile", pdf_path, prefix,
+            ],
+            check=True,
+            capture_output=True,
+            timeout=timeout,
+        )
+        result = subprocess.run(
+            ["tesseract", prefix + ".png", "stdout", "-l", lang],
+            check=True,
+            capture_output=True,
+            timeout=timeout,
+        )
+    return result.stdout.decode("utf-8", errors="replace").strip()
+
+
+class OcrPool:
+    """
+    Pool de processus OCR partagé par le serveur. `fill_pages` complète un flux
+    de pages : les pages vides sont remplacées par leur texte OCR, dans l'ordre.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_OCR_WORKERS,
+        dpi: int = DEFAULT_DPI,
+        lang: str = DEFAULT_LANG,
+        page_timeout: float = DEFAULT_PAGE_TIMEOUT,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.dpi = dpi
+        self.lang = lang
+        self.page_timeout = page_timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset_executor(self, broken=None):
+        with self._lock:
+            if broken is not None and self._executor is not broken:
+                return  # déjà remplacé après la panne
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def fill_pages(self, data: bytes, digest: str, pages, cache=None):
+        """
+        Génère le texte des `pages` (flux de textes extraits de `data`) en passant
+        les pages sans texte à l'OCR. Au plus `2 × max_workers` pages sont en
+        cours d'OCR ; une page en échec garde son texte d'origine.
+        """
+        pending = deque()  # (page_number, texte d'origine, (task, executor) ou None)
+        pdf_path = None
+        in_flight = 0
+        try:
+            for page_number, page_text in enumerate(pages):
+                task = None
+                if needs_ocr(page_text):
+                    key = ocr_cache_key(digest, page_number, self.dpi, self.lang)
+                    cached = cache.get(key) if cache is not None else None
+                    if cached is not None:
+                        page_text = cached
+                    else:
+                        if pdf_path is None:
+                            # Les workers lisent le PDF sur disque : pas de copie des octets par page.
+                            fd, pdf_path = tempfile.mkstemp(prefix="flashcards-ocr-", suffix=".pdf")
+                            with os.fdopen(fd, "wb") as f:
+                                f.write(data)
+                        executor = self._get_executor()
+                        task = executor.submit(
+                            _ocr_page, pdf_path, page_number, self.dpi, self.lang, self.page_timeout
+                        ), executor
+                        in_flight += 1
+                pending.append((page_number, page_text, task))
+
+                while pending and (pending[0][2] is None or in_flight >= self.max_workers * 2):
+                    page_number, page_text, task = pending.popleft()
+                    if task is not None:
+                        in_flight -= 1
+                        page_text = self._resolve(task, digest, page_number, page_text, cache)
+                    yield page_text
+
+            while pending:
+                page_number, page_text, task = pending.popleft()
+                if task is not None:
+                    page_text = self._resolve(task, digest, page_number, page_text, cache)
+                yield page_text
+        finally:
+            for _, _, task in pending:
+                if task is not None:
+                    task[0].cancel()
+            if pdf_path is not None:
+                try:
+                    os.remove(pdf_path)
+                except OSError:
+                    pass
+
+    def _resolve(self, task, digest: str, page_number: int, fallback: str, cache) -> str:
+        future, executor = task
+        try:
+            text = future.result(timeout=self.page_timeout * 2)
+        except BrokenProcessPool:
+            # Un worker est mort : on repart d'un pool neuf pour les pages suivantes.
+            self._reset_executor(executor)
+            return fallback
+        except Exception:
+            future.cancel()
+            return fallback
+        if cache is not None:
+            cache.put(ocr_cache_key(digest, page_number, self.dpi, self.lang), text)
+        return text
+
+    def shutdown(self):
+        self._reset_executor()
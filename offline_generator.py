@@ -0,0 +1,596 @@
+"""
+Générateur de cartes hors ligne (sans API) : concepts clés détectés par YAKE,
+puis questions sur les passages et les phrases du document.
+
+Le texte est analysé une seule fois en un `Document` (paragraphes, positions
+des phrases, vues en minuscules, index des mots) que tous les générateurs
+interrogent ; le modèle est réutilisé tant que le même texte est régénéré.
+Sur les longs documents, YAKE est exécuté par sections dans un pool de
+processus, puis les mots-clés sont fusionnés et reclassés globalement.
+
+Les mêmes mots-clés servent à compresser le texte envoyé à OpenAI
+(`compress_text`) : seuls les passages les plus saillants tiennent dans le budget.
+"""
+import bisect
+import functools
+import hashlib
+import itertools
+import math
+import multiprocessing
+import os
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dedup import NearDuplicateIndex, card_text
+from generation import CHARS_PER_TOKEN, estimate_tokens
+from metrics import METRICS
+from pdf_extraction import PAGE_SEPARATOR
+
+CONCEPT_QUESTION_TEMPLATES = [
+    "Explique le rôle de « {keyword} » dans ce passage : {snippet}",
+    "Pourquoi « {keyword} » est-il important ici ? Contexte : {snippet}",
+    "Comment relierais-tu « {keyword} » aux autres idées du cours ? Contexte : {snippet}",
+    "Que se passerait-il sans « {keyword} » ? Appuie-toi sur : {snippet}",
+    "Définis « {keyword} » avec tes propres mots, à partir de : {snippet}",
+]
+
+PASSAGE_QUESTION_TEMPLATES = [
+    "Quelle est l’idée principale de ce passage ? « {snippet} »",
+    "Quels arguments ou exemples soutiennent ce passage ? « {snippet} »",
+    "Quelle conclusion peut-on tirer de ce passage ? « {snippet} »",
+    "Comment ce passage s’inscrit-il dans le reste du cours ? « {snippet} »",
+]
+
+SENTENCE_QUESTION_TEMPLATES = [
+    "Que signifie cette affirmation ? « {snippet} »",
+    "Es-tu d’accord avec cette affirmation ? Justifie. « {snippet} »",
+    "Reformule et explique : « {snippet} »",
+]
+
+
+@METRICS.span("offline_generation")
+def build_flashcards_from_text(text: str, n_cards: int):
+    """
+    Génère des flashcards qui poussent à une compréhension approfondie :
+    - détecte les concepts clés et pose des questions analytiques
+    - complète avec des questions critiques sur les passages importants
+    - recycle les passages et les phrases sous d'autres angles pour atteindre
+      le nombre demandé
+    Les quasi-doublons (fréquents quand un texte court est recyclé) sont écartés
+    au fil de l'eau : on continue de puiser jusqu'à `n_cards` cartes distinctes
+    ou jusqu'à épuisement des sources.
+    """
+    document = _document(text)
+    if not document.cleaned or n_cards <= 0:
+        return []
+
+    concepts = _extract_concepts(document, target=n_cards * 3)
+    candidates = itertools.chain(
+        _concept_flashcards(document, concepts),
+        _passage_flashcards(document),
+        _sentence_flashcards(document),
+    )
+    index = NearDuplicateIndex()
+    cards = []
+    for card in candidates:
+        if index.add(card_text(card)):
+            cards.append(card)
+            if len(cards) >= n_cards:
+                break
+    return cards
+
+
+def _split_into_paragraphs(text: str):
+    paragraphs = [p.strip() for p in re.split(r"\n{2,}", text) if len(p.strip()) > 0]
+    if not paragraphs:
+        paragraphs = [text.strip()]
+    return paragraphs
+
+
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+class ParagraphIndex:
+    """
+    Index inversé mot → paragraphes (identifiants croissants, tableaux compacts)
+    pour retrouver le premier paragraphe contenant un mot-clé sans balayer tout
+    le document. Les candidats sont ceux qui contiennent tous les mots du
+    mot-clé ; le plus rare sert de liste de départ, et la présence exacte
+    (sans casse) est vérifiée sur le paragraphe.
+    """
+
+    def __init__(self, lowered_paragraphs):
+        self._lowered = lowered_paragraphs
+        postings = {}
+        for pid, lowered in enumerate(lowered_paragraphs):
+            for word in set(_WORD_RE.findall(lowered)):
+                ids = postings.get(word)
+                if ids is None:
+                    ids = postings[word] = array("I")
+                ids.append(pid)
+        self._postings = postings
+
+    def find(self, keyword: str):
+        """Identifiant du premier paragraphe contenant `keyword` (sans casse), ou None."""
+        needle = keyword.lower()
+        words = _WORD_RE.findall(needle)
+        if words and all(w in self._postings for w in words):
+            # Intersection des listes triées, de la plus rare à la plus fréquente : chaque
+            # liste est parcourue par dichotomie à partir de la dernière position atteinte.
+            lists = sorted((self._postings[w] for w in set(words)), key=len)
+            rarest, others = lists[0], lists[1:]
+            positions = [0] * len(others)
+            for pid in rarest:
+                for k, ids in enumerate(others):
+                    i = positions[k] = bisect.bisect_left(ids, pid, positions[k])
+                    if i == len(ids) or ids[i] != pid:
+                        break
+                else:
+                    if needle in self._lowered[pid]:
+                        return pid
+        # Mot-clé à cheval sur des mots (ex. « cellule » dans « cellules ») : recherche directe.
+        for pid, lowered in enumerate(self._lowered):
+            if needle in lowered:
+                return pid
+        return None
+
+
+class Document:
+    """
+    Modèle du texte construit en une passe : paragraphes, phrases repérées par
+    leurs positions dans le paragraphe (tableaux `array`), paragraphes en
+    minuscules pour les recherches sans casse, et index des mots.
+    """
+
+    def __init__(self, text: str):
+        self.paragraphs = _split_into_paragraphs(text)
+        self.cleaned = re.sub(r"\s+", " ", text).strip()
+        self.lowered = [p.lower() for p in self.paragraphs]
+        # Phrases du paragraphe p : indices first_sentence[p] à first_sentence[p + 1].
+        self.first_sentence = array("I", [0])
+        self.sentence_paragraph = array("I")
+        self.sentence_start = array("I")
+        self.sentence_end = array("I")
+        for pid, paragraph in enumerate(self.paragraphs):
+            start = 0
+            for match in _SENTENCE_BREAK_RE.finditer(paragraph):
+                self._add_sentence(pid, paragraph, start, match.start())
+                start = match.end()
+            self._add_sentence(pid, paragraph, start, len(paragraph))
+            self.first_sentence.append(len(self.sentence_start))
+        self._index = None
+        self._keywords = {}  # top -> mots-clés YAKE (mémoïsés avec le document)
+
+    def _add_sentence(self, pid: int, paragraph: str, start: int, end: int):
+        while start < end and paragraph[start].isspace():
+            start += 1
+        while end > start and paragraph[end - 1].isspace():
+            end -= 1
+        if start < end:
+            self.sentence_paragraph.append(pid)
+            self.sentence_start.append(start)
+            self.sentence_end.append(end)
+
+    @property
+    def index(self) -> ParagraphIndex:
+        if self._index is None:
+            self._index = ParagraphIndex(self.lowered)
+        return self._index
+
+    def sentence(self, sid: int) -> str:
+        return self.paragraphs[self.sentence_paragraph[sid]][self.sentence_start[sid] : self.sentence_end[sid]]
+
+    def _lowered_sentence(self, sid: int) -> str:
+        return self.lowered[self.sentence_paragraph[sid]][self.sentence_start[sid] : self.sentence_end[sid]]
+
+    def sentence_ids(self, pid: int | None = None) -> range:
+        """Phrases d'un paragraphe, ou de tout le document si `pid` vaut None."""
+        if pid is None:
+            return range(len(self.sentence_start))
+        return range(self.first_sentence[pid], self.first_sentence[pid + 1])
+
+    def summarize(self, pid: int | None = None, keyword: str | None = None, max_sentences: int = 2):
+        """
+        Résumé d'un paragraphe (ou du document) : les phrases contenant `keyword`,
+        sinon les premières phrases, tronqué à `_truncate_words`.
+        """
+        sentence_ids = self.sentence_ids(pid)
+        if not sentence_ids:
+            return self.paragraphs[pid].strip() if pid is not None else self.cleaned
+
+        selected = []
+        if keyword:
+            keyword_lower = keyword.lower()
+            for sid in sentence_ids:
+                if keyword_lower in self._lowered_sentence(sid):
+                    selected.append(sid)
+                    if len(selected) >= max_sentences:
+                        break
+
+        if not selected:
+            selected = sentence_ids[:max_sentences]
+
+        # Sur tout le document, on reproduit la vue « texte nettoyé » (espaces normalisés).
+        render = self.sentence if pid is not None else lambda sid: self._flat(self.sentence(sid))
+        summary = " ".join(render(sid) for sid in selected[:max_sentences])
+        return _truncate_words(summary)
+
+    @staticmethod
+    def _flat(sentence: str) -> str:
+        return " ".join(sentence.split())
+
+    def flat_sentences(self):
+        """Phrases du document, espaces normalisés (vue « texte nettoyé »)."""
+        return [self._flat(self.sentence(sid)) for sid in self.sentence_ids()]
+
+
+_DOCUMENT_CACHE = OrderedDict()
+_DOCUMENT_CACHE_SIZE = 4
+_DOCUMENT_LOCK = threading.Lock()
+
+
+def _document(text: str) -> Document:
+    """Modèle du texte, réutilisé tant que le même texte est régénéré."""
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _DOCUMENT_LOCK:
+        document = _DOCUMENT_CACHE.get(key)
+        if document is not None:
+            _DOCUMENT_CACHE.move_to_end(key)
+            return document
+    document = Document(text)
+    with _DOCUMENT_LOCK:
+        _DOCUMENT_CACHE[key] = document
+        while len(_DOCUMENT_CACHE) > _DOCUMENT_CACHE_SIZE:
+            _DOCUMENT_CACHE.popitem(last=False)
+    return document
+
+
+# Taille (caractères) d'une section confiée à un processus YAKE.
+KEYWORD_SECTION_CHARS = 30_000
+KEYWORD_WORKERS = int(os.getenv("FLASHCARDS_KEYWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_KEYWORD_POOL = None
+_KEYWORD_POOL_LOCK = threading.Lock()
+
+
+def _keyword_pool() -> ProcessPoolExecutor:
+    global _KEYWORD_POOL
+    with _KEYWORD_POOL_LOCK:
+        if _KEYWORD_POOL is None:
+            _KEYWORD_POOL = ProcessPoolExecutor(
+                max_workers=KEYWORD_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _KEYWORD_POOL
+
+
+def _discard_keyword_pool(pool: ProcessPoolExecutor):
+    """Abandonne `pool` après la mort d'un worker ; le prochain appel en recrée un neuf."""
+    global _KEYWORD_POOL
+    with _KEYWORD_POOL_LOCK:
+        if _KEYWORD_POOL is pool:
+            _KEYWORD_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@functools.lru_cache(maxsize=8)
+def _keyword_extractor(top: int):
+    """Extracteur YAKE construit une fois par processus (import de yake au premier appel)."""
+    import yake
+
+    return yake.KeywordExtractor(lan="fr", n=3, top=top)
+
+
+def _section_keywords(text: str, top: int):
+    """Mots-clés YAKE d'une section ; exécuté dans un processus du pool."""
+    return _keyword_extractor(top).extract_keywords(text)
+
+
+def _keyword_sections(document: Document, max_chars: int = KEYWORD_SECTION_CHARS):
+    sections = []
+    current = []
+    size = 0
+    for paragraph in document.paragraphs:
+        flat = " ".join(paragraph.split())
+        if current and size + len(flat) > max_chars:
+            sections.append(" ".join(current))
+            current, size = [], 0
+        current.append(flat)
+        size += len(flat) + 1
+    if current:
+        sections.append(" ".join(current))
+    return sections
+
+
+def _merge_keywords(section_results, top: int):
+    """
+    Reclassement global : les scores YAKE (plus bas = meilleur) d'un même
+    mot-clé dans plusieurs sections sont combinés en moyenne harmonique divisée
+    par le nombre de sections, ce qui favorise les concepts présents partout.
+    """
+    merged = {}
+    for keywords in section_results:
+        for keyword, score in keywords:
+            key = keyword.lower()
+            entry = merged.setdefault(key, [keyword, 0.0])
+            entry[1] += 1.0 / max(score, 1e-12)
+    ranked = sorted(merged.values(), key=lambda entry: -entry[1])
+    return [(keyword, 1.0 / inverse_sum) for keyword, inverse_sum in ranked[:top]]
+
+
+def extract_keywords(document: Document, top: int):
+    """
+    Mots-clés YAKE du document, mémoïsés avec lui. Un document court est traité
+    d'un bloc, comme avant ; un long document est découpé en sections traitées
+    en parallèle puis fusionnées.
+    """
+    cached = document._keywords.get(top)
+    if cached is not None:
+        return cached
+
+    with METRICS.span("keywords"):
+        sections = _keyword_sections(document)
+        if len(sections) <= 1:
+            keywords = _section_keywords(document.cleaned, top)
+        elif KEYWORD_WORKERS <= 1:
+            keywords = _merge_keywords([_section_keywords(section, top) for section in sections], top)
+        else:
+            pool = _keyword_pool()
+            try:
+                results = list(pool.map(_section_keywords, sections, [top] * len(sections)))
+            except BrokenProcessPool:
+                # Un worker est mort : sections traitées ici, pool neuf au prochain document.
+                METRICS.inc("flashcards_keyword_pool_failures_total")
+                _discard_keyword_pool(pool)
+                results = [_section_keywords(section, top) for section in sections]
+            keywords = _merge_keywords(results, top)
+
+    document._keywords[top] = keywords
+    return keywords
+
+
+def _extract_concepts(document: Document, target: int):
+    """Retourne une liste de concepts avec leur paragraphe associé (None : tout le texte)."""
+    try:
+        keywords = extract_keywords(document, top=max(20, target))
+    except ImportError:
+        keywords = []  # yake absent : cartes tirées des passages et des phrases
+    except Exception as e:
+        METRICS.inc("flashcards_keyword_errors_total", error=type(e).__name__)
+        keywords = []
+
+    concepts = []
+    for keyword, score in keywords:
+        keyword = keyword.strip()
+        if not keyword:
+            continue
+        concepts.append({"keyword": keyword, "score": score, "paragraph": document.index.find(keyword)})
+    return concepts
+
+
+def _concept_flashcards(document: Document, concepts):
+    """Une carte par concept, du plus saillant au moins saillant."""
+    for i, concept in enumerate(sorted(concepts, key=lambda c: c["score"])):
+        pid = concept["paragraph"]
+        context = document.paragraphs[pid] if pid is not None else document.cleaned
+        snippet = _shorten(context)
+        template = CONCEPT_QUESTION_TEMPLATES[i % len(CONCEPT_QUESTION_TEMPLATES)]
+        question = template.format(keyword=concept["keyword"], snippet=snippet)
+        answer_text = document.summarize(pid, keyword=concept["keyword"])
+        answer = f"{answer_text}\n\n🔑 Concept clé : {concept['keyword']}"
+        yield {"question": question, "answer": answer}
+
+
+def _passage_flashcards(document: Document):
+    """
+    Une carte par paragraphe, puis, si on manque de paragraphes, les mêmes
+    paragraphes recyclés avec les autres angles (un tour par modèle de question).
+    """
+    paragraphs = document.paragraphs
+    n_templates = len(PASSAGE_QUESTION_TEMPLATES)
+    for round_ in range(n_templates):
+        for pid, paragraph in enumerate(paragraphs):
+            snippet = _shorten(paragraph, max_len=200 if round_ == 0 else 160)
+            template = PASSAGE_QUESTION_TEMPLATES[(pid + round_) % n_templates]
+            yield {"question": template.format(snippet=snippet), "answer": document.summarize(pid)}
+
+
+def _sentence_flashcards(document: Document):
+    """Une carte par phrase et par angle, phrase après phrase."""
+    sentences = document.flat_sentences()
+    n_templates = len(SENTENCE_QUESTION_TEMPLATES)
+    for round_ in range(n_templates):
+        for idx, sentence in enumerate(sentences):
+            snippet = _shorten(sentence, max_len=160)
+            template = SENTENCE_QUESTION_TEMPLATES[(idx + round_) % n_templates]
+            yield {"question": template.format(snippet=snippet), "answer": _truncate_words(sentence)}
+
+
+def _shorten(text: str, max_len: int = 220):
+    trimmed = text.strip()
+    if len(trimmed) <= max_len:
+        return trimmed
+    return trimmed[: max_len - 1].rstrip() + "…"
+
+
+def _truncate_words(text: str, max_words: int = 75):
+    words = text.strip().split()
+    if len(words) <= max_words:
+        return text.strip()
+    return " ".join(words[:max_words]) + "…"
+
+
+
+# --------------------------------------------------
+# Compression du texte envoyé à OpenAI
+# --------------------------------------------------
+# Taille visée d'un passage candidat (caractères).
+PASSAGE_CHARS = 1200
+# Ligne courte répétée en bord de page sur au moins autant de pages : en-tête,
+# pied de page, titre de diapo. Bord = premières / dernières lignes non vides.
+REPEATED_LINE_MIN = 3
+REPEATED_LINE_MAX_CHARS = 80
+PAGE_EDGE_LINES = 2
+# Mots-clés YAKE servant à classer les passages.
+SALIENCE_KEYWORDS = 100
+
+_PAGE_NUMBER_RE = re.compile(r"^(?:page\s*|p\.\s*)?\d{1,4}(?:\s*(?:/|sur|of)\s*\d{1,4})?$", re.I)
+_BIBLIOGRAPHY_HEADING_RE = re.compile(
+    r"^(?:bibliographie|références(?: bibliographiques)?|references|bibliography|sources|webographie)\s*:?$", re.I
+)
+_YEAR_RE = re.compile(r"\b(?:1[89]|20)\d{2}\b")
+_CITATION_MARK_RE = re.compile(r"\bet al\.|\bpp?\.\s*\d|\bdoi\b|\bisbn\b|https?://|\bvol\.\s*\d|\béd(?:\.|itions)\b", re.I)
+_NUMBERED_REFERENCE_RE = re.compile(r"^\[\d{1,3}\]\s")
+# Numéro de page en début ou en fin de ligne d'en-tête.
+_EDGE_NUMBER_RE = re.compile(
+    r"^(?:page\s*|p\.\s*)?\d{1,4}\b\W*|\W*\b(?:page\s*|p\.\s*)?\d{1,4}(?:\s*(?:/|sur|of)\s*\d{1,4})?$", re.I
+)
+
+
+def _page_edges(lines):
+    """Indices des PAGE_EDGE_LINES premières et dernières lignes non vides d'une page."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:PAGE_EDGE_LINES] + filled[-PAGE_EDGE_LINES:])
+
+
+def _edge_key(line: str) -> str:
+    # « Chapitre 2 — page 14 » et « Chapitre 2 — page 15 » sont le même en-tête.
+    return _EDGE_NUMBER_RE.sub("", line.strip().lower())
+
+
+def _strip_noise(text: str):
+    """
+    Retire les lignes qui ne deviendront jamais des cartes. Les pages sont
+    séparées par PAGE_SEPARATOR ; seuls les bords de page sont examinés pour
+    les numéros de page et les lignes courtes répétées (en-têtes, pieds de
+    page, titres de diapos). Les entrées de bibliographie ne sont retirées
+    qu'après un titre de bibliographie. Retourne `(texte, lignes retirées)`.
+    """
+    pages = [page.splitlines() for page in text.split(PAGE_SEPARATOR)]
+    edges = [_page_edges(lines) for lines in pages]
+    counts = Counter()
+    for lines, edge in zip(pages, edges):
+        counts.update(
+            {_edge_key(lines[i]) for i in edge if len(lines[i].strip()) <= REPEATED_LINE_MAX_CHARS}
+        )
+    kept = []
+    removed = 0
+    in_bibliography = False
+    for lines, edge in zip(pages, edges):
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if not stripped:
+                kept.append(line)
+                continue
+            if i in edge and (
+                _PAGE_NUMBER_RE.match(stripped) or counts[_edge_key(stripped)] >= REPEATED_LINE_MIN
+            ):
+                removed += 1
+            elif _BIBLIOGRAPHY_HEADING_RE.match(stripped):
+                in_bibliography = True
+                removed += 1
+            elif in_bibliography and (
+                _NUMBERED_REFERENCE_RE.match(stripped)
+                or (_YEAR_RE.search(stripped) and _CITATION_MARK_RE.search(stripped))
+            ):
+                removed += 1
+            else:
+                kept.append(line)
+    return "\n".join(kept), removed
+
+
+def _passages(paragraphs, max_chars: int = PASSAGE_CHARS):
+    """Découpe les paragraphes trop longs (texte PDF sans lignes vides) par lignes, puis par phrases."""
+    passages = []
+    for paragraph in paragraphs:
+        if len(paragraph) <= max_chars:
+            passages.append(paragraph)
+            continue
+        pieces = paragraph.splitlines()
+        if len(pieces) <= 1:
+            pieces = _SENTENCE_BREAK_RE.split(paragraph)
+        current = []
+        size = 0
+        for piece in pieces:
+            if current and size + len(piece) > max_chars:
+                passages.append("\n".join(current))
+                current = []
+                size = 0
+            current.append(piece)
+            size += len(piece) + 1
+        if current:
+            passages.append("\n".join(current))
+    return [passage for passage in passages if passage.strip()]
+
+
+def compress_text(text: str, max_tokens: int, report=None) -> str:
+    """
+    Texte à envoyer au modèle, réduit à environ `max_tokens` tokens : le bruit
+    est retiré, puis, si c'est encore trop long, seuls les passages les plus
+    saillants (mots-clés YAKE qu'ils contiennent, rapportés à leur longueur)
+    sont gardés, dans l'ordre du document. Les pages de `text` sont séparées
+    par PAGE_SEPARATOR (en-têtes et pieds de page détectés à leurs bords) ;
+    le texte retourné n'en contient plus. `max_tokens <= 0` désactive la
+    compression. `report` reçoit les tailles avant / après et le ratio.
+    """
+    original_tokens = estimate_tokens(text)
+    if max_tokens <= 0 or not text.strip():
+        compressed, removed, passages, kept = text.replace(PAGE_SEPARATOR, "\n"), 0, 0, 0
+    else:
+        with METRICS.span("compression"):
+            compressed, removed = _strip_noise(text)
+            paragraphs = _split_into_paragraphs(compressed)
+            candidates = _passages(paragraphs)
+            passages = kept = len(candidates)
+            if estimate_tokens(compressed) > max_tokens and candidates:
+                selected = _select_passages(compressed, candidates, max_tokens)
+                kept = len(selected)
+                compressed = "\n\n".join(candidates[i] for i in selected)
+            compressed = compressed.strip()
+
+    compressed_tokens = estimate_tokens(compressed)
+    METRICS.inc("flashcards_prompt_original_tokens_total", original_tokens)
+    METRICS.inc("flashcards_prompt_sent_tokens_total", compressed_tokens)
+    if report is not None:
+        report.update(
+            original_tokens=original_tokens,
+            compressed_tokens=compressed_tokens,
+            ratio=compressed_tokens / original_tokens if original_tokens else 1.0,
+            removed_lines=removed,
+            passages=passages,
+            kept_passages=kept,
+        )
+    return compressed
+
+
+def _select_passages(text: str, candidates, max_tokens: int):
+    """Indices des passages gardés (ordre du document) : les plus saillants qui tiennent dans le budget."""
+    concepts = _extract_concepts(_document(text), target=SALIENCE_KEYWORDS)
+    # Poids décroissant avec le rang YAKE (score bas = mot-clé pertinent).
+    ranked = sorted(concepts, key=lambda c: c["score"])
+    weights = [(c["keyword"].lower(), 1.0 - rank / len(ranked)) for rank, c in enumerate(ranked)]
+
+    scored = []
+    for i, passage in enumerate(candidates):
+        lowered = passage.lower()
+        salience = sum(weight for keyword, weight in weights if keyword in lowered)
+        tokens = estimate_tokens(passage)
+        # À saillance égale, les passages courts et ceux du début passent d'abord.
+        scored.append((salience / math.sqrt(tokens or 1), -i, tokens))
+
+    selected = []
+    budget = max_tokens
+    for _, neg_i, tokens in sorted(scored, reverse=True):
+        if tokens <= budget:
+            selected.append(-neg_i)
+            budget -= tokens + 1
+    if not selected:
+        # Même le meilleur passage dépasse le budget : on le tronque.
+        best = -max(scored)[1]
+        candidates[best] = candidates[best][: max_tokens * CHARS_PER_TOKEN]
+        selected = [best]
+    return sorted(selected)
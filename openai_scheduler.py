@@ -0,0 +1,155 @@
+"""
+Ordonnanceur asynchrone des appels OpenAI, partagé par toutes les sessions du serveur.
+
+Un thread dédié fait tourner une boucle asyncio et un client `AsyncOpenAI`.
+Chaque requête passe par :
+- un sémaphore qui borne le nombre d'appels simultanés ;
+- deux seaux à jetons (requêtes/minute et tokens/minute) ;
+- des tentatives avec attente exponentielle et gigue sur les erreurs transitoires (429, 5xx, réseau),
+  sans garder de place dans le sémaphore pendant l'attente. Un quota épuisé
+  (429 `insufficient_quota`) n'est pas transitoire : il n'est pas retenté.
+Le code Streamlit (synchrone) récupère des `concurrent.futures.Future`.
+Le SDK `openai` n'est importé qu'à la création de l'ordonnanceur.
+"""
+import asyncio
+import functools
+import random
+import threading
+import time
+
+from metrics import METRICS
+
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200_000
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 5
+
+
+@functools.cache
+def retryable_errors():
+    """Erreurs transitoires à retenter (import différé du SDK)."""
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+    return (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+def is_quota_error(error) -> bool:
+    """429 dû à un quota ou un crédit épuisé : réessayer ne sert à rien."""
+    return getattr(error, "code", None) == "insufficient_quota"
+
+
+class TokenBucket:
+    """Seau à jetons rechargé en continu à `rate_per_minute` ; capacité = une minute de débit."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount: float):
+        """Rend des jetons réservés en trop (ex. tokens estimés > tokens réellement consommés)."""
+        if amount > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def _retry_after(error) -> float | None:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        api_key: str | None = None,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="openai-scheduler", daemon=True
+        )
+        self._thread.start()
+
+        from openai import AsyncOpenAI
+
+        async def _init():
+            # Les retries sont gérés ici, pas par le SDK.
+            self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
+            self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+            self._requests = TokenBucket(requests_per_minute)
+            self._tokens = TokenBucket(tokens_per_minute)
+
+        asyncio.run_coroutine_threadsafe(_init(), self._loop).result()
+
+    async def _run(self, make_request, estimated_tokens: int):
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    with METRICS.span("openai_wait"):
+                        await self._requests.acquire(1)
+                        await self._tokens.acquire(estimated_tokens)
+                    with METRICS.span("openai_request"):
+                        response = await make_request(self.client)
+            except retryable_errors() as e:
+                if attempt >= self.max_retries or is_quota_error(e):
+                    raise
+                METRICS.inc("flashcards_openai_retries_total", error=type(e).__name__)
+                # Attente exponentielle avec gigue complète, ou Retry-After si fourni ;
+                # la place dans le sémaphore est rendue pendant l'attente.
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            usage = getattr(response, "usage", None)
+            used = getattr(usage, "total_tokens", None)
+            if used is not None:
+                self._tokens.refund(estimated_tokens - used)
+            return response
+
+    def submit(self, make_request, estimated_tokens: int = 0):
+        """
+        Planifie `make_request(client)` (une coroutine sur le client `AsyncOpenAI`)
+        et retourne un `concurrent.futures.Future`.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._run(make_request, estimated_tokens), self._loop
+        )
+
+    def create_response(self, estimated_tokens: int = 0, **kwargs):
+        """Équivalent bloquant de `client.responses.create(**kwargs)`, via l'ordonnanceur."""
+        return self.submit(
+            lambda client: client.responses.create(**kwargs), estimated_tokens
+        ).result()
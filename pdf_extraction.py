@@ -0,0 +1,348 @@
+"""
+Extraction parallèle du texte des PDF.
+
+Les documents sont découpés en plages de pages traitées par un pool de processus
+borné ; les pages sont ensuite restituées dans l'ordre, au fil de l'eau. Les fonctions
+exécutées dans les workers vivent dans ce module (et non dans streamlit_app.py)
+pour pouvoir être importées par les processus enfants.
+
+pdfplumber n'est importé qu'à la première extraction : le démarrage de
+l'application n'en paie pas le coût.
+"""
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from caching import sha256_digest
+from metrics import METRICS
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_TIMEOUT = 120.0
+PAGES_PER_TASK = 16
+
+# Séparateur des pages dans les textes mis en cache.
+PAGE_SEPARATOR = "\f"
+
+
+def _count_pages(path: str) -> int:
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def iter_pdf_pages(stream):
+    """
+    Génère le texte des pages une à une, dans le processus courant.
+    Le flux (fichier uploadé, fichier disque...) est lu directement, sans copie
+    en mémoire, et le cache de chaque page est libéré après extraction.
+    """
+    import pdfplumber
+
+    stream.seek(0)
+    with pdfplumber.open(stream) as pdf:
+        for page in pdf.pages:
+            try:
+                yield page.extract_text() or ""
+            finally:
+                page.close()
+
+
+def _extract_page_range(path: str, start: int, stop: int):
+    """Extrait les pages [start, stop) ; exécuté dans un processus du pool."""
+    import pdfplumber
+
+    texts = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text() or "")
+            page.close()
+    return texts
+
+
+def _spool(data: bytes) -> str:
+    """Copie le PDF dans un fichier temporaire : les tâches reçoivent son chemin, pas ses octets."""
+    fd, path = tempfile.mkstemp(prefix="flashcards-pdf-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _terminate(executor: ProcessPoolExecutor):
+    """Arrête un pool, y compris ses workers occupés (shutdown seul les laisse finir)."""
+    # ProcessPoolExecutor n'expose l'arrêt des workers qu'à partir de Python 3.14.
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+class ExtractionPool:
+    """
+    Pool de processus partagé par le serveur. `iter_pages` répartit chaque
+    document en plages de pages et respecte un délai maximal par plage.
+
+    Une tâche hors délai ne peut pas être annulée une fois lancée : le pool qui
+    l'exécute est alors écarté (les nouvelles extractions partent sur un pool
+    neuf) et ses workers sont arrêtés dès qu'aucune extraction ne s'en sert plus.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        pages_per_task: int = PAGES_PER_TASK,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor = None
+        self._users = {}  # pool -> extractions en cours qui l'utilisent
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # "spawn" : le serveur Streamlit est multi-thread, fork n'y est pas sûr.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            executor = self._executor
+            self._users[executor] = self._users.get(executor, 0) + 1
+            return executor
+
+    def _release(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            self._users[executor] -= 1
+            if self._users[executor] or executor is self._executor:
+                return
+            del self._users[executor]
+        _terminate(executor)
+
+    def _retire(self, executor: ProcessPoolExecutor):
+        """Les extractions suivantes partiront d'un pool neuf."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Écarte `executor` (worker bloqué) et retourne le pool neuf qui le remplace."""
+        self._retire(executor)
+        replacement = self._acquire()
+        self._release(executor)
+        return replacement
+
+    def iter_pages(self, documents):
+        """
+        Génère `(index_document, texte_page)` dans l'ordre des documents et des pages.
+        Un document illisible ou hors délai produit une seule fois `(index, None)`.
+        Le nombre de tâches en vol est borné : les pages ne sont extraites qu'au
+        rythme où le consommateur les lit.
+        """
+        if not documents:
+            return
+        paths = []
+        executor = self._acquire()
+        try:
+            paths.extend(_spool(data) for data in documents)
+            count_futures = [executor.submit(_count_pages, path) for path in paths]
+            failed = set()
+            # (document, première page ou None, tâche, échéance). Chaque tâche a son propre
+            # délai, compté depuis sa soumission : le temps passé par le consommateur sur
+            # les pages précédentes (OCR...) n'est pas imputé aux suivantes.
+            window = deque()
+            current_doc = 0
+
+            def recycle(stuck_doc: int):
+                # Les tâches non terminées des autres documents sont relancées sur le pool neuf.
+                # Elles sont relevées avant l'arrêt de l'ancien pool, qui les marque terminées.
+                nonlocal executor
+                counts = [
+                    doc for doc, future in enumerate(count_futures)
+                    if doc != stuck_doc and doc not in failed and not future.done()
+                ]
+                ranges = [
+                    i for i, (doc, _, future, _) in enumerate(window)
+                    if future is not None and doc != stuck_doc and doc not in failed and not future.done()
+                ]
+                executor = self._recycle(executor)
+                for doc in counts:
+                    count_futures[doc] = executor.submit(_count_pages, paths[doc])
+                for i in ranges:
+                    doc, start, _, _ = window[i]
+                    window[i] = doc, start, submit(doc, start), time.monotonic() + self.timeout
+
+            def submit(doc: int, start: int):
+                return executor.submit(_extract_page_range, paths[doc], start, start + self.pages_per_task)
+
+            def iter_tasks():
+                for doc in range(len(paths)):
+                    try:
+                        n_pages = count_futures[doc].result(timeout=self.timeout)
+                    except BrokenProcessPool:
+                        raise
+                    except Exception:
+                        if not count_futures[doc].cancel() and not count_futures[doc].done():
+                            recycle(doc)
+                        yield doc, None
+                        continue
+                    for start in range(0, n_pages, self.pages_per_task):
+                        if doc in failed:
+                            break
+                        yield doc, start
+
+            tasks = iter_tasks()
+
+            def fill():
+                while len(window) < self.max_workers * 2:
+                    task = next(tasks, None)
+                    if task is None:
+                        return
+                    doc, start = task
+                    if start is None:
+                        window.append((doc, None, None, None))
+                        continue
+                    window.append((doc, start, submit(doc, start), time.monotonic() + self.timeout))
+
+            try:
+                fill()
+                while window:
+                    doc, _, future, deadline = window.popleft()
+                    current_doc = doc
+                    if doc in failed:
+                        if future is not None:
+                            future.cancel()
+                        fill()
+                        continue
+                    if future is None:
+                        failed.add(doc)
+                        yield doc, None
+                        fill()
+                        continue
+                    try:
+                        pages = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                    except BrokenProcessPool:
+                        raise
+                    except Exception:
+                        failed.add(doc)
+                        if not future.cancel() and not future.done():
+                            recycle(doc)  # tâche toujours en cours : son worker est bloqué
+                        yield doc, None
+                        fill()
+                        continue
+                    # Soumettre la suite avant de céder les pages : les workers restent occupés.
+                    fill()
+                    for page_text in pages:
+                        yield doc, page_text
+            except BrokenProcessPool:
+                # Un worker est mort (PDF pathologique, OOM...) : on repart d'un pool neuf.
+                self._retire(executor)
+                for doc in range(current_doc, len(documents)):
+                    if doc not in failed:
+                        yield doc, None
+            finally:
+                for _, _, future, _ in window:
+                    if future is not None:
+                        future.cancel()
+                for future in count_futures:
+                    future.cancel()
+        finally:
+            self._release(executor)
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            if executor is None or self._users.get(executor):
+                return
+            self._users.pop(executor, None)
+        _terminate(executor)
+
+
+def _iter_cached_pages(cached: str):
+    start = 0
+    while True:
+        end = cached.find(PAGE_SEPARATOR, start)
+        if end == -1:
+            yield cached[start:]
+            return
+        yield cached[start:end]
+        start = end + 1
+
+
+def iter_document_pages(documents, cache=None, pool: ExtractionPool | None = None, on_error=None, ocr=None):
+    """
+    Génère le texte des pages d'une liste de `(nom, octets)` PDF, dans l'ordre.
+    Les documents présents dans `cache` (clé : empreinte SHA-256) ne sont pas
+    re-parsés ; les autres sont extraits au fil de la lecture par `pool`, ou en
+    flux dans le processus courant si `pool` vaut None. Avec `ocr` (un
+    `ocr.OcrPool`), les pages sans couche texte passent à l'OCR. Un document
+    n'est mis en cache que s'il a été lu jusqu'au bout ; `on_error(nom)`
+    signale les échecs. Le temps d'extraction est mesuré (étape « extraction »).
+    """
+    return METRICS.timed(_iter_document_pages(documents, cache, pool, on_error, ocr), "extraction")
+
+
+def _iter_document_pages(documents, cache, pool, on_error, ocr):
+    suffix = f":ocr{ocr.dpi}:{ocr.lang}" if ocr is not None else ""
+    entries = []
+    for name, data in documents:
+        digest = sha256_digest(data)
+        key = "pages:" + digest + suffix
+        entries.append((name, data, digest, key, cache.get(key) if cache is not None else None))
+
+    if pool is not None:
+        results = pool.iter_pages([data for _, data, _, _, cached in entries if cached is None])
+        current = next(results, None)
+
+    failed = False
+
+    def _pool_pages(doc: int):
+        nonlocal current, failed
+        while current is not None and current[0] == doc:
+            if current[1] is None:
+                failed = True
+            else:
+                yield current[1]
+            current = next(results, None)
+
+    def _local_pages(data: bytes):
+        nonlocal failed
+        try:
+            yield from iter_pdf_pages(io.BytesIO(data))
+        except Exception:
+            failed = True
+
+    miss_index = -1
+    for name, data, digest, key, cached in entries:
+        if cached is not None:
+            yield from _iter_cached_pages(cached)
+            continue
+
+        miss_index += 1
+        pages = []
+        failed = False
+        source = _pool_pages(miss_index) if pool is not None else _local_pages(data)
+        if ocr is not None:
+            source = ocr.fill_pages(data, digest, source, cache=cache)
+        for page_text in source:
+            pages.append(page_text)
+            yield page_text
+
+        if failed:
+            if on_error is not None:
+                on_error(name)
+        elif cache is not None:
+            cache.put(key, PAGE_SEPARATOR.join(pages))
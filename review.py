@@ -0,0 +1,162 @@
+"""
+Répétition espacée (algorithme SM-2) et file des cartes à réviser.
+
+L'état de chaque carte (facilité, intervalle, répétitions, échéance) est rangé
+dans le DeckStore, indexé par échéance. Une `ReviewSession` garde en mémoire un
+tas des prochaines échéances, rechargé par petits lots depuis cet index : le
+choix de la carte suivante coûte O(log n) quelle que soit la taille du jeu.
+Les notes sont accumulées puis écrites par lots (`flush`) : toutes les
+FLUSH_EVERY notes, à la première note ou au premier affichage (`flush_if_due`)
+FLUSH_AFTER_SECONDS après la dernière écriture, et à l'arrêt du serveur.
+"""
+import atexit
+import heapq
+import time
+import weakref
+
+from decks import DEFAULT_EASE
+
+GRADE_AGAIN = 0
+GRADE_HARD = 3
+GRADE_GOOD = 4
+GRADE_EASY = 5
+
+MIN_EASE = 1.3
+DAY = 86400.0
+# Une carte ratée revient dans la séance, après ce délai.
+RELEARN_DELAY = 10 * 60.0
+
+PREFETCH = 64
+FLUSH_EVERY = 20
+FLUSH_AFTER_SECONDS = 30.0
+
+# Séances ouvertes, écrites à l'arrêt du processus.
+_SESSIONS = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_sessions():
+    for session in list(_SESSIONS):
+        try:
+            session.flush()
+        except Exception:
+            pass
+
+
+class CardState:
+    __slots__ = ("position", "ease", "interval", "repetitions", "lapses", "due")
+
+    def __init__(self, position, ease=DEFAULT_EASE, interval=0.0, repetitions=0, lapses=0, due=0.0):
+        self.position = position
+        self.ease = ease
+        self.interval = interval  # en jours
+        self.repetitions = repetitions
+        self.lapses = lapses
+        self.due = due
+
+    def as_row(self):
+        return (self.position, self.ease, self.interval, self.repetitions, self.lapses, self.due)
+
+
+def sm2(state: CardState, grade: int, now: float) -> CardState:
+    """Nouvel état après une note de 0 (oubli) à 5 (parfait)."""
+    ease = max(MIN_EASE, state.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    if grade < GRADE_HARD:
+        return CardState(state.position, ease, 0.0, 0, state.lapses + 1, now + RELEARN_DELAY)
+    repetitions = state.repetitions + 1
+    if repetitions == 1:
+        interval = 1.0
+    elif repetitions == 2:
+        interval = 6.0
+    else:
+        interval = state.interval * ease
+    return CardState(state.position, ease, interval, repetitions, state.lapses, now + interval * DAY)
+
+
+class ReviewSession:
+    """
+    Séance de révision d'un jeu. `next_due` donne la carte à l'échéance la plus
+    proche ; `grade` applique SM-2 et met l'écriture en attente ; `flush` écrit
+    les états et le journal en une transaction.
+    """
+
+    def __init__(self, store, user: str, deck: str, prefetch: int = PREFETCH, flush_every: int = FLUSH_EVERY):
+        self.store = store
+        self.user = user
+        self.deck = deck
+        self.prefetch = prefetch
+        self.flush_every = flush_every
+        self._heap = []  # (échéance, position) ; entrées périmées ignorées au dépilage
+        self._states = {}  # position -> CardState des cartes présentes dans le tas
+        self._horizon = float("inf")  # au-delà, les échéances ne sont pas dans le tas
+        self._pending = {}  # position -> CardState pas encore écrit
+        self._events = []
+        self._last_flush = time.monotonic()
+        self._loaded = False
+        _SESSIONS.add(self)
+
+    def _refill(self):
+        self.flush()
+        rows = self.store.due_states(self.user, self.deck, self.prefetch)
+        self._states = {row[0]: CardState(*row) for row in rows}
+        self._heap = [(state.due, position) for position, state in self._states.items()]
+        heapq.heapify(self._heap)
+        # Si le lot est complet, des cartes plus lointaines restent en base.
+        self._horizon = rows[-1][5] if len(rows) >= self.prefetch else float("inf")
+        self._loaded = True
+
+    def _peek(self):
+        while self._heap:
+            due, position = self._heap[0]
+            state = self._states.get(position)
+            if state is not None and state.due == due:
+                return state
+            heapq.heappop(self._heap)
+        return None
+
+    def next_due(self):
+        """État de la prochaine carte (même si elle n'est pas encore échue), ou None si le jeu est vide."""
+        if not self._loaded:
+            self._refill()
+        state = self._peek()
+        if state is None and self._horizon != float("inf"):
+            self._refill()
+            state = self._peek()
+        return state
+
+    def grade(self, position: int, grade: int, now: float | None = None) -> CardState:
+        now = time.time() if now is None else now
+        state = self._states.get(position) or self._pending.get(position) or CardState(position)
+        new_state = sm2(state, grade, now)
+        self._pending[position] = new_state
+        self._events.append((position, grade, now))
+        if new_state.due <= self._horizon:
+            self._states[position] = new_state
+            heapq.heappush(self._heap, (new_state.due, position))
+        else:
+            self._states.pop(position, None)
+        if len(self._events) >= self.flush_every:
+            self.flush()
+        else:
+            self.flush_if_due()
+        return new_state
+
+    def flush_if_due(self):
+        """Écrit les notes en attente si la dernière écriture date de FLUSH_AFTER_SECONDS ou plus."""
+        if time.monotonic() - self._last_flush >= FLUSH_AFTER_SECONDS:
+            self.flush()
+
+    def flush(self):
+        if self._events:
+            self.store.save_reviews(
+                self.user, self.deck, [state.as_row() for state in self._pending.values()], self._events
+            )
+            self._pending = {}
+            self._events = []
+        self._last_flush = time.monotonic()
+
+    def due_count(self, now: float | None = None) -> int:
+        """Cartes échues, sans forcer l'écriture des notes en attente (estimation)."""
+        now = time.time() if now is None else now
+        reviewed = sum(1 for state in self._pending.values() if state.due > now)
+        return max(0, self.store.due_count(self.user, self.deck, now) - reviewed)
@@ -0,0 +1,76 @@
+"""
+Normalisation du français pour la recherche plein texte (index FTS5 du DeckStore).
+
+Le texte indexé et les requêtes passent par la même chaîne : minuscules,
+accents retirés, élisions (« l’ », « qu’ »...) et mots vides supprimés, puis
+racinisation légère (pluriels, féminins, infinitifs en -er), de sorte que
+« mitochondries » trouve « la mitochondrie » et « énergétique » trouve
+« energetiques ». La liste des mots vides suit celle du français de YAKE
+(`lan="fr"`), utilisé pour les mots-clés.
+"""
+import re
+import unicodedata
+
+# Diacritiques combinants (accents) supprimés après décomposition NFKD.
+_STRIP_ACCENTS = dict.fromkeys(range(0x300, 0x370))
+_ELISION_RE = re.compile(r"\b(?:[cdjlmnst]|qu|jusqu|lorsqu|puisqu|quoiqu)['’]")
+_WORD_RE = re.compile(r"\w+")
+
+FRENCH_STOPWORDS = frozenset(
+    """
+    a ai aie aient aies ait as au aux avec avaient avais avait avez aviez avions avons c ce ceci cela
+    celle celles celui ces cet cette ceux d dans de des du elle elles en es est et etaient etais etait
+    etant ete etes etiez etions etre eu eux fut ici il ils j je l la le les leur leurs lui m ma mais me
+    meme mes moi mon n ne ni nos notre nous on ont ou par pas peu plus pour qu que quel quelle quelles
+    quels qui s sa sans se sera seront ses si son sont sur ta te tes toi ton tous tout toute toutes tu
+    un une vos votre vous y
+    """.split()
+)
+
+
+def _fold(text: str) -> str:
+    return unicodedata.normalize("NFKD", text.lower()).translate(_STRIP_ACCENTS)
+
+
+def stem(word: str) -> str:
+    """Racinisation légère (mot déjà sans accents) : pluriels, féminins, -er, consonne doublée finale."""
+    if len(word) > 5 and word.endswith("aux"):
+        word = word[:-3] + "al"
+    elif len(word) > 3 and word[-1] in "sx":
+        word = word[:-1]
+    if len(word) > 4 and word.endswith("er"):
+        word = word[:-2]
+    elif len(word) > 4 and word.endswith("e"):
+        word = word[:-1].rstrip("e") if word.endswith("ee") else word[:-1]
+    if len(word) > 4 and word[-1] == word[-2] and not word[-1].isdigit():
+        word = word[:-1]
+    return word
+
+
+def terms(text: str):
+    """Termes indexés d'un texte, dans l'ordre."""
+    text = _ELISION_RE.sub(" ", _fold(text))
+    return [stem(word) for word in _WORD_RE.findall(text) if word not in FRENCH_STOPWORDS]
+
+
+def normalize(text: str) -> str:
+    """Texte normalisé, tel qu'il est rangé dans l'index."""
+    return " ".join(terms(text))
+
+
+# En deçà, le dernier terme n'est pas cherché en préfixe (trop de mots candidats).
+MIN_PREFIX_CHARS = 3
+
+
+def fts_query(query: str) -> str | None:
+    """
+    Requête FTS5 : tous les termes doivent être présents, le dernier en préfixe
+    (recherche au fil de la frappe). None si la requête ne contient aucun terme.
+    """
+    words = terms(query)
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    if len(words[-1]) >= MIN_PREFIX_CHARS:
+        quoted[-1] += "*"
+    return " AND ".join(quoted)
@@ -1,17 +1,125 @@
+import functools
 import html
-import io
+import itertools
 import re
+import time
+import uuid
 
-import pdfplumber
 import streamlit as st
-import yake
 
 import os
-import json
-from openai import OpenAI
 
-# Initialise le client OpenAI avec ta clé secrète (venant de Streamlit Secrets)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from generation import (
+    DEFAULT_CHUNK_TOKENS,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MODEL,
+    DEFAULT_OVERLAP_TOKENS,
+    PARSE_STATS,
+    GenerationError,
+    cached_generation,
+    generate_deck,
+    generation_cache_key,
+    iter_paragraphs,
+    stream_cards,
+    text_digest,
+)
+from openai_scheduler import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE,
+    RequestScheduler,
+    is_quota_error,
+)
+from caching import TieredCache, default_cache_dir, default_data_dir
+from decks import CardWindow, DeckStore, parse_deck_file
+from metrics import METRICS, cache_gauges, start_exporter
+from offline_generator import build_flashcards_from_text, compress_text
+from hybrid import DEFAULT_CARD_TIMEOUT, STATUS_DONE as HYBRID_DONE, STATUS_REFINING, HybridDeck
+from jobs import (
+    DEFAULT_JOB_WORKERS,
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_QUEUED,
+    STATUS_RUNNING,
+    JobStore,
+    JobWorkers,
+    process_generation_job,
+)
+from pdf_extraction import DEFAULT_TIMEOUT, DEFAULT_WORKERS, PAGE_SEPARATOR, ExtractionPool, iter_document_pages
+from ocr import DEFAULT_DPI, DEFAULT_LANG, DEFAULT_OCR_WORKERS, OcrPool, ocr_available
+from review import GRADE_AGAIN, GRADE_EASY, GRADE_GOOD, GRADE_HARD, ReviewSession
+
+
+@st.cache_resource(show_spinner=False)
+def get_openai_scheduler():
+    """
+    Client OpenAI asynchrone unique pour tout le serveur (clé venant de Streamlit Secrets),
+    avec limites de débit et de concurrence partagées par toutes les sessions.
+    """
+    return RequestScheduler(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        requests_per_minute=float(os.getenv("FLASHCARDS_OPENAI_RPM", str(DEFAULT_REQUESTS_PER_MINUTE))),
+        tokens_per_minute=float(os.getenv("FLASHCARDS_OPENAI_TPM", str(DEFAULT_TOKENS_PER_MINUTE))),
+        max_concurrency=int(os.getenv("FLASHCARDS_OPENAI_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY))),
+        max_retries=int(os.getenv("FLASHCARDS_OPENAI_MAX_RETRIES", str(DEFAULT_MAX_RETRIES))),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_generation_cache():
+    """Cache des cartes générées, partagé par tout le serveur (TTL + plafond de taille)."""
+    return TieredCache(
+        memory_bytes=int(os.getenv("FLASHCARDS_GENERATION_CACHE_MEMORY_MB", "16")) * 1024 * 1024,
+        disk_path=os.path.join(default_cache_dir(), "generations.sqlite3"),
+        disk_bytes=int(os.getenv("FLASHCARDS_GENERATION_CACHE_DISK_MB", "256")) * 1024 * 1024,
+        ttl=float(os.getenv("FLASHCARDS_GENERATION_CACHE_TTL_HOURS", "168")) * 3600,
+    )
+
+
+# 0 = pas de serveur /metrics (les mesures restent visibles dans le panneau d'administration).
+METRICS_PORT = int(os.getenv("FLASHCARDS_METRICS_PORT", "0"))
+ADMIN_PANEL = os.getenv("FLASHCARDS_ADMIN_PANEL", "0") == "1"
+
+
+@st.cache_resource(show_spinner=False)
+def get_metrics_exporter():
+    """
+    Branche les caches sur les mesures et démarre, une fois par processus, le
+    serveur Prometheus `GET /metrics` si FLASHCARDS_METRICS_PORT est défini.
+    """
+    extraction_cache = get_extraction_cache()
+    generation_cache = get_generation_cache()
+    METRICS.register_collector(lambda: cache_gauges("extraction", extraction_cache))
+    METRICS.register_collector(lambda: cache_gauges("generation", generation_cache))
+    METRICS.register_collector(
+        lambda: [
+            (f"flashcards_openai_parse_{outcome}", {}, count)
+            for outcome, count in PARSE_STATS.snapshot().items()
+        ]
+    )
+    if METRICS_PORT <= 0:
+        return None
+    return start_exporter(METRICS_PORT, os.getenv("FLASHCARDS_METRICS_HOST", "0.0.0.0"))
+
+
+@st.cache_resource(show_spinner=False)
+def get_deck_store():
+    """Jeux de cartes persistants (SQLite), partagés par toutes les sessions du serveur."""
+    return DeckStore(os.path.join(default_data_dir(), "decks.sqlite3"))
+
+
+def _openai_error_message(error) -> str:
+    from openai import RateLimitError  # déjà chargé si une erreur OpenAI est survenue
+
+    if is_quota_error(error):
+        return "Le quota OpenAI du serveur est épuisé. Préviens l’administrateur de l’application."
+    if isinstance(error, RateLimitError):
+        return (
+            "Le service OpenAI est très sollicité en ce moment. "
+            "Réessaie dans une minute."
+        )
+    return f"Erreur OpenAI : {error}"
 
 
 # --------------------------------------------------
@@ -24,321 +132,551 @@ st.set_page_config(
 )
 
 # --------------------------------------------------
-# State (navigation + face de la carte + flashcards + decks)
+# State (navigation + face de la carte + jeu courant)
 # --------------------------------------------------
 if "card_index" not in st.session_state:
     st.session_state.card_index = 0
 
-if "show_answer" not in st.session_state:
-    st.session_state.show_answer = False
-
-# decks = {nom_deck: [ {question, answer}, ... ]}
-if "decks" not in st.session_state:
-    st.session_state.decks = {}
-
 if "current_deck" not in st.session_state:
     st.session_state.current_deck = None
 
-if "flashcards" not in st.session_state:
-    st.session_state.flashcards = []
+# Les jeux vivent dans le DeckStore ; la session ne garde que la taille du jeu
+# courant et une fenêtre compacte de cartes autour du curseur (CardWindow).
+if "deck_size" not in st.session_state:
+    st.session_state.deck_size = 0
+    st.session_state.card_window = CardWindow()
+
+# Séance de répétition espacée du jeu courant, créée à la première note (`_review_session`).
+if "review_session" not in st.session_state:
+    st.session_state.review_session = None
+
+# Numéro d'affichage de la carte : chaque affichage produit un <details> neuf, fermé.
+if "card_renders" not in st.session_state:
+    st.session_state.card_renders = 0
+
+# Mode hybride : deck hors ligne en cours d'affinage par OpenAI (un seul à la fois).
+if "hybrid_deck" not in st.session_state:
+    st.session_state.hybrid_deck = None
+    st.session_state.hybrid_notice = None
+
+
+REVIEW_WINDOW = 20
+
 
+def _user_id() -> str:
+    """Identifiant anonyme porté par l'URL (?u=...) : les jeux survivent à un rafraîchissement."""
+    if "user_id" not in st.session_state:
+        user = st.query_params.get("u")
+        if not user:
+            user = uuid.uuid4().hex
+            st.query_params["u"] = user
+        st.session_state.user_id = user
+    return st.session_state.user_id
 
-def _flip_card():
-    st.session_state.show_answer = not st.session_state.show_answer
+
+def _reset_review():
+    """Oublie la séance de révision en cours, après avoir écrit ses notes."""
+    session = st.session_state.review_session
+    if session is not None:
+        session.flush()
+    st.session_state.review_session = None
+
+
+def _review_session() -> ReviewSession:
+    session = st.session_state.review_session
+    if session is None:
+        session = ReviewSession(get_deck_store(), _user_id(), st.session_state.current_deck)
+        st.session_state.review_session = session
+    return session
+
+
+def _open_deck(name):
+    _reset_review()
+    st.session_state.current_deck = name
+    st.session_state.deck_size = get_deck_store().count(_user_id(), name) if name else 0
+    st.session_state.card_window = CardWindow()
+    st.session_state.card_index = 0
+
+
+def _save_deck(name: str, cards, append: bool = False) -> int:
+    """
+    Enregistre les cartes du jeu `name` (remplacement ou ajout) sans leurs
+    quasi-doublons, y compris ceux des cartes déjà présentes en cas d'ajout ;
+    le curseur est conservé. Retourne le nombre de cartes enregistrées.
+    """
+    store = get_deck_store()
+    if st.session_state.current_deck == name:
+        # Notes en attente écrites d'abord : un remplacement reprend l'état des cartes inchangées.
+        _reset_review()
+    if append:
+        # Comparaison aux seules cartes du jeu qui partagent une bande MinHash (clés persistées).
+        before = store.count(_user_id(), name)
+        size = store.append_cards(_user_id(), name, cards, dedupe=True)
+        saved = size - before
+    else:
+        size = saved = store.replace_cards(_user_id(), name, cards, dedupe=True)
+    if st.session_state.current_deck == name:
+        st.session_state.deck_size = size
+        st.session_state.card_window = CardWindow()
+    return saved
+
+
+# Taille maximale d'un paragraphe source indexé pour la recherche (caractères).
+SOURCE_PARAGRAPH_CHARS = 2000
+
+
+def _index_sources(name: str, uploaded_files):
+    """Indexe les paragraphes des PDF dont viennent les cartes du jeu `name`, pour la recherche."""
+    get_deck_store().replace_sources(
+        _user_id(),
+        name,
+        [
+            (f.name, iter_paragraphs(iter_pages_from_pdfs([f]), max_chars=SOURCE_PARAGRAPH_CHARS))
+            for f in uploaded_files
+        ],
+    )
+
+
+def _open_search_result(deck: str, position: int):
+    _open_deck(deck)
+    st.session_state.card_index = position
+    st.session_state.page = "Cartes"
+    st.session_state.review_mode = "Parcourir"
+
+
+def _current_card(idx: int):
+    """`(question, réponse)` de la carte `idx` du jeu courant, lue par pages de REVIEW_WINDOW cartes."""
+    window = st.session_state.card_window
+    if idx not in window:
+        window = get_deck_store().window(
+            _user_id(), st.session_state.current_deck, idx - idx % REVIEW_WINDOW, REVIEW_WINDOW
+        )
+        st.session_state.card_window = window
+    return window.card(idx) if idx in window else None
 
 
 def _prev_card():
-    flashcards = st.session_state.flashcards
-    if flashcards:
-        n_cards = len(flashcards)
+    n_cards = st.session_state.deck_size
+    if n_cards:
         st.session_state.card_index = (st.session_state.card_index - 1) % n_cards
-        st.session_state.show_answer = False
 
 
 def _next_card():
-    flashcards = st.session_state.flashcards
-    if flashcards:
-        n_cards = len(flashcards)
+    n_cards = st.session_state.deck_size
+    if n_cards:
         st.session_state.card_index = (st.session_state.card_index + 1) % n_cards
-        st.session_state.show_answer = False
 
 
-def _split_sentences(text: str):
-    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()]
+def _grade_card(position: int, grade: int):
+    _review_session().grade(position, grade)
+
+
+# HTML déjà échappé des dernières cartes affichées, partagé par les sessions.
+# La carte est un <details> : le navigateur la retourne au clic, sans rerun.
+@functools.lru_cache(maxsize=256)
+def _flashcard_html(question: str, answer: str) -> str:
+    question_html = html.escape(question).replace("\n", "<br>")
+    answer_html = html.escape(answer).replace("\n", "<br>")
+    return f"""
+        <div class="flashcard-wrapper">
+            <details class="flip-card">
+              <summary class="flip-card-inner" title="Retourner la carte">
+                <div class="flip-card-front">
+                  <div class="flashcard-text">
+                    {question_html}
+                  </div>
+                </div>
+                <div class="flip-card-back">
+                  <div class="flashcard-text">
+                    {answer_html}
+                  </div>
+                </div>
+              </summary>
+            </details>
+        </div>
+        """
 
 
-def _summarize_context(text: str, keyword: str | None = None, max_sentences: int = 2):
-    sentences = _split_sentences(text)
-    if not sentences:
-        return text.strip()
+def _card_preview(n_cards: int):
+    """
+    Retourne un callback `on_card` qui affiche la première carte reçue dès son
+    arrivée, puis la liste des questions au fil du streaming.
+    """
+    card_placeholder = st.empty()
+    progress_placeholder = st.empty()
+    list_placeholder = st.empty()
+    received = []
+
+    def _on_card(card):
+        received.append(card)
+        if len(received) == 1:
+            card_placeholder.markdown(
+                _flashcard_html(card["question"], card["answer"]), unsafe_allow_html=True
+            )
+        progress_placeholder.caption(f"{min(len(received), n_cards)} / {n_cards} carte(s) reçue(s)…")
+        list_placeholder.markdown(
+            "\n".join(f"{i}. {c['question']}" for i, c in enumerate(received[1:], start=2))
+        )
 
-    selected = []
-    if keyword:
-        keyword_lower = keyword.lower()
-        selected = [s for s in sentences if keyword_lower in s.lower()]
+    def _clear():
+        card_placeholder.empty()
+        progress_placeholder.empty()
+        list_placeholder.empty()
 
-    if not selected:
-        selected = sentences[:max_sentences]
+    _on_card.clear = _clear
+    return _on_card
 
-    summary = " ".join(selected[:max_sentences])
-    return _truncate_words(summary)
 
 # ================================================================
 # Génération avancée avec OpenAI (question + réponse)
 # ================================================================
-def generate_flashcards_with_openai(text: str, n_cards: int):
+def _compress_prompt_text(text: str, token_budget: int) -> str:
+    """Compresse le texte (voir `compress_text`) et affiche le gain."""
+    report = {}
+    text = compress_text(text, token_budget, report=report)
+    if report["compressed_tokens"] < report["original_tokens"]:
+        st.caption(
+            f"🗜️ Texte envoyé : ~{report['compressed_tokens']} tokens sur {report['original_tokens']} "
+            f"({report['ratio']:.0%}) — {report['kept_passages']} / {report['passages']} passage(s) gardé(s), "
+            f"{report['removed_lines']} ligne(s) de bruit retirée(s)."
+        )
+    return text
+
+
+def generate_flashcards_with_openai(text: str, n_cards: int, force: bool = False, token_budget: int = 0):
     """
     Unified, robust OpenAI call that returns a list of {"question","answer"} dicts.
-    Handles different response shapes and shows raw output on JSON errors.
+    Identical requests are served from the generation cache unless `force` is set.
+    With `token_budget`, only the most salient passages of the text are sent;
+    pages are separated by PAGE_SEPARATOR. The cache key is the raw text and the
+    budget, so a cached request does not pay for the compression.
+    Shows raw output on JSON errors.
     """
     if not text or not text.strip():
         return []
 
-    prompt = f"""
-Tu es un expert pédagogique. À partir du texte suivant, génère {n_cards} cartes mémoire.
-Chaque carte mémoire doit contenir:
-- Une question claire, précise et difficile
-- Une réponse courte mais complète
-
-Format attendu (JSON strict) :
-[
-    {{"question": "...", "answer": "..."}},
-    ...
-]
-
-Texte fourni :
-{text}
-"""
-
+    key = generation_cache_key(text_digest([text]), n_cards, DEFAULT_MODEL, budget=token_budget)
+    on_card = _card_preview(n_cards)
     try:
-        st.write("🤖 OpenAI mode activé")
-        response = client.responses.create(
-            model="gpt-4o-mini",
-            input=prompt,
-            max_output_tokens=1200,
+        cards, from_cache = cached_generation(
+            get_generation_cache(),
+            key,
+            lambda: stream_cards(
+                get_openai_scheduler(), _compress_prompt_text(text, token_budget), n_cards, on_card
+            ),
+            force=force,
         )
+    except GenerationError as e:
+        on_card.clear()
+        st.error(f"Erreur OpenAI : {e}")
+        if e.raw:
+            st.write(e.raw)
+        return []
+    except Exception as e:
+        on_card.clear()
+        st.error(_openai_error_message(e))
+        return []
 
-        # Try common SDK output_text field first
-        raw = getattr(response, "output_text", "") or ""
+    on_card.clear()
+    if not cards:
+        st.error("Aucune carte valide trouvée dans la réponse OpenAI.")
+        return []
 
-        # If SDK returned structured "output", try to extract textual pieces
-        if not raw and hasattr(response, "output"):
-            parts = []
-            try:
-                for item in response.output:
-                    if isinstance(item, dict):
-                        # Newer SDKs may nest content blocks
-                        content = item.get("content") or item.get("text") or item.get("message")
-                        if isinstance(content, list):
-                            for c in content:
-                                if isinstance(c, dict):
-                                    parts.append(c.get("text", ""))
-                                else:
-                                    parts.append(str(c))
-                        elif content is not None:
-                            parts.append(str(content))
-                        else:
-                            # fallback to stringifying item
-                            parts.append(json.dumps(item, ensure_ascii=False))
-                    else:
-                        parts.append(str(item))
-            except Exception:
-                parts = []
-            raw = " ".join([p for p in parts if p]).strip()
-
-        raw = (raw or "").replace("```json", "").replace("```", "").strip()
-
-        # Parse JSON
-        cards_data = json.loads(raw)
-        cards = []
-        if isinstance(cards_data, list):
-            for item in cards_data:
-                if not isinstance(item, dict):
-                    continue
-                q = item.get("question") or item.get("q")
-                a = item.get("answer") or item.get("a")
-                if q and a:
-                    cards.append({"question": str(q).strip(), "answer": str(a).strip()})
-        else:
-            # If the model wrapped the array inside a field
-            st.write("Réponse OpenAI inattendue (attendu: liste JSON).")
-            st.write(cards_data)
+    if from_cache:
+        st.info("⚡ Cartes identiques déjà générées : servies depuis le cache.")
+    else:
+        st.write("🤖 OpenAI mode activé")
+        st.success("🔥 CARTES GÉNÉRÉES PAR OPENAI 🔥")
+    return cards[:n_cards]
 
-        if not cards:
-            st.error("Aucune carte valide trouvée dans la réponse OpenAI. Voir la sortie brute ci-dessous.")
-            st.write(raw)
-            return []
 
+def generate_flashcards_chunked_with_openai(
+    paragraphs,
+    n_cards: int,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    force: bool = False,
+):
+    """
+    Mode map-reduce pour les longs documents : un appel par morceau, puis fusion.
+    Pour une version révisée d'un document, seuls les morceaux modifiés sont régénérés.
+    """
+    on_card = _card_preview(n_cards)
+    report = {}
+    cards, from_cache, errors = generate_deck(
+        get_openai_scheduler(),
+        paragraphs,
+        n_cards,
+        cache=get_generation_cache(),
+        chunk_tokens=chunk_tokens,
+        overlap_tokens=overlap_tokens,
+        concurrency=concurrency,
+        force=force,
+        on_card=on_card,
+        report=report,
+    )
+    on_card.clear()
+    if from_cache:
+        st.info("⚡ Cartes identiques déjà générées : servies depuis le cache.")
+        return cards
+
+    st.write("🤖 OpenAI mode activé (document découpé en morceaux)")
+    reused = report.get("chunks", 0) - report.get("regenerated", 0)
+    if reused:
+        st.info(
+            f"♻️ {reused} / {report['chunks']} partie(s) inchangée(s) réutilisée(s) ; "
+            f"{report['regenerated']} régénérée(s)."
+        )
+    if errors:
+        st.warning(
+            f"{len(errors)} morceau(x) n’ont pas pu être traités. {_openai_error_message(errors[0])}"
+        )
+    elif report.get("shortfall"):
+        st.warning(
+            f"{len(cards)} cartes distinctes sur {n_cards} demandées : "
+            "les morceaux du document n’en ont pas fourni davantage."
+        )
+    if cards:
         st.success("🔥 CARTES GÉNÉRÉES PAR OPENAI 🔥")
-        return cards[:n_cards]
+    return cards
 
-    except Exception as e:
-        st.error(f"Erreur OpenAI : {e}")
-        if "raw" in locals():
-            st.write(raw)
-        return []
-def extract_text_from_pdf(uploaded_file) -> str:
-    """Extrait le texte d'un PDF uploadé."""
-    data = uploaded_file.read()
-    uploaded_file.seek(0)
-    text_parts = []
-    with pdfplumber.open(io.BytesIO(data)) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text() or ""
-            text_parts.append(page_text)
-    return "\n".join(text_parts)
-
-
-def build_flashcards_from_text(text: str, n_cards: int):
+
+HYBRID_POLL_SECONDS = 1
+HYBRID_TIMEOUT = float(os.getenv("FLASHCARDS_HYBRID_TIMEOUT", str(DEFAULT_CARD_TIMEOUT)))
+
+
+def _openai_producer(
+    pages,
+    n_cards: int,
+    chunked: bool,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    force: bool = False,
+    token_budget: int = 0,
+):
     """
-    Génère des flashcards qui poussent à une compréhension approfondie :
-    - détecte les concepts clés et pose des questions analytiques
-    - complète avec des questions critiques sur les passages importants
-    - garantit toujours le nombre demandé de cartes
+    Génération OpenAI `produce(on_card) -> cartes` pour le mode hybride :
+    exécutée dans un thread, elle n'appelle pas Streamlit (les ressources
+    partagées sont résolues ici, dans le thread du script).
     """
-    cleaned = re.sub(r"\s+", " ", text).strip()
-    if not cleaned:
-        return []
+    scheduler = get_openai_scheduler()
+    cache = get_generation_cache()
+    if chunked:
+        def _produce(on_card):
+            cards, _, errors = generate_deck(
+                scheduler,
+                iter_paragraphs(pages),
+                n_cards,
+                cache=cache,
+                chunk_tokens=chunk_tokens,
+                overlap_tokens=overlap_tokens,
+                concurrency=concurrency,
+                force=force,
+                on_card=on_card,
+            )
+            if not cards and errors:
+                raise errors[0]
+            return cards
+    elif not _head_pages(pages)[1]:
+        st.info(TOO_LONG_FOR_SINGLE_CALL)
+        return _openai_producer(
+            pages,
+            n_cards,
+            True,
+            chunk_tokens=chunk_tokens,
+            overlap_tokens=overlap_tokens,
+            concurrency=concurrency,
+            force=force,
+        )
+    else:
+        text = PAGE_SEPARATOR.join(pages)
+        key = generation_cache_key(text_digest([text]), n_cards, DEFAULT_MODEL, budget=token_budget)
+
+        def _produce(on_card):
+            # Compression (YAKE) seulement si la clé n'est pas en cache.
+            cards, _ = cached_generation(
+                cache,
+                key,
+                lambda: stream_cards(scheduler, compress_text(text, token_budget), n_cards, on_card),
+                force=force,
+            )
+            return cards[:n_cards]
+    return _produce
 
-    paragraphs = _split_into_paragraphs(text)
-    concepts = _extract_concepts(cleaned, paragraphs, target=n_cards * 3)
 
-    cards = _concept_flashcards(concepts, limit=n_cards)
-    if len(cards) < n_cards:
-        remaining = n_cards - len(cards)
-        cards.extend(_passage_flashcards(paragraphs, remaining))
+@st.fragment(run_every=HYBRID_POLL_SECONDS)
+def _render_hybrid_progress():
+    """
+    Suit l'affinage OpenAI : tant qu'il dure, seul ce fragment est relancé ;
+    le jeu affiné est enregistré une seule fois, à la fin.
+    """
+    hybrid = st.session_state.hybrid_deck
+    if hybrid is None:
+        return
+    _, status, cards = hybrid.snapshot()
+    if status == STATUS_REFINING:
+        st.caption(
+            f"🤖 OpenAI améliore le jeu « {hybrid.deck} » en arrière-plan : "
+            f"{hybrid.upgraded} / {hybrid.n_cards} carte(s) remplacée(s)…"
+        )
+        return
+
+    st.session_state.hybrid_deck = None
+    if hybrid.upgraded:
+        _save_deck(hybrid.deck, cards)
+    if status == HYBRID_DONE:
+        st.session_state.hybrid_notice = (
+            "success", f"🔥 Jeu « {hybrid.deck} » affiné par OpenAI ({hybrid.upgraded} carte(s))."
+        )
+    else:
+        kept = (
+            f"{hybrid.upgraded} carte(s) affinée(s), les autres restent hors ligne"
+            if hybrid.upgraded
+            else "Cartes hors ligne conservées"
+        )
+        st.session_state.hybrid_notice = (
+            "warning",
+            f"{kept} pour « {hybrid.deck} ». {_openai_error_message(hybrid.error)}",
+        )
+    # Un seul rerun complet : la révision affiche le jeu enregistré.
+    st.rerun()
 
-    if len(cards) < n_cards:
-        remaining = n_cards - len(cards)
-        cards.extend(_sentence_flashcards(cleaned, remaining))
 
-    return cards[:n_cards]
+@st.cache_resource(show_spinner=False)
+def get_extraction_cache():
+    """Cache partagé par toutes les sessions du serveur (mémoire LRU + SQLite)."""
+    return TieredCache(
+        memory_bytes=int(os.getenv("FLASHCARDS_EXTRACT_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+        disk_path=os.path.join(default_cache_dir(), "extraction.sqlite3"),
+        disk_bytes=int(os.getenv("FLASHCARDS_EXTRACT_CACHE_DISK_MB", "512")) * 1024 * 1024,
+    )
 
 
-def _split_into_paragraphs(text: str):
-    paragraphs = [p.strip() for p in re.split(r"\n{2,}", text) if len(p.strip()) > 0]
-    if not paragraphs:
-        paragraphs = [text.strip()]
-    return paragraphs
+# 0 worker = extraction en flux dans le processus Streamlit (aucune copie des octets).
+EXTRACT_WORKERS = int(os.getenv("FLASHCARDS_EXTRACT_WORKERS", str(DEFAULT_WORKERS)))
 
+# Au-delà, le texte ne tiendrait pas dans le contexte du modèle : génération par morceaux.
+MAX_PROMPT_CHARS = 360_000
+TOO_LONG_FOR_SINGLE_CALL = (
+    "📚 Document trop long pour un seul appel OpenAI : il est traité par morceaux."
+)
 
-def _extract_concepts(cleaned_text: str, paragraphs, target: int):
-    """Retourne une liste de concepts avec leur paragraphe associé."""
-    try:
-        extractor = yake.KeywordExtractor(lan="fr", n=3, top=max(20, target))
-        keywords = extractor.extract_keywords(cleaned_text)
-    except Exception:
-        keywords = []
-
-    concepts = []
-    for keyword, score in keywords:
-        keyword = keyword.strip()
-        if not keyword:
-            continue
-        pattern = re.compile(re.escape(keyword), re.IGNORECASE)
-        paragraph = next((p for p in paragraphs if pattern.search(p)), "")
-        context = paragraph if paragraph else cleaned_text
-        concepts.append({"keyword": keyword, "score": score, "context": context})
-    return concepts
-
-
-def _concept_flashcards(concepts, limit: int):
-    if limit <= 0:
-        return []
+# Budget du texte envoyé en un seul appel (0 = texte complet).
+PROMPT_TOKEN_BUDGET = int(os.getenv("FLASHCARDS_PROMPT_TOKEN_BUDGET", "8000"))
 
-    cards = []
-    templates = CONCEPT_QUESTION_TEMPLATES * ((limit // len(CONCEPT_QUESTION_TEMPLATES)) + 2)
-    template_cycle = iter(templates)
 
-    for concept in sorted(concepts, key=lambda c: c["score"]):
-        snippet = _shorten(concept["context"])
-        question = next(template_cycle, CONCEPT_QUESTION_TEMPLATES[0]).format(
-            keyword=concept["keyword"], snippet=snippet
-        )
-        answer_text = _summarize_context(concept["context"], keyword=concept["keyword"])
-        answer = f"{answer_text}\n\n🔑 Concept clé : {concept['keyword']}"
-        cards.append({"question": question, "answer": answer})
-        if len(cards) >= limit:
-            break
+@st.cache_resource(show_spinner=False)
+def get_extraction_pool():
+    """Pool de processus d'extraction, borné et partagé par toutes les sessions."""
+    return ExtractionPool(
+        max_workers=EXTRACT_WORKERS,
+        timeout=float(os.getenv("FLASHCARDS_EXTRACT_TIMEOUT", str(DEFAULT_TIMEOUT))),
+    )
 
-    return cards
 
+# 0 worker = pas d'OCR des pages scannées.
+OCR_WORKERS = int(os.getenv("FLASHCARDS_OCR_WORKERS", str(DEFAULT_OCR_WORKERS)))
 
-def _passage_flashcards(paragraphs, limit: int):
-    if limit <= 0:
-        return []
 
-    cards = []
-    templates = PASSAGE_QUESTION_TEMPLATES * ((limit // len(PASSAGE_QUESTION_TEMPLATES)) + 2)
-    template_cycle = iter(templates)
-
-    extended_paragraphs = paragraphs or [""]
-    idx = 0
-    while len(cards) < limit and idx < len(extended_paragraphs):
-        paragraph = extended_paragraphs[idx]
-        snippet = _shorten(paragraph, max_len=200)
-        template = next(template_cycle, PASSAGE_QUESTION_TEMPLATES[0])
-        question = template.format(snippet=snippet)
-        cards.append(
-            {
-                "question": question,
-                "answer": _summarize_context(paragraph or snippet),
-            }
-        )
-        idx += 1
-
-    # si on manque de paragraphes, on recycle avec d'autres angles
-    idx = 0
-    while len(cards) < limit and extended_paragraphs:
-        paragraph = extended_paragraphs[idx % len(extended_paragraphs)]
-        snippet = _shorten(paragraph, max_len=160)
-        template = next(template_cycle, PASSAGE_QUESTION_TEMPLATES[0])
-        question = template.format(snippet=snippet)
-        cards.append({"question": question, "answer": _summarize_context(paragraph)})
-        idx += 1
+@st.cache_resource(show_spinner=False)
+def get_ocr_pool():
+    """Pool OCR partagé (None si désactivé ou si tesseract / poppler sont absents)."""
+    if OCR_WORKERS <= 0 or not ocr_available():
+        return None
+    return OcrPool(
+        max_workers=OCR_WORKERS,
+        dpi=int(os.getenv("FLASHCARDS_OCR_DPI", str(DEFAULT_DPI))),
+        lang=os.getenv("FLASHCARDS_OCR_LANG", DEFAULT_LANG),
+    )
 
-    return cards
 
+def iter_pages_from_pdfs(uploaded_files):
+    """
+    Génère le texte des pages de plusieurs PDF uploadés, dans l'ordre reçu
+    (cache par empreinte SHA-256, puis pool de processus ou extraction en flux
+    si FLASHCARDS_EXTRACT_WORKERS=0) ; les pages scannées passent à l'OCR.
+    """
+    return iter_document_pages(
+        [(f.name, f.getvalue()) for f in uploaded_files],
+        cache=get_extraction_cache(),
+        pool=get_extraction_pool() if EXTRACT_WORKERS > 0 else None,
+        ocr=get_ocr_pool(),
+        on_error=lambda name: st.warning(
+            f"Impossible d’extraire « {name} » (PDF illisible ou délai dépassé)."
+        ),
+    )
 
-def _sentence_flashcards(cleaned_text: str, limit: int):
-    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", cleaned_text) if len(s.strip()) > 0]
-    if not sentences:
-        return []
 
-    cards = []
-    templates = SENTENCE_QUESTION_TEMPLATES * ((limit // len(SENTENCE_QUESTION_TEMPLATES)) + 2)
-    template_cycle = iter(templates)
+def extract_text_from_pdf(uploaded_file) -> str:
+    """Extrait le texte d'un PDF uploadé (mis en cache par empreinte SHA-256 du fichier)."""
+    return "\n".join(iter_pages_from_pdfs([uploaded_file]))
 
-    idx = 0
-    while len(cards) < limit:
-        sentence = sentences[idx % len(sentences)]
-        snippet = _shorten(sentence, max_len=160)
-        template = next(template_cycle, SENTENCE_QUESTION_TEMPLATES[0])
-        question = template.format(snippet=snippet)
-        cards.append({"question": question, "answer": _summarize_context(sentence)})
-        idx += 1
 
-    return cards
+def _head_pages(pages, max_chars: int = MAX_PROMPT_CHARS):
+    """
+    Lit les pages tant que le texte tient en un seul appel (`max_chars`).
+    Retourne `(pages lues, complet)` : si `complet` est faux, le document est
+    trop long et la lecture s'est arrêtée à la première page en trop (incluse) ;
+    les pages suivantes n'ont pas encore été extraites.
+    """
+    head = []
+    total = 0
+    for page_text in pages:
+        head.append(page_text)
+        total += len(page_text) + 1
+        if total > max_chars + 1:
+            return head, False
+    return head, True
+
+
+JOB_POLL_SECONDS = 3
+
+JOB_STATUS_LABELS = {
+    STATUS_QUEUED: "⏳ En attente",
+    STATUS_RUNNING: "⚙️ En cours",
+    STATUS_DONE: "✅ Terminé",
+    STATUS_FAILED: "❌ Échec",
+}
+
+
+def _run_generation_job(job, store):
+    # Ressources résolues au premier travail : le démarrage n'importe pas le SDK OpenAI.
+    process_generation_job(
+        job,
+        store,
+        scheduler=get_openai_scheduler(),
+        extraction_cache=get_extraction_cache(),
+        extraction_pool=get_extraction_pool() if EXTRACT_WORKERS > 0 else None,
+        ocr_pool=get_ocr_pool(),
+        generation_cache=get_generation_cache(),
+    )
+
 
+@st.cache_resource(show_spinner=False)
+def get_job_workers():
+    """File d'attente des générations par lots et ses workers, démarrés une fois par serveur."""
+    data_dir = default_data_dir()
+    store = JobStore(os.path.join(data_dir, "jobs.sqlite3"), os.path.join(data_dir, "jobs"))
+    workers = JobWorkers(
+        store,
+        _run_generation_job,
+        n_workers=int(os.getenv("FLASHCARDS_JOB_WORKERS", str(DEFAULT_JOB_WORKERS))),
+    )
+    workers.start()
+    return workers
 
-def _shorten(text: str, max_len: int = 220):
-    trimmed = text.strip()
-    if len(trimmed) <= max_len:
-        return trimmed
-    return trimmed[: max_len - 1].rstrip() + "…"
 
+# Démarrés dès le premier rendu, quelle que soit la page : les travaux en attente
+# ou interrompus reprennent sans attendre qu'un utilisateur ouvre « Génération par lots ».
+get_job_workers()
 
-def _truncate_words(text: str, max_words: int = 75):
-    words = text.strip().split()
-    if len(words) <= max_words:
-        return text.strip()
-    return " ".join(words[:max_words]) + "…"
 
 # --------------------------------------------------
 # Style custom (CSS)
 # --------------------------------------------------
-st.markdown(
-    """
+APP_CSS = """
     <style>
     html, body, [class*="css"] {
         font-family: -apple-system, BlinkMacSystemFont, "SF Pro Text",
@@ -478,6 +816,9 @@ st.markdown(
     }
 
     .flip-card-inner {
+        display: block;
+        list-style: none;
+        cursor: pointer;
         position: relative;
         width: 100%;
         height: 100%;
@@ -488,7 +829,11 @@ st.markdown(
         box-shadow: 0 18px 40px rgba(15, 23, 42, 0.25);
     }
 
-    .flip-card.show-answer .flip-card-inner {
+    .flip-card-inner::-webkit-details-marker {
+        display: none;
+    }
+
+    .flip-card[open] .flip-card-inner {
         transform: rotateY(180deg);
     }
 
@@ -537,14 +882,93 @@ st.markdown(
         margin-bottom: 10px;
     }
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+
+
+@st.cache_resource(show_spinner=False)
+def get_app_css() -> str:
+    """Feuille de style compactée une seule fois par processus (elle est renvoyée à chaque rerun)."""
+    css = re.sub(r"/\*.*?\*/", "", APP_CSS, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};,])\s*", r"\1", css).strip()
+
+
+st.markdown(get_app_css(), unsafe_allow_html=True)
 
 # --------------------------------------------------
 # Navigation
 # --------------------------------------------------
-page = st.sidebar.radio("Menu", ["Cartes", "Questions fréquentes"], index=0)
+page = st.sidebar.radio(
+    "Menu", ["Cartes", "Recherche", "Génération par lots", "Questions fréquentes"], index=0, key="page"
+)
+
+with st.sidebar.expander("Cache d'extraction"):
+    cache_stats = get_extraction_cache().stats()
+    st.caption(
+        f"Hits mémoire : {cache_stats['memory_hits']} · "
+        f"Hits disque : {cache_stats['disk_hits']} · "
+        f"Misses : {cache_stats['misses']}"
+    )
+    st.caption(
+        f"Évictions mémoire : {cache_stats['memory_evictions']} · "
+        f"Évictions disque : {cache_stats['disk_evictions']} · "
+        f"Taux de hit : {cache_stats['hit_ratio']:.0%}"
+    )
+
+with st.sidebar.expander("Qualité des réponses OpenAI"):
+    parse_stats = PARSE_STATS.snapshot()
+    st.caption(
+        f"Réponses : {parse_stats['responses']} · "
+        f"Échecs de lecture : {parse_stats['failed']} ({parse_stats['failure_rate']:.0%})"
+    )
+    st.caption(
+        f"Récupérées partiellement : {parse_stats['salvaged']} ({parse_stats['salvage_rate']:.0%}) · "
+        f"Cartes écartées : {parse_stats['dropped_objects']}"
+    )
+
+get_metrics_exporter()
+
+if ADMIN_PANEL:
+    with st.sidebar.expander("Administration : mesures"):
+        snapshot = METRICS.snapshot()
+        usage = snapshot["openai"]
+        st.caption(
+            f"OpenAI : {usage['requests']:.0f} réponse(s) · {usage['retries']:.0f} nouvelle(s) tentative(s) · "
+            f"{usage['input_tokens']:.0f} tokens en entrée, {usage['output_tokens']:.0f} en sortie · "
+            f"≈ {usage['cost_usd']:.4f} USD"
+        )
+        if snapshot["stages"]:
+            st.dataframe(
+                [
+                    {
+                        "étape": stage,
+                        "appels": values["count"],
+                        "moyenne (s)": round(values["mean_s"], 3),
+                        "p95 ≤ (s)": values["p95_s"],
+                        "total (s)": round(values["total_s"], 1),
+                    }
+                    for stage, values in sorted(snapshot["stages"].items())
+                ],
+                hide_index=True,
+            )
+        for name, labels, value in snapshot["gauges"]:
+            if name == "flashcards_cache_hit_ratio":
+                st.caption(f"Cache {labels['cache']} : {value:.0%} de hits")
+        if snapshot["recent_requests"]:
+            st.caption("Dernières requêtes OpenAI")
+            st.dataframe(
+                [
+                    {
+                        "modèle": request["model"],
+                        "entrée": request["input_tokens"],
+                        "sortie": request["output_tokens"],
+                        "USD": round(request["cost_usd"], 5),
+                        "durée (s)": round(request["seconds"] or 0.0, 2),
+                    }
+                    for request in reversed(snapshot["recent_requests"])
+                ],
+                hide_index=True,
+            )
 
 if page == "Questions fréquentes":
     st.title("Questions fréquentes")
@@ -566,7 +990,8 @@ if page == "Questions fréquentes":
     with st.expander("Quels fichiers puis-je importer ?"):
         st.write(
             "Les PDF contenant du texte fonctionnent le mieux (notes de cours, diapos exportées en PDF). "
-            "Les images scannées dans les PDF ne sont pas encore prises en charge."
+            "Les pages scannées sont lues par reconnaissance de caractères (OCR) : c’est plus lent "
+            "et le résultat dépend de la qualité du scan."
         )
 
     with st.expander("Pourquoi ai-je obtenu des cartes vides ou de faible qualité ?"):
@@ -583,8 +1008,23 @@ if page == "Questions fréquentes":
 
     with st.expander("Mes jeux sont-ils sauvegardés ?"):
         st.write(
-            "Les jeux vivent en mémoire pour la session en cours. Si tu rafraîchis l’app, "
-            "ils sont réinitialisés. Un stockage persistant peut être ajouté si besoin."
+            "Oui, sur le serveur. Ils sont liés à l’adresse de la page (paramètre « u » de l’URL) : "
+            "garde ce lien pour les retrouver. Tu peux aussi exporter un jeu en JSON ou CSV "
+            "depuis la section « Révision des cartes » et le réimporter plus tard."
+        )
+
+    with st.expander("Comment retrouver une carte ?"):
+        st.write(
+            "Ouvre « Recherche » dans le menu : la recherche porte sur les questions et réponses de tous "
+            "tes jeux, ainsi que sur les passages des PDF d’où viennent les cartes. Les accents, pluriels "
+            "et petits mots (le, la, des…) sont ignorés, et le dernier mot peut être incomplet."
+        )
+
+    with st.expander("Comment fonctionne la répétition espacée ?"):
+        st.write(
+            "En mode « Répétition espacée », retourne la carte puis note ta réponse. Une carte bien connue "
+            "revient après 1 jour, puis 6, puis à des intervalles de plus en plus longs (algorithme SM-2) ; "
+            "une carte ratée revient dans la séance. Ta progression est sauvegardée avec le jeu."
         )
 
     with st.expander("Puis-je modifier les cartes après leur création ?"):
@@ -595,12 +1035,113 @@ if page == "Questions fréquentes":
 
     with st.expander("Des astuces pour de meilleurs résultats ?"):
         st.write(
-            "Importe des PDF propres contenant du texte, évite les images scannées et garde un sujet ciblé. "
+            "Importe des PDF propres contenant du texte, préfère des scans nets et droits, et garde un sujet ciblé. "
             "Combiner plusieurs courts PDF donne souvent une meilleure couverture."
         )
 
     st.stop()
 
+if page == "Recherche":
+    st.title("Recherche")
+    st.caption("Dans les cartes de tous tes jeux et dans les passages des documents dont elles viennent.")
+    query = st.text_input("Rechercher", placeholder="mitochondrie, photosynthèse…", key="search_query")
+    if not get_deck_store().search_enabled:
+        st.warning("La recherche n’est pas disponible sur ce serveur (SQLite sans FTS5).")
+    elif query.strip():
+        results = get_deck_store().search(_user_id(), query, limit=30)
+        if not results:
+            st.info("Aucun résultat.")
+        for i, result in enumerate(results):
+            with st.container(border=True):
+                if result["kind"] == "card":
+                    st.caption(f"🃏 Carte {result['position'] + 1} — jeu « {result['deck']} »")
+                    st.write(f"❓ {result['question']}")
+                    st.write(f"💡 {result['answer']}")
+                    st.button(
+                        "Réviser cette carte",
+                        key=f"search_open_{i}",
+                        on_click=_open_search_result,
+                        args=(result["deck"], result["position"]),
+                    )
+                else:
+                    st.caption(f"📄 {result['document']} — jeu « {result['deck']} »")
+                    text = result["text"]
+                    st.write(text if len(text) <= 600 else text[:600].rstrip() + "…")
+    st.stop()
+
+if page == "Génération par lots":
+    st.title("Génération par lots")
+    st.caption(
+        "Pour un cours entier : les PDF sont traités en arrière-plan sur le serveur. "
+        "Tu peux fermer l’onglet, le travail continue (et reprend après un redémarrage)."
+    )
+
+    with st.form("batch_job", clear_on_submit=True):
+        batch_deck = st.text_input("Nom du jeu", value=st.session_state.current_deck or "")
+        batch_cards = st.number_input(
+            "Nombre total de cartes", min_value=5, max_value=2000, value=100, step=5
+        )
+        batch_files = st.file_uploader(
+            "PDF du cours", type=["pdf"], accept_multiple_files=True
+        )
+        submitted = st.form_submit_button("Lancer la génération")
+
+    if submitted:
+        if not batch_deck.strip():
+            st.warning("Donne un nom au jeu.")
+        elif not batch_files:
+            st.warning("Ajoute au moins un PDF.")
+        else:
+            workers = get_job_workers()
+            job_id = workers.store.enqueue(
+                _user_id(),
+                batch_deck.strip(), int(batch_cards), [(f.name, f.getvalue()) for f in batch_files]
+            )
+            workers.notify()
+            st.success(f"Travail n°{job_id} ajouté à la file d’attente.")
+
+    @st.fragment(run_every=JOB_POLL_SECONDS)
+    def _render_jobs():
+        store = get_job_workers().store
+        jobs = store.list_jobs(_user_id())
+        if not jobs:
+            st.info("Aucun travail pour le moment.")
+            return
+        for job in jobs:
+            with st.container(border=True):
+                st.markdown(
+                    f"**n°{job['id']} — {job['deck']}** · {job['n_cards']} cartes · "
+                    f"{JOB_STATUS_LABELS.get(job['status'], job['status'])}"
+                )
+                fraction = job["progress"] / job["total"] if job["total"] else 0.0
+                st.progress(min(1.0, fraction), text=job["message"] or None)
+                if job["status"] == STATUS_FAILED:
+                    st.error(job["error"] or "Erreur inconnue")
+                col_main, col_delete = st.columns(2)
+                with col_main:
+                    if job["status"] == STATUS_DONE and st.button(
+                        f"Ajouter au jeu « {job['deck']} »", key=f"import_{job['id']}"
+                    ):
+                        cards = store.result(_user_id(), job["id"])
+                        added = _save_deck(job["deck"], cards, append=True)
+                        _open_deck(job["deck"])
+                        st.success(f"{added} cartes ajoutées au jeu « {job['deck']} ».")
+                    elif job["status"] == STATUS_FAILED and st.button(
+                        "Relancer", key=f"retry_{job['id']}"
+                    ):
+                        store.retry(_user_id(), job["id"])
+                        get_job_workers().notify()
+                with col_delete:
+                    if job["status"] != STATUS_RUNNING and st.button(
+                        "Supprimer", key=f"delete_{job['id']}"
+                    ):
+                        store.delete(_user_id(), job["id"])
+                        st.rerun(scope="fragment")
+
+    st.subheader("Travaux")
+    _render_jobs()
+    st.stop()
+
 # --------------------------------------------------
 # UI principale
 # --------------------------------------------------
@@ -617,23 +1158,16 @@ if st.button("Valider le jeu"):
     if not deck_name.strip():
         st.warning("Tu dois entrer un nom de jeu.")
     else:
-        st.session_state.current_deck = deck_name
         # si le deck n’existe pas, on le crée
-        if deck_name not in st.session_state.decks:
-            st.session_state.decks[deck_name] = []
-        # charger les cartes du deck
-        st.session_state.flashcards = st.session_state.decks[deck_name]
-        st.session_state.card_index = 0
-        st.session_state.show_answer = False
+        get_deck_store().create_deck(_user_id(), deck_name)
+        _open_deck(deck_name)
         st.success(f"Jeu « {deck_name} » sélectionné.")
 
 
-existing_decks = ["(Nouveau jeu)"] + list(st.session_state.decks.keys())
+saved_decks = [deck["name"] for deck in get_deck_store().list_decks(_user_id())]
+existing_decks = ["(Nouveau jeu)"] + saved_decks
 default_option = 0
-if (
-    st.session_state.current_deck
-    and st.session_state.current_deck in st.session_state.decks
-):
+if st.session_state.current_deck and st.session_state.current_deck in saved_decks:
     default_option = existing_decks.index(st.session_state.current_deck)
 
 selected = st.selectbox(
@@ -654,19 +1188,12 @@ if selected == "(Nouveau jeu)":
         if not name:
             st.warning("Donne un nom à ton jeu (ex. : Biologie, Histoire...).")
         else:
-            if name not in st.session_state.decks:
-                st.session_state.decks[name] = []
-            st.session_state.current_deck = name
-            st.session_state.flashcards = st.session_state.decks[name]
-            st.session_state.card_index = 0
-            st.session_state.show_answer = False
+            get_deck_store().create_deck(_user_id(), name)
+            _open_deck(name)
             st.success(f"Jeu « {name} » prêt. Tu peux maintenant générer des cartes pour ce jeu.")
 else:
     if selected != st.session_state.current_deck:
-        st.session_state.current_deck = selected
-        st.session_state.flashcards = st.session_state.decks.get(selected, [])
-        st.session_state.card_index = 0
-        st.session_state.show_answer = False
+        _open_deck(selected)
 
 current_deck = st.session_state.current_deck
 
@@ -683,6 +1210,45 @@ nombre_cartes = st.selectbox(
     index=1,  # 10 par défaut
 )
 
+chunked_mode = st.toggle(
+    "Découper les longs documents",
+    value=True,
+    help="Génère des cartes pour chaque partie du document puis garde les meilleures, "
+    "au lieu d’envoyer tout le texte en un seul appel.",
+)
+with st.expander("Réglages avancés"):
+    chunk_tokens = st.number_input(
+        "Taille d’un morceau (tokens)", min_value=500, max_value=30000,
+        value=DEFAULT_CHUNK_TOKENS, step=500,
+    )
+    overlap_tokens = st.number_input(
+        "Chevauchement entre morceaux (tokens)", min_value=0, max_value=2000,
+        value=DEFAULT_OVERLAP_TOKENS, step=50,
+    )
+    concurrency = st.number_input(
+        "Appels OpenAI simultanés", min_value=1, max_value=16,
+        value=DEFAULT_CONCURRENCY, step=1,
+    )
+    token_budget = st.number_input(
+        "Budget du texte envoyé en un appel (tokens, 0 = texte complet)", min_value=0, max_value=90000,
+        value=PROMPT_TOKEN_BUDGET, step=1000,
+        help="Seuls les passages les plus riches en notions clés sont envoyés ; "
+        "numéros de page, en-têtes répétés et bibliographie sont retirés.",
+    )
+
+hybrid_mode = st.toggle(
+    "Cartes instantanées (mode hybride)",
+    value=True,
+    help="Crée tout de suite un jeu hors ligne que tu peux réviser ; OpenAI remplace "
+    "les cartes en arrière-plan. Si OpenAI est lent ou indisponible, le jeu hors ligne est gardé.",
+)
+
+force_regenerate = st.checkbox(
+    "Forcer la régénération",
+    value=False,
+    help="Ignore les cartes déjà générées pour ce même texte et refait un appel OpenAI.",
+)
+
 # ---- Bloc d’upload ----
 st.subheader("3. Importer tes notes")
 st.markdown(
@@ -702,7 +1268,7 @@ st.markdown(
             Cliquez pour télécharger ou glissez-déposez
         </p>
         <p class="upload-types-text">
-            Pour l'instant, les PDF texte sont supportés (pas encore les scans uniquement images).
+            PDF texte ou scannés (les pages scannées sont lues par OCR).
         </p>
     """,
     unsafe_allow_html=True,
@@ -736,92 +1302,223 @@ if st.button("Générer les cartes maintenant"):
         st.warning("Choisis ou crée un jeu avant de générer des cartes.")
     elif not uploaded_files:
         st.warning("Téléverse au moins un PDF avec tes notes.")
+    elif hybrid_mode:
+        pages = list(iter_pages_from_pdfs(uploaded_files))
+        offline_cards = build_flashcards_from_text("\n".join(pages), nombre_cartes)
+        if not offline_cards:
+            st.warning(
+                "Je n’ai pas réussi à extraire assez de texte pour créer des cartes. "
+                "Vérifie que ton PDF contient du texte lisible (un scan net si c’est une image)."
+            )
+        else:
+            hybrid = HybridDeck(current_deck, offline_cards, nombre_cartes)
+            hybrid.refine(
+                _openai_producer(
+                    pages,
+                    nombre_cartes,
+                    chunked_mode,
+                    chunk_tokens=int(chunk_tokens),
+                    overlap_tokens=int(overlap_tokens),
+                    concurrency=int(concurrency),
+                    force=force_regenerate,
+                    token_budget=int(token_budget),
+                ),
+                card_timeout=HYBRID_TIMEOUT,
+            )
+            st.session_state.hybrid_deck = hybrid
+            st.session_state.hybrid_notice = None
+            _save_deck(current_deck, offline_cards)
+            _index_sources(current_deck, uploaded_files)
+            st.session_state.card_index = 0
+            st.success(
+                f"{len(offline_cards)} cartes prêtes pour le jeu « {current_deck} » ✅ "
+                "OpenAI les améliore pendant que tu révises."
+            )
     else:
-        full_text = ""
-        for f in uploaded_files:
-            try:
-                full_text += "\n" + extract_text_from_pdf(f)
-            except Exception:
-                pass
-
-        cards = generate_flashcards_with_openai(full_text, nombre_cartes)
+        pages = iter_pages_from_pdfs(uploaded_files)
+        if chunked_mode:
+            cards = generate_flashcards_chunked_with_openai(
+                iter_paragraphs(pages),
+                nombre_cartes,
+                chunk_tokens=int(chunk_tokens),
+                overlap_tokens=int(overlap_tokens),
+                concurrency=int(concurrency),
+                force=force_regenerate,
+            )
+        else:
+            head, complete = _head_pages(pages)
+            if complete:
+                cards = generate_flashcards_with_openai(
+                    PAGE_SEPARATOR.join(head), nombre_cartes, force=force_regenerate, token_budget=int(token_budget)
+                )
+            else:
+                # Le texte ne tiendrait pas dans le contexte du modèle : rien n'est coupé.
+                st.info(TOO_LONG_FOR_SINGLE_CALL)
+                cards = generate_flashcards_chunked_with_openai(
+                    iter_paragraphs(itertools.chain(head, pages)),
+                    nombre_cartes,
+                    chunk_tokens=int(chunk_tokens),
+                    overlap_tokens=int(overlap_tokens),
+                    concurrency=int(concurrency),
+                    force=force_regenerate,
+                )
 
         if not cards:
             st.warning(
                 "Je n’ai pas réussi à extraire assez de texte pour créer des cartes. "
-                "Vérifie que ton PDF contient du texte (et pas seulement une image scannée)."
+                "Vérifie que ton PDF contient du texte lisible (un scan net si c’est une image)."
             )
         else:
             # Sauvegarder dans le deck correspondant
-            st.session_state.decks[current_deck] = cards
-            st.session_state.flashcards = cards
+            saved = _save_deck(current_deck, cards)
+            _index_sources(current_deck, uploaded_files)
             st.session_state.card_index = 0
-            st.session_state.show_answer = False
             st.success(
-                f"{len(cards)} cartes générées pour le jeu « {current_deck} » ✅"
+                f"{saved} cartes générées pour le jeu « {current_deck} » ✅"
             )
 
 # --------------------------------------------------
 # Affichage des flashcards du deck courant
 # --------------------------------------------------
-st.subheader("5. Révision des cartes")
+@st.fragment
+def _render_review():
+    """
+    Carte courante et navigation. Un clic sur un bouton ne relance que ce
+    fragment ; retourner la carte ne sollicite pas du tout le serveur.
+    """
+    current_deck = st.session_state.current_deck
+    n_cards = st.session_state.deck_size
+    review_mode = st.radio(
+        "Mode de révision",
+        ["Parcourir", "Répétition espacée"],
+        horizontal=True,
+        key="review_mode",
+        help="La répétition espacée (SM-2) présente d’abord les cartes arrivées à échéance.",
+    )
+    spaced = review_mode == "Répétition espacée"
+    due_state = None
+    if spaced:
+        session = _review_session()
+        # Chaque relance du fragment écrit les notes en attente depuis FLUSH_AFTER_SECONDS.
+        session.flush_if_due()
+        due_state = session.next_due()
+        now = time.time()
+        if due_state is not None and due_state.due <= now:
+            st.session_state.card_index = due_state.position
+        else:
+            due_state = None
+
+    if spaced and due_state is None:
+        st.success("🎉 Aucune carte à réviser pour l’instant.")
+        upcoming = session.next_due()
+        if upcoming is not None:
+            minutes = max(1, round((upcoming.due - time.time()) / 60))
+            if minutes < 120:
+                delay = f"{minutes} min"
+            elif minutes < 2 * 1440:
+                delay = f"{minutes / 60:.0f} h"
+            else:
+                delay = f"{minutes / 1440:.0f} jours"
+            st.caption(f"Prochaine carte dans environ {delay}.")
+    else:
+        idx = st.session_state.card_index % n_cards
+        current = _current_card(idx)
+        if current is None:
+            # Jeu modifié depuis un autre onglet : on relit sa taille.
+            _open_deck(current_deck)
+            st.rerun()
+
+        card_placeholder = st.empty()
+        helper_placeholder = st.empty()
+
+        if spaced:
+            grades = (
+                ("❌ À revoir", GRADE_AGAIN),
+                ("😬 Difficile", GRADE_HARD),
+                ("🙂 Bien", GRADE_GOOD),
+                ("😎 Facile", GRADE_EASY),
+            )
+            for column, (label, grade) in zip(st.columns(len(grades)), grades):
+                with column:
+                    st.button(
+                        label,
+                        on_click=_grade_card,
+                        args=(idx, grade),
+                        key=f"grade_{grade}",
+                    )
+        else:
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                st.button("⬅️ Carte précédente", on_click=_prev_card)
+            with col_next:
+                st.button("Carte suivante ➡️", on_click=_next_card)
+
+        # st.html remplace le HTML de l'élément quand il change (st.markdown réutiliserait
+        # le <details> et la carte suivante pourrait s'afficher déjà retournée) ; le
+        # numéro d'affichage garantit ce changement, même pour la même carte.
+        st.session_state.card_renders += 1
+        card_placeholder.html(
+            f'<div data-render="{st.session_state.card_renders}">{_flashcard_html(*current)}</div>'
+        )
 
-flashcards = st.session_state.flashcards
+        helper_placeholder.markdown(
+            '<div class="flip-helper">'
+            "Clique sur la carte pour voir la réponse"
+            + (", puis note ta réponse." if spaced else ".")
+            + "</div>",
+            unsafe_allow_html=True,
+        )
 
-if not current_deck:
-    st.info("Aucun jeu sélectionné pour l’instant.")
-elif not flashcards:
-    st.info(f"Aucune carte dans le jeu « {current_deck} » pour le moment.")
-else:
-    n_cards = len(flashcards)
-    idx = st.session_state.card_index % n_cards
-    current = flashcards[idx]
+        label = f"{idx + 1} / {n_cards} — Jeu : {current_deck}"
+        if spaced:
+            label += f" — {session.due_count()} carte(s) à réviser"
+        st.markdown(f'<div class="index-label">{label}</div>', unsafe_allow_html=True)
 
-    card_placeholder = st.empty()
-    helper_placeholder = st.empty()
 
-    st.button("Retourner la carte 🔁", on_click=_flip_card)
+st.subheader("5. Révision des cartes")
 
-    col_prev, col_next = st.columns(2)
-    with col_prev:
-        st.button("⬅️ Carte précédente", on_click=_prev_card)
-    with col_next:
-        st.button("Carte suivante ➡️", on_click=_next_card)
+if st.session_state.hybrid_notice is not None:
+    level, message = st.session_state.hybrid_notice
+    getattr(st, level)(message)
+    st.session_state.hybrid_notice = None
+if st.session_state.hybrid_deck is not None:
+    _render_hybrid_progress()
 
-    question_html = html.escape(current["question"]).replace("\n", "<br>")
-    answer_html = html.escape(current["answer"]).replace("\n", "<br>")
+n_cards = st.session_state.deck_size
 
-    card_placeholder.markdown(
-        f"""
-        <div class="flashcard-wrapper">
-            <div class="flip-card {'show-answer' if st.session_state.show_answer else ''}">
-              <div class="flip-card-inner">
-                <div class="flip-card-front">
-                  <div class="flashcard-text">
-                    {question_html}
-                  </div>
-                </div>
-                <div class="flip-card-back">
-                  <div class="flashcard-text">
-                    {answer_html}
-                  </div>
-                </div>
-              </div>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+if not current_deck:
+    st.info("Aucun jeu sélectionné pour l’instant.")
+elif not n_cards:
+    st.info(f"Aucune carte dans le jeu « {current_deck} » pour le moment.")
+else:
+    _render_review()
 
-    helper_placeholder.markdown(
-        '<div class="flip-helper">'
-        "Clique sur « Retourner la carte » pour voir la réponse. "
-        "La carte se retourne avec une animation."
-        "</div>",
-        unsafe_allow_html=True,
-    )
+if current_deck:
+    with st.expander("Importer / exporter ce jeu"):
+        col_json, col_csv = st.columns(2)
+        with col_json:
+            if st.button("Préparer l’export JSON", disabled=not n_cards):
+                st.session_state.deck_export = ("json", get_deck_store().export_deck(_user_id(), current_deck, "json"))
+        with col_csv:
+            if st.button("Préparer l’export CSV", disabled=not n_cards):
+                st.session_state.deck_export = ("csv", get_deck_store().export_deck(_user_id(), current_deck, "csv"))
+        export = st.session_state.pop("deck_export", None)
+        if export is not None:
+            fmt, data = export
+            st.download_button(
+                f"Télécharger « {current_deck} » ({fmt.upper()})",
+                data=data,
+                file_name=f"{current_deck}.{fmt}",
+                mime="text/csv" if fmt == "csv" else "application/json",
+            )
 
-    st.markdown(
-        f'<div class="index-label">{idx + 1} / {n_cards} — Jeu : {current_deck}</div>',
-        unsafe_allow_html=True,
-    )
+        imported = st.file_uploader("Importer des cartes (JSON ou CSV)", type=["json", "csv"], key="deck_import")
+        if imported is not None and st.button("Ajouter ces cartes au jeu"):
+            try:
+                cards = parse_deck_file(imported.getvalue(), imported.name)
+            except ValueError as e:
+                st.error(f"Fichier illisible : {e}")
+            else:
+                added = _save_deck(current_deck, cards, append=True)
+                st.toast(f"{added} carte(s) ajoutée(s) au jeu « {current_deck} ».")
+                st.rerun()
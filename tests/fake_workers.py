@@ -0,0 +1,44 @@
+"""
+Fonctions substituées à celles des workers pendant les tests. Elles vivent dans
+un module importable : les pools démarrent leurs processus avec « spawn ».
+
+Les « PDF » sont de simples textes `clé=valeur` : `pages`, `delay` (secondes
+par tâche), `hang` (bloque la tâche), `fail` (lève une exception) et `crash`
+(tue le worker).
+"""
+import os
+import time
+
+
+def _spec(path: str) -> dict:
+    with open(path, "rb") as f:
+        return dict(item.split("=") for item in f.read().decode().split())
+
+
+def fake_pdf(pages: int, delay: float = 0, hang: int = 0, fail: int = 0, crash: int = 0) -> bytes:
+    return f"pages={pages} delay={delay} hang={hang} fail={fail} crash={crash}".encode()
+
+
+def count_pages(path: str) -> int:
+    return int(_spec(path)["pages"])
+
+
+def extract_page_range(path: str, start: int, stop: int):
+    spec = _spec(path)
+    if int(spec["fail"]):
+        raise ValueError("PDF illisible")
+    if int(spec["hang"]):
+        time.sleep(3600)
+    if int(spec["crash"]):
+        os._exit(1)
+    time.sleep(float(spec["delay"]))
+    return [f"page {i}" for i in range(start, min(stop, int(spec["pages"])))]
+
+
+
+def ocr_page(pdf_path: str, page_number: int, dpi: int, lang: str, timeout: float) -> str:
+    if page_number == 1:
+        time.sleep(3600)  # page sur laquelle tesseract ne rend jamais la main
+    if page_number == 2:
+        os._exit(1)  # worker tué (mémoire épuisée...)
+    return f"ocr {page_number} {lang}"
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+st = pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from decks import DeckStore  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLASHCARDS_DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setenv("FLASHCARDS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("FLASHCARDS_JOB_WORKERS", "0")
+    st.cache_resource.clear()  # magasins partagés construits sur le dossier de ce test
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    assert not at.exception
+    return at
+
+
+@pytest.fixture
+def decks(tmp_path):
+    """Accès au magasin de l'application, comme depuis un autre onglet."""
+    return DeckStore(str(tmp_path / "data" / "decks.sqlite3"))
+
+
+def _cards(count):
+    return [{"question": f"Question {i} sur la cellule ?", "answer": f"Réponse {i}"} for i in range(count)]
+
+
+def _open(app, name):
+    next(w for w in app.text_input if w.label.startswith("Nom du jeu")).input(name)
+    next(w for w in app.button if w.label == "Valider le jeu").click()
+    app.run()
+    assert not app.exception
+
+
+def _click(app, label):
+    next(w for w in app.button if w.label == label).click()
+    app.run()
+    assert not app.exception
+
+
+def test_open_a_deck_in_a_fresh_session(app):
+    _open(app, "Biologie")
+    assert app.session_state.current_deck == "Biologie"
+    assert app.session_state.review_session is None
+
+
+def test_every_display_renders_a_fresh_card(app, decks):
+    decks.replace_cards(app.session_state.user_id, "Biologie", _cards(3))
+    _open(app, "Biologie")
+    renders = app.session_state.card_renders
+    _click(app, "Carte suivante ➡️")
+    assert app.session_state.card_index == 1
+    assert app.session_state.card_renders > renders
+
+
+def test_deck_shrunk_from_another_tab_reopens_the_deck(app, decks):
+    decks.replace_cards(app.session_state.user_id, "Biologie", _cards(25))
+    _open(app, "Biologie")
+    decks.replace_cards(app.session_state.user_id, "Biologie", _cards(5))
+    app.session_state.card_index = 22  # hors de la fenêtre de cartes déjà lue
+    app.run()
+    assert not app.exception
+    assert app.session_state.deck_size == 5
+    assert app.session_state.card_index == 0
+
+
+def test_grading_in_spaced_repetition(app, decks):
+    decks.replace_cards(app.session_state.user_id, "Biologie", _cards(3))
+    _open(app, "Biologie")
+    app.radio(key="review_mode").set_value("Répétition espacée")
+    app.run()
+    assert not app.exception
+    _click(app, "🙂 Bien")
+    session = app.session_state.review_session
+    assert session is not None
+    session.flush()
+    assert decks.due_states(app.session_state.user_id, "Biologie", 10)
@@ -0,0 +1,60 @@
+import time
+
+from caching import MemoryLRU, TieredCache
+
+
+def test_memory_lru_evicts_least_recently_used_by_bytes():
+    lru = MemoryLRU(max_bytes=10)
+    lru.put("a", "aaaa")
+    lru.put("b", "bbbb")
+    assert lru.get("a") == "aaaa"  # « b » devient le moins récent
+    assert lru.put("c", "cccc") == 1
+    assert lru.get("b") is None
+    assert lru.get("a") == "aaaa"
+    assert lru.current_bytes == 8
+
+
+def test_memory_lru_ignores_values_larger_than_budget():
+    lru = MemoryLRU(max_bytes=4)
+    assert lru.put("big", "x" * 5) == 0
+    assert lru.get("big") is None
+    assert len(lru) == 0
+
+
+def test_ttl_expires_both_levels(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = TieredCache(1024, str(tmp_path / "cache.sqlite3"), 1024, ttl=60)
+    cache.put("k", "v")
+    now[0] += 30
+    assert cache.get("k") == "v"
+    now[0] += 31
+    assert cache.get("k") is None
+    assert cache.disk.get("k") is None
+
+
+def test_disk_hit_warms_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache(1024, path, 1024).put("k", "valeur")
+    cache = TieredCache(1024, path, 1024)
+    assert cache.get("k") == "valeur"
+    assert cache.get("k") == "valeur"
+    assert cache.get("absent") is None
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_disk_evicts_least_recently_read(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = TieredCache(1, str(tmp_path / "cache.sqlite3"), 10)
+    cache.put("a", "aaaa")
+    now[0] += 1
+    cache.put("b", "bbbb")
+    now[0] += 1
+    assert cache.get("a") == "aaaa"  # lu : « b » devient le plus ancien
+    now[0] += 1
+    cache.put("c", "cccc")
+    assert cache.disk.get("b") is None
+    assert cache.disk.get("a") == "aaaa"
+    assert cache.stats()["disk_evictions"] == 1
@@ -0,0 +1,172 @@
+import random
+from concurrent.futures import Future
+
+import generation
+from caching import TieredCache
+from generation import (
+    CHARS_PER_TOKEN,
+    MAX_CHUNK_CANDIDATES,
+    chunk_candidates,
+    generate_cards_chunked,
+    iter_chunks,
+    iter_paragraphs,
+    reduce_cards,
+)
+
+
+def test_iter_paragraphs_joins_paragraphs_split_across_pages():
+    pages = ["Premier paragraphe.\n\nDébut du second", "suite du second.\n\nTroisième."]
+    assert list(iter_paragraphs(pages)) == [
+        "Premier paragraphe.",
+        "Début du second\nsuite du second.",
+        "Troisième.",
+    ]
+
+
+def test_iter_paragraphs_matches_split_of_joined_text():
+    pages = ["a\n\n\nb\n", "\nc", "", "d\n\ne"]
+    joined = "\n".join(pages)
+    expected = [p.strip() for p in joined.split("\n\n") if p.strip()]
+    assert list(iter_paragraphs(pages)) == expected
+
+
+def test_iter_paragraphs_cuts_long_paragraph_on_line_breaks():
+    line = "x" * 30
+    paragraphs = list(iter_paragraphs(["\n".join([line] * 10)], max_chars=100))
+    assert all(len(p) <= 100 for p in paragraphs)
+    assert "".join(paragraphs).replace("\n", "") == line * 10
+
+
+def test_iter_paragraphs_reads_pages_lazily():
+    read = []
+
+    def pages():
+        for i in range(3):
+            read.append(i)
+            yield f"page {i}\n\n"
+
+    stream = iter_paragraphs(pages())
+    assert next(stream) == "page 0"
+    assert read == [0]
+
+
+def _paragraphs(count, size=400):
+    return [f"Paragraphe {i} : " + ("contenu " * size)[: size - 20] for i in range(count)]
+
+
+def test_iter_chunks_respects_budget_and_overlap():
+    paragraphs = _paragraphs(40)
+    chunks = list(iter_chunks(paragraphs, chunk_tokens=500, overlap_tokens=120))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= 500 * CHARS_PER_TOKEN
+    # Le dernier paragraphe d'un morceau ouvre le suivant.
+    for previous, following in zip(chunks, chunks[1:]):
+        assert following.split("\n\n")[0] == previous.split("\n\n")[-1]
+    # Aucun paragraphe n'est perdu.
+    covered = {p for chunk in chunks for p in chunk.split("\n\n")}
+    assert covered == set(paragraphs)
+
+
+def test_iter_chunks_cuts_paragraph_larger_than_a_chunk():
+    chunks = list(iter_chunks(["y" * 5000], chunk_tokens=200, overlap_tokens=0))
+    assert "".join(chunks) == "y" * 5000
+    assert all(len(chunk) <= 200 * CHARS_PER_TOKEN for chunk in chunks)
+
+
+def test_reduce_cards_drops_duplicates_and_alternates_chunks():
+    first = [{"question": f"Question A{i} sur la cellule", "answer": f"réponse a{i}"} for i in range(3)]
+    second = [
+        dict(first[0]),  # doublon venu du chevauchement
+        {"question": "Question B sur les mitochondries", "answer": "réponse b"},
+    ]
+    selected = reduce_cards([first, second], 3)
+    assert selected == [first[0], second[1], first[1]]
+
+
+def _course(count, seed, words=30):
+    rng = random.Random(seed)
+    return [" ".join(f"terme{rng.randrange(10**6)}" for _ in range(words)) for _ in range(count)]
+
+
+def test_chunk_boundaries_resync_after_an_insertion():
+    paragraphs = _course(400, 1)
+    edited = paragraphs[:200] + _course(3, 2) + paragraphs[200:]
+    before = list(iter_chunks(paragraphs, chunk_tokens=1500, overlap_tokens=0))
+    after = list(iter_chunks(edited, chunk_tokens=1500, overlap_tokens=0))
+    unchanged = set(before) & set(after)
+    # Seuls les morceaux autour de l'insertion changent.
+    assert len(unchanged) >= len(before) - 2
+
+
+def _fake_requests(monkeypatch):
+    sent = []
+
+    def submit(scheduler, chunk, n_cards, model, max_output_tokens, sink=None):
+        sent.append((chunk, n_cards))
+        future = Future()
+        future.set_result(
+            [{"question": f"Question {len(sent)}.{i} {chunk[:40]}", "answer": f"réponse {i}"} for i in range(n_cards)]
+        )
+        return future
+
+    monkeypatch.setattr(generation, "submit_cards_request", submit)
+    return sent
+
+
+def test_chunk_requests_grow_only_for_large_decks(monkeypatch):
+    sent = _fake_requests(monkeypatch)
+    chunks = list(iter_chunks(_course(200, 3), chunk_tokens=1500, overlap_tokens=0))
+    generate_cards_chunked(None, chunks, 5)
+    small = list(sent)
+    sent.clear()
+    generate_cards_chunked(None, chunks, 10)
+    assert sent == small
+    assert all(n == chunk_candidates(chunk) for chunk, n in sent)
+
+    sent.clear()
+    report = {}
+    cards, _ = generate_cards_chunked(None, chunks, 200, report=report)
+    assert len(cards) == 200 and report["shortfall"] == 0
+    # 200 × 1,5 / 18 morceaux = 17 candidates chacun, arrondi à 32.
+    assert len(chunks) == 18 and {n for _, n in sent} == {32}
+
+
+def test_chunk_shortfall_is_reported(monkeypatch):
+    sent = _fake_requests(monkeypatch)
+    chunks = list(iter_chunks(_course(200, 3), chunk_tokens=1500, overlap_tokens=0))
+    report = {}
+    cards, _ = generate_cards_chunked(None, chunks, 1000, report=report)
+    assert {n for _, n in sent} == {MAX_CHUNK_CANDIDATES}
+    assert len(cards) <= len(chunks) * MAX_CHUNK_CANDIDATES < 1000
+    assert report["shortfall"] == 1000 - len(cards)
+
+
+def test_smaller_deck_reuses_larger_cached_chunks(monkeypatch):
+    sent = _fake_requests(monkeypatch)
+    cache = TieredCache(10**7, None, 0)
+    chunks = list(iter_chunks(_course(200, 3), chunk_tokens=1500, overlap_tokens=0))
+    generate_cards_chunked(None, chunks, 200, cache=cache)
+    sent.clear()
+    report = {}
+    cards, _ = generate_cards_chunked(None, chunks, 120, cache=cache, report=report)
+    assert len(cards) == 120 and report["regenerated"] == 0 and not sent
+
+
+def test_chunk_cache_survives_new_chunks_and_deck_size(monkeypatch):
+    sent = _fake_requests(monkeypatch)
+    cache = TieredCache(10**7, None, 0)
+    paragraphs = _course(400, 4)
+    chunks = list(iter_chunks(paragraphs, chunk_tokens=1500, overlap_tokens=0))
+    report = {}
+    cards, _ = generate_cards_chunked(None, chunks, 20, cache=cache, report=report)
+    assert len(cards) == 20 and report["regenerated"] == len(chunks)
+
+    edited = list(iter_chunks(paragraphs + _course(100, 5), chunk_tokens=1500, overlap_tokens=0))
+    assert len(edited) > len(chunks)
+    sent.clear()
+    cards, _ = generate_cards_chunked(None, edited, 35, cache=cache, report=report)
+    assert len(cards) == 35
+    # Seuls les morceaux nouveaux (ou le dernier, prolongé) partent vers l'API.
+    assert report["regenerated"] == len(sent) == len(set(edited) - set(chunks))
+    assert report["regenerated"] < len(edited)
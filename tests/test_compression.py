@@ -0,0 +1,69 @@
+import pytest
+
+import offline_generator
+from offline_generator import compress_text
+from pdf_extraction import PAGE_SEPARATOR
+
+
+def _page(number, lines):
+    return "\n".join([f"Biologie cellulaire — L1 — page {number}", *lines, str(number)])
+
+
+def test_headers_and_page_numbers_are_removed_at_page_edges_only():
+    pages = [
+        _page(n, [f"La mitochondrie {n} produit l’ATP.", "12", f"Le noyau {n} contient l’ADN."])
+        for n in range(1, 6)
+    ]
+    report = {}
+    text = compress_text(PAGE_SEPARATOR.join(pages), 10_000, report=report)
+    assert "Biologie cellulaire" not in text
+    assert PAGE_SEPARATOR not in text
+    lines = text.splitlines()
+    assert "La mitochondrie 3 produit l’ATP." in lines
+    assert lines.count("12") == 5  # nombre au milieu d'une page : du contenu
+    assert report["removed_lines"] == 10
+
+
+def test_repeated_lines_inside_pages_are_kept():
+    pages = [
+        f"Chapitre {n}\nIntroduction {n}.\nDéfinition\nUne cellule {n} est l’unité du vivant.\nFin {n}."
+        for n in range(4)
+    ]
+    text = compress_text(PAGE_SEPARATOR.join(pages), 10_000)
+    assert text.splitlines().count("Définition") == 4
+
+
+def test_references_are_removed_only_in_the_bibliography():
+    text = "\n".join(
+        [
+            "Watson et al. ont décrit la double hélice en 1953 (Nature, vol. 171).",
+            "Bibliographie",
+            "Watson J. D. et al. (1953). Molecular structure. Nature, vol. 171, pp. 737-738.",
+            "[2] Alberts B. Biologie moléculaire de la cellule.",
+        ]
+    )
+    report = {}
+    compressed = compress_text(text, 10_000, report=report)
+    assert compressed == "Watson et al. ont décrit la double hélice en 1953 (Nature, vol. 171)."
+    assert report["removed_lines"] == 3
+
+
+def test_disabled_budget_only_removes_page_separators():
+    text = PAGE_SEPARATOR.join(["1", "Texte"])
+    report = {}
+    assert compress_text(text, 0, report=report) == "1\nTexte"
+    assert report["ratio"] == pytest.approx(1.0, abs=0.2)
+
+
+def test_long_text_keeps_the_most_salient_passages(monkeypatch):
+    # Mots-clés fixés : le classement ne dépend pas de YAKE.
+    concepts = [{"keyword": "mitochondrie", "score": 0.1}, {"keyword": "ribosome", "score": 0.2}]
+    monkeypatch.setattr(offline_generator, "_extract_concepts", lambda document, target: concepts)
+    filler = [f"Remarque {i} sans rapport avec le sujet du cours, répétée pour occuper la place. " * 3 for i in range(40)]
+    salient = ["La mitochondrie produit l’ATP grâce au ribosome voisin.", "Le ribosome traduit l’ARN messager."]
+    paragraphs = filler[:20] + [salient[0]] + filler[20:] + [salient[1]]
+    report = {}
+    text = compress_text("\n\n".join(paragraphs), 60, report=report)
+    assert text.split("\n\n")[:2] == salient  # passages entiers, dans l'ordre du document
+    assert report["compressed_tokens"] <= 60
+    assert report["kept_passages"] < report["passages"]
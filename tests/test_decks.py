@@ -0,0 +1,67 @@
+import pytest
+
+from decks import DeckStore, parse_deck_file
+
+
+def _cards(count):
+    return [
+        {"question": f"Question {i} : rôle de l’organite numéro {i} ?", "answer": f"Réponse détaillée {i}"}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DeckStore(str(tmp_path / "decks.sqlite3"))
+
+
+def test_replace_page_and_window(store):
+    cards = _cards(30)
+    assert store.replace_cards("u", "bio", cards) == 30
+    assert store.count("u", "bio") == 30
+    assert store.page("u", "bio", 10, 5) == cards[10:15]
+    window = store.window("u", "bio", 20, 20)
+    assert len(window) == 10 and 25 in window and 19 not in window
+    assert window.card(25) == (cards[25]["question"], cards[25]["answer"])
+    assert list(store.iter_cards("u", "bio", batch=7)) == cards
+
+
+def test_decks_are_per_user(store):
+    store.replace_cards("alice", "bio", _cards(3))
+    assert store.count("bob", "bio") == 0
+    assert store.list_decks("bob") == []
+
+
+def test_append_with_dedupe_skips_stored_near_duplicates(store):
+    cards = _cards(20)
+    store.replace_cards("u", "bio", cards)
+    repeated = [dict(cards[3], answer=cards[3]["answer"] + ".")]
+    fresh = [
+        {"question": "Que produit la photosynthèse ?", "answer": "Du glucose et du dioxygène."},
+        {"question": "Où se trouve l’ADN des eucaryotes ?", "answer": "Dans le noyau."},
+    ]
+    assert store.append_cards("u", "bio", repeated + fresh, dedupe=True) == 22
+    assert store.page("u", "bio", 20, 5) == fresh
+
+
+def test_dedupe_backfills_bands_of_older_decks(store):
+    cards = _cards(10)
+    store.replace_cards("u", "bio", cards)
+    store._conn.execute("DELETE FROM card_bands")  # jeu enregistré avant les clés de bande
+    assert store.append_cards("u", "bio", [cards[0]], dedupe=True) == 10
+    assert store._conn.execute("SELECT COUNT(DISTINCT position) FROM card_bands").fetchone()[0] == 10
+
+
+def test_delete_deck_removes_everything(store):
+    store.replace_cards("u", "bio", _cards(5))
+    store.delete_deck("u", "bio")
+    assert store.count("u", "bio") == 0
+    for table in ("cards", "card_bands", "card_state"):
+        assert store._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+
+
+@pytest.mark.parametrize("fmt", ["json", "csv"])
+def test_export_round_trip(store, fmt):
+    cards = _cards(4) + [{"question": 'Virgule, "guillemets"', "answer": "ligne 1\nligne 2"}]
+    store.replace_cards("u", "bio", cards)
+    assert parse_deck_file(store.export_deck("u", "bio", fmt), f"bio.{fmt}") == cards
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+from dedup import BANDS, NearDuplicateIndex, band_keys, card_text, dedupe_cards, signature, similarity
+
+CARD = {"question": "Quel est le rôle des mitochondries ?", "answer": "Elles produisent l’ATP de la cellule."}
+
+
+def test_near_duplicates_are_similar_and_distinct_cards_are_not():
+    variant = {
+        "question": "Quel est le RÔLE des mitochondrie ?",
+        "answer": "Elles produisent l'ATP de la cellule eucaryote !",
+    }
+    other = {"question": "Qu’est-ce que la photosynthèse ?", "answer": "La synthèse de glucose à partir de lumière."}
+    base = signature(card_text(CARD))
+    assert similarity(base, signature(card_text(variant))) >= 0.7
+    assert similarity(base, signature(card_text(other))) < 0.3
+
+
+def test_dedupe_cards_keeps_first_occurrence():
+    copy = dict(CARD, answer=CARD["answer"].upper())
+    other = {"question": "Où a lieu la glycolyse ?", "answer": "Dans le cytoplasme."}
+    assert dedupe_cards([CARD, copy, other]) == [CARD, other]
+    assert dedupe_cards([copy, other], existing=[CARD]) == [other]
+
+
+def test_index_rejects_near_duplicates():
+    index = NearDuplicateIndex()
+    assert index.add(card_text(CARD))
+    assert not index.add(card_text(CARD))
+    assert len(index) == 1
+
+
+def test_signature_and_band_keys_are_stable_across_processes():
+    code = (
+        "import sys; sys.path.insert(0, sys.argv[1]); from dedup import band_keys, signature; "
+        f"print(band_keys(signature({card_text(CARD)!r})))"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONHASHSEED="123")
+    output = subprocess.run(
+        [sys.executable, "-c", code, root], capture_output=True, text=True, env=env, check=True
+    ).stdout
+    keys = band_keys(signature(card_text(CARD)))
+    assert output.strip() == str(keys)
+    assert len(keys) == BANDS
+    assert all(0 <= key < 1 << 63 for key in keys)  # entiers SQLite
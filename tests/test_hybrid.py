@@ -0,0 +1,94 @@
+import threading
+import time
+
+from hybrid import STATUS_DONE, STATUS_FALLBACK, HybridDeck
+
+OFFLINE = [{"question": f"Hors ligne {i} ?", "answer": "réponse"} for i in range(5)]
+
+
+def _card(i):
+    return {"question": f"OpenAI {i} ?", "answer": "réponse"}
+
+
+def _wait_finished(deck, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not deck.finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert deck.finished
+
+
+def test_silent_api_falls_back_to_the_offline_deck():
+    release = threading.Event()
+    deck = HybridDeck("Biologie", OFFLINE, 5)
+
+    def produce(on_card):
+        release.wait(5)
+        on_card(_card(0))  # arrivée après le délai : ignorée
+        return [_card(0)]
+
+    deck.refine(produce, card_timeout=0.2)
+    _wait_finished(deck)
+    release.set()
+    version, status, cards = deck.snapshot()
+    assert status == STATUS_FALLBACK and isinstance(deck.error, TimeoutError)
+    assert cards == OFFLINE
+    time.sleep(0.1)
+    assert deck.snapshot() == (version, status, cards)
+
+
+def test_stall_between_cards_keeps_the_cards_already_received():
+    release = threading.Event()
+    deck = HybridDeck("Biologie", OFFLINE, 5)
+
+    def produce(on_card):
+        on_card(_card(0))
+        on_card(_card(1))
+        release.wait(5)
+        return [_card(i) for i in range(5)]
+
+    deck.refine(produce, card_timeout=0.3)
+    _wait_finished(deck)
+    release.set()
+    _, status, cards = deck.snapshot()
+    assert status == STATUS_FALLBACK
+    # Les cartes OpenAI remplacent les cartes hors ligne en partant de la fin.
+    assert cards == OFFLINE[:3] + [_card(1), _card(0)]
+
+
+def test_steady_cards_are_not_cut_by_the_watchdog():
+    deck = HybridDeck("Biologie", OFFLINE, 5)
+
+    def produce(on_card):
+        for i in range(5):
+            time.sleep(0.1)  # 0,5 s au total, plus que le délai, mais moins entre deux cartes
+            on_card(_card(i))
+        return [_card(i) for i in range(5)]
+
+    deck.refine(produce, card_timeout=0.3)
+    _wait_finished(deck)
+    _, status, cards = deck.snapshot()
+    assert status == STATUS_DONE and deck.error is None
+    assert cards == [_card(i) for i in range(5)]
+
+
+def test_api_error_falls_back_with_the_error():
+    deck = HybridDeck("Biologie", OFFLINE, 5)
+    failure = RuntimeError("quota dépassé")
+
+    def produce(on_card):
+        raise failure
+
+    deck.refine(produce, card_timeout=5)
+    _wait_finished(deck)
+    _, status, cards = deck.snapshot()
+    assert status == STATUS_FALLBACK and deck.error is failure
+    assert cards == OFFLINE
+
+
+def test_short_result_is_completed_with_offline_cards():
+    deck = HybridDeck("Biologie", OFFLINE, 5)
+    deck.refine(lambda on_card: [_card(0), _card(1)], card_timeout=5)
+    _wait_finished(deck)
+    _, status, cards = deck.snapshot()
+    assert status == STATUS_DONE
+    assert cards == [_card(0), _card(1)] + OFFLINE[:3]
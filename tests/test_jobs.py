@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from jobs import STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING, JobStore, split_card_budget
+
+
+def test_split_card_budget_is_proportional_and_exact():
+    assert split_card_budget(10, [1, 1]) == [5, 5]
+    assert split_card_budget(10, [3, 1, 1]) == [6, 2, 2]
+    shares = split_card_budget(7, [1, 1, 1])
+    assert sum(shares) == 7 and max(shares) - min(shares) == 1
+
+
+def test_split_card_budget_edge_cases():
+    assert split_card_budget(5, []) == []
+    assert split_card_budget(4, [0, 0]) == [2, 2]
+    assert split_card_budget(0, [2, 5]) == [0, 0]
+
+
+def _store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "files"))
+
+
+def test_claim_next_takes_oldest_job_for_owner(tmp_path):
+    store = _store(tmp_path)
+    first = store.enqueue("alice", "Biologie", 10, [("cours.pdf", b"%PDF")])
+    store.enqueue("alice", "Chimie", 10, [("cours.pdf", b"%PDF")])
+    job = store.claim_next("serveur-a")
+    assert job["id"] == first
+    row = store._conn.execute("SELECT status, owner FROM jobs WHERE id = ?", (first,)).fetchone()
+    assert tuple(row) == (STATUS_RUNNING, "serveur-a")
+
+
+def test_requeue_only_takes_back_expired_leases(tmp_path):
+    store = _store(tmp_path)
+    live = store.enqueue("alice", "A", 5, [])
+    stale = store.enqueue("alice", "B", 5, [])
+    store.claim_next("vivant")
+    store.claim_next("arrêté")
+    store._conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 600, stale))
+    assert store.requeue_interrupted(lease=60) == 1
+    statuses = dict(store._conn.execute("SELECT id, status FROM jobs").fetchall())
+    assert statuses == {live: STATUS_RUNNING, stale: STATUS_QUEUED}
+
+
+def test_heartbeat_keeps_the_lease(tmp_path):
+    store = _store(tmp_path)
+    job_id = store.enqueue("alice", "A", 5, [])
+    store.claim_next("serveur")
+    store._conn.execute("UPDATE jobs SET heartbeat_at = 0 WHERE id = ?", (job_id,))
+    store.heartbeat("serveur")
+    assert store.requeue_interrupted(lease=60) == 0
+
+
+def test_retry_redoes_the_steps_that_failed(tmp_path, monkeypatch):
+    import jobs
+
+    store = _store(tmp_path)
+    job_id = store.enqueue("alice", "Biologie", 4, [("a.pdf", b"%PDF-a"), ("b.pdf", b"%PDF-b")])
+    unreadable, rejected = {"a.pdf"}, {"b.pdf"}
+
+    def fake_pages(documents, on_error=None, **kwargs):
+        name = documents[0][0]
+        if name in unreadable:
+            on_error(RuntimeError(f"{name} illisible"))
+            return iter(())
+        return iter([f"Texte de {name}. " * 20])
+
+    def fake_generate(scheduler, paragraphs, n_cards, cache=None):
+        text = "".join(paragraphs)
+        if any(name in text for name in rejected):
+            return [], "", [RuntimeError("quota")]
+        return [(f"{text[:14]} {i} ?", "réponse") for i in range(n_cards)], "", []
+
+    monkeypatch.setattr(jobs, "iter_document_pages", fake_pages)
+    monkeypatch.setattr(jobs, "generate_deck", fake_generate)
+    monkeypatch.setattr(jobs, "iter_paragraphs", lambda pages: pages)
+    monkeypatch.setattr(jobs, "dedupe_cards", lambda cards: cards)
+
+    with pytest.raises(RuntimeError, match="quota"):
+        jobs.process_generation_job(store.claim_next("serveur"), store, scheduler=None)
+    store.fail(job_id, "quota")
+    assert [(f["chars"], f["cards"]) for f in store.job_files(job_id)] == [(None, None), (320, None)]
+
+    unreadable.clear()
+    rejected.clear()
+    store.retry("alice", job_id)
+    job = store.claim_next("serveur")
+    assert job["id"] == job_id
+    jobs.process_generation_job(job, store, scheduler=None)
+    cards = store.result("alice", job_id)
+    assert len(cards) == 4
+    assert {q.split(" ")[2] for q, _ in cards} == {"a.pdf", "b.pdf"}
+
+
+def test_jobs_are_private_to_their_user(tmp_path):
+    store = _store(tmp_path)
+    job_id = store.enqueue("alice", "Biologie", 5, [("cours.pdf", b"%PDF")])
+    other = store.enqueue("bob", "Chimie", 5, [])
+    store.fail(other, "quota")
+    store.retry("alice", other)
+    assert store.list_jobs("bob")[0]["status"] == STATUS_FAILED
+    store.finish(job_id, [("Q ?", "R")])
+    assert [job["deck"] for job in store.list_jobs("alice")] == ["Biologie"]
+    assert [job["deck"] for job in store.list_jobs("bob")] == ["Chimie"]
+    assert store.result("bob", job_id) == []
+    store.delete("bob", job_id)
+    assert store.result("alice", job_id) == [["Q ?", "R"]]
+    assert (tmp_path / "files" / str(job_id) / "0.pdf").exists()
+    store.delete("alice", job_id)
+    assert store.list_jobs("alice") == []
+    assert not (tmp_path / "files" / str(job_id)).exists()
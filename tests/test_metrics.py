@@ -0,0 +1,84 @@
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import METRICS, Metrics, start_exporter
+
+
+def _stage(metrics, stage):
+    return metrics.snapshot()["stages"].get(stage, {"count": 0})
+
+
+def test_span_counts_errors_and_still_times_the_block():
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.span("extraction"):
+            raise ValueError("PDF illisible")
+    assert _stage(metrics, "extraction")["count"] == 1
+    assert 'flashcards_stage_errors_total{stage="extraction"} 1' in metrics.render_prometheus()
+
+
+def test_timed_records_failing_and_abandoned_streams():
+    metrics = Metrics()
+
+    def failing():
+        yield "page 1"
+        raise OSError("fichier tronqué")
+
+    with pytest.raises(OSError):
+        list(metrics.timed(failing(), "extraction"))
+    assert _stage(metrics, "extraction")["count"] == 1
+
+    stream = metrics.timed(iter(range(10)), "ocr")
+    assert next(stream) == 0
+    stream.close()  # consommateur qui abandonne le flux
+    assert _stage(metrics, "ocr")["count"] == 1
+
+
+def test_failing_collector_does_not_break_the_export():
+    metrics = Metrics()
+
+    def broken():
+        raise RuntimeError("cache fermé")
+
+    metrics.register_collector(broken)
+    metrics.register_collector(lambda: [("flashcards_cache_lookups", {"cache": "pages"}, 3)])
+    text = metrics.render_prometheus()
+    assert 'flashcards_cache_lookups{cache="pages"} 3' in text
+    assert metrics.snapshot()["gauges"] == [("flashcards_cache_lookups", {"cache": "pages"}, 3)]
+
+
+def test_concurrent_updates_are_not_lost():
+    metrics = Metrics()
+
+    def work():
+        for _ in range(1000):
+            metrics.inc("flashcards_openai_retries_total", error="RateLimitError")
+            metrics.record_usage("gpt-4o-mini", None)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    openai = metrics.snapshot()["openai"]
+    assert openai["retries"] == openai["requests"] == 8000
+    assert openai["cost_usd"] == 0
+
+
+def test_exporter_serves_metrics_only():
+    METRICS.inc("flashcards_openai_retries_total", error="APITimeoutError")
+    server = start_exporter(0, host="127.0.0.1")
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(base + "/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+        assert 'flashcards_openai_retries_total{error="APITimeoutError"}' in body
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(base + "/", timeout=5)
+        assert excinfo.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,45 @@
+import pytest
+
+import fake_workers
+import ocr
+from caching import TieredCache
+from ocr import OcrPool
+from pdf_extraction import _terminate
+
+TEXT = "Une page avec une vraie couche texte."
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ocr, "_ocr_page", fake_workers.ocr_page)
+    pools = []
+
+    def _make(**kwargs):
+        pools.append(OcrPool(max_workers=1, **kwargs))
+        return pools[-1]
+
+    yield _make
+    for p in pools:
+        if p._executor is not None:
+            _terminate(p._executor)  # workers bloqués compris
+
+
+def test_ocr_cache_depends_on_the_language(pool):
+    cache = TieredCache(10**7, None, 0)
+    pages = ["", TEXT]
+    assert list(pool(lang="fra").fill_pages(b"%PDF", "d", pages, cache)) == ["ocr 0 fra", TEXT]
+    assert list(pool(lang="eng").fill_pages(b"%PDF", "d", pages, cache)) == ["ocr 0 eng", TEXT]
+
+
+def test_ocr_timeout_keeps_the_original_page(pool):
+    cache = TieredCache(10**7, None, 0)
+    ocr_pool = pool(lang="fra", page_timeout=0.5)
+    assert list(ocr_pool.fill_pages(b"%PDF", "d", ["", " 2 ", TEXT], cache)) == ["ocr 0 fra", " 2 ", TEXT]
+    assert cache.get(ocr.ocr_cache_key("d", 1, ocr_pool.dpi, "fra")) is None
+
+
+def test_dead_ocr_worker_is_replaced(pool):
+    ocr_pool = pool(lang="fra")
+    assert list(ocr_pool.fill_pages(b"%PDF", "d", [TEXT, TEXT, ""])) == [TEXT, TEXT, ""]
+    assert ocr_pool._executor is None
+    assert list(ocr_pool.fill_pages(b"%PDF", "d", [""])) == ["ocr 0 fra"]
@@ -0,0 +1,105 @@
+from concurrent.futures.process import BrokenProcessPool
+
+import offline_generator
+from dedup import dedupe_cards
+from offline_generator import ParagraphIndex, build_flashcards_from_text
+
+
+def _index(paragraphs):
+    return ParagraphIndex([p.lower() for p in paragraphs])
+
+
+def _naive_find(paragraphs, keyword):
+    return next((i for i, p in enumerate(paragraphs) if keyword.lower() in p.lower()), None)
+
+
+PARAGRAPHS = [
+    "La cellule est l'unité du vivant.",
+    "La membrane plasmique entoure la cellule.",
+    "Les mitochondries produisent l'ATP de la cellule.",
+    "La respiration cellulaire consomme du glucose.",
+    "La membrane mitochondriale interne porte la chaîne respiratoire.",
+]
+
+
+def test_find_returns_first_paragraph_with_every_word():
+    index = _index(PARAGRAPHS)
+    assert index.find("membrane") == 1
+    assert index.find("Membrane mitochondriale") == 4
+    assert index.find("ATP") == 2
+
+
+def test_find_requires_the_exact_phrase():
+    # Tous les mots sont dans le paragraphe 1, mais pas dans cet ordre.
+    assert _index(PARAGRAPHS).find("cellule entoure") is None
+
+
+def test_find_falls_back_to_substring_inside_words():
+    index = _index(PARAGRAPHS)
+    assert index.find("cellulaire") == 3
+    assert index.find("mitochondri") == 2
+    assert index.find("absent") is None
+
+
+def test_find_matches_a_linear_scan():
+    paragraphs = [f"mot{i % 7} mot{i % 5} commun mot{i % 3}" for i in range(200)]
+    index = _index(paragraphs)
+    for keyword in ("mot4 mot3", "commun mot2", "mot6 mot4 commun", "mot1", "commun"):
+        assert index.find(keyword) == _naive_find(paragraphs, keyword)
+
+
+COURSE = "\n\n".join(
+    f"Le chapitre {i} décrit l’organite {name}. Il assure la fonction {role} dans la cellule. "
+    f"Sans lui, la cellule perd sa capacité de {role}."
+    for i, (name, role) in enumerate(
+        [
+            ("noyau", "stockage de l’ADN"),
+            ("mitochondrie", "respiration"),
+            ("chloroplaste", "photosynthèse"),
+            ("ribosome", "traduction"),
+            ("lysosome", "digestion"),
+            ("appareil de Golgi", "maturation des protéines"),
+        ]
+    )
+)
+
+
+def test_builder_reaches_n_cards_without_near_duplicates():
+    cards = build_flashcards_from_text(COURSE, 20)
+    assert len(cards) == 20
+    assert dedupe_cards(cards) == cards
+
+
+def test_builder_count_grows_with_n_cards():
+    # Au-delà de ce que le texte peut fournir, le nombre de cartes plafonne sans diminuer.
+    counts = [len(build_flashcards_from_text(COURSE, n)) for n in (5, 10, 20, 40, 80, 160)]
+    assert counts == sorted(counts)
+    assert counts[:3] == [5, 10, 20]
+
+
+class _DeadPool:
+    def __init__(self):
+        self.shut_down = False
+
+    def map(self, *args):
+        raise BrokenProcessPool("worker mort")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_broken_keyword_pool_is_replaced_and_sections_run_here(monkeypatch):
+    dead = _DeadPool()
+    monkeypatch.setattr(offline_generator, "_KEYWORD_POOL", dead)
+    monkeypatch.setattr(offline_generator, "KEYWORD_WORKERS", 2)
+    monkeypatch.setattr(
+        offline_generator, "_section_keywords", lambda text, top: [("mitochondrie", 0.1), ("cellule", 0.2)]
+    )
+    paragraphs = [f"Paragraphe {i} sur la mitochondrie et la cellule. " * 40 for i in range(40)]
+    document = offline_generator.Document("\n\n".join(paragraphs))
+    assert len(offline_generator._keyword_sections(document)) > 1
+
+    keywords = offline_generator.extract_keywords(document, top=5)
+    assert [keyword for keyword, _ in keywords] == ["mitochondrie", "cellule"]
+    assert dead.shut_down
+    assert offline_generator._KEYWORD_POOL is None
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from generation import CardStreamParser, GenerationError, parse_cards
+
+CARDS = [
+    {"question": "Qu’est-ce qu’une « cellule » ?", "answer": "L’unité du vivant {toujours}."},
+    {"question": "Rôle de l'ATP ?", "answer": "Stocker l'énergie.\nVoir \"métabolisme\"."},
+]
+
+
+def test_stream_parser_emits_each_card_when_its_object_closes():
+    raw = "```json\n" + json.dumps({"cards": CARDS}, ensure_ascii=False) + "\n```"
+    parser = CardStreamParser()
+    received = []
+    for i in range(0, len(raw), 7):
+        received.extend(parser.feed(raw[i : i + 7]))
+    assert received == CARDS
+    assert parser.complete
+    assert parser.dropped == 0
+
+
+def test_stream_parser_emits_card_before_the_array_ends():
+    parser = CardStreamParser()
+    assert parser.feed('[{"question": "Q1", "answer": "R1"}, {"question": "Q2"') == [
+        {"question": "Q1", "answer": "R1"}
+    ]
+    assert not parser.complete
+
+
+def test_stream_parser_ignores_braces_inside_strings():
+    parser = CardStreamParser()
+    cards = parser.feed('[{"question": "a } b", "answer": "c \\" } d"}]')
+    assert cards == [{"question": "a } b", "answer": 'c " } d'}]
+
+
+def test_stream_parser_counts_invalid_objects():
+    parser = CardStreamParser()
+    assert parser.feed('[{"question": "sans réponse"}, {"q": "Q", "a": "R"}]') == [
+        {"question": "Q", "answer": "R"}
+    ]
+    assert parser.dropped == 1
+
+
+def test_parse_cards_accepts_object_or_list():
+    assert parse_cards(json.dumps({"cards": CARDS})) == CARDS
+    assert parse_cards(json.dumps(CARDS)) == CARDS
+
+
+def test_parse_cards_salvages_truncated_output():
+    raw = json.dumps({"cards": CARDS})
+    truncated = raw[: raw.rindex("{") + 15]
+    assert parse_cards(truncated) == CARDS[:1]
+
+
+def test_parse_cards_raises_when_nothing_is_usable():
+    with pytest.raises(GenerationError) as excinfo:
+        parse_cards('{"cards": [{"question": "tronqu')
+    assert excinfo.value.raw
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+import fake_workers
+import pdf_extraction
+from pdf_extraction import ExtractionPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pdf_extraction, "_count_pages", fake_workers.count_pages)
+    monkeypatch.setattr(pdf_extraction, "_extract_page_range", fake_workers.extract_page_range)
+    pools = []
+
+    def _make(**kwargs):
+        pools.append(ExtractionPool(**kwargs))
+        return pools[-1]
+
+    yield _make
+    for p in pools:
+        p.shutdown()
+
+
+def test_slow_consumer_does_not_time_out_later_pages(pool):
+    extraction = pool(max_workers=1, timeout=1.0, pages_per_task=1)
+    pages = []
+    for doc, text in extraction.iter_pages([fake_workers.fake_pdf(6, delay=0.3)]):
+        pages.append((doc, text))
+        if len(pages) == 1:
+            time.sleep(1.2)  # OCR d'une page scannée : plus long que le délai d'extraction
+    assert pages == [(0, f"page {i}") for i in range(6)]
+
+
+def test_stuck_document_times_out_and_its_worker_is_stopped(pool, monkeypatch):
+    terminated = []
+    terminate = pdf_extraction._terminate
+
+    def _record(executor):
+        terminated.append((executor, list(executor._processes.values())))
+        terminate(executor)
+
+    monkeypatch.setattr(pdf_extraction, "_terminate", _record)
+    extraction = pool(max_workers=2, timeout=1.0, pages_per_task=2)
+    documents = [fake_workers.fake_pdf(4, hang=1), fake_workers.fake_pdf(5)]
+    results = list(extraction.iter_pages(documents))
+    assert results == [(0, None)] + [(1, f"page {i}") for i in range(5)]
+    # Le pool du worker bloqué est écarté puis arrêté ; un pool neuf sert la suite.
+    [(executor, processes)] = terminated
+    assert executor is not extraction._executor
+    for process in processes:
+        process.join(timeout=5)
+        assert not process.is_alive()
+
+
+def test_failing_document_does_not_recycle_the_pool(pool):
+    extraction = pool(max_workers=2, timeout=5.0, pages_per_task=2)
+    documents = [fake_workers.fake_pdf(4, fail=1), fake_workers.fake_pdf(3)]
+    assert list(extraction.iter_pages(documents)) == [(0, None), (1, "page 0"), (1, "page 1"), (1, "page 2")]
+    executor = extraction._executor
+    assert list(extraction.iter_pages([fake_workers.fake_pdf(1)])) == [(0, "page 0")]
+    assert extraction._executor is executor
+
+
+def test_dead_worker_fails_the_remaining_documents_once(pool):
+    extraction = pool(max_workers=1, timeout=5.0, pages_per_task=2)
+    documents = [fake_workers.fake_pdf(2), fake_workers.fake_pdf(2, crash=1), fake_workers.fake_pdf(2)]
+    results = list(extraction.iter_pages(documents))
+    assert results[:2] == [(0, "page 0"), (0, "page 1")]
+    assert results[2:] == [(1, None), (2, None)]
+    assert extraction._executor is None
+    assert list(extraction.iter_pages([fake_workers.fake_pdf(1)])) == [(0, "page 0")]
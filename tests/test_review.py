@@ -0,0 +1,138 @@
+import time
+
+import pytest
+
+import review
+from decks import DEFAULT_EASE, DeckStore
+from review import (
+    DAY,
+    GRADE_AGAIN,
+    GRADE_EASY,
+    GRADE_GOOD,
+    GRADE_HARD,
+    MIN_EASE,
+    RELEARN_DELAY,
+    CardState,
+    ReviewSession,
+    sm2,
+)
+
+# Les cartes neuves sont dues à leur date d'enregistrement : les notes sont données après.
+NOW = time.time() + 60
+
+
+def test_sm2_intervals_grow_after_each_success():
+    state = CardState(0)
+    intervals = []
+    for _ in range(4):
+        state = sm2(state, GRADE_GOOD, NOW)
+        intervals.append(state.interval)
+    assert intervals[:2] == [1.0, 6.0]
+    assert intervals[2] == pytest.approx(6.0 * DEFAULT_EASE)
+    assert state.due == pytest.approx(NOW + intervals[-1] * DAY)
+    assert state.ease == pytest.approx(DEFAULT_EASE)
+
+
+def test_sm2_lapse_resets_and_lowers_ease():
+    state = sm2(sm2(CardState(0), GRADE_EASY, NOW), GRADE_EASY, NOW)
+    lapsed = sm2(state, GRADE_AGAIN, NOW)
+    assert (lapsed.repetitions, lapsed.interval, lapsed.lapses) == (0, 0.0, 1)
+    assert lapsed.due == NOW + RELEARN_DELAY
+    assert lapsed.ease < state.ease
+
+
+def test_sm2_ease_has_a_floor():
+    state = CardState(0)
+    for _ in range(20):
+        state = sm2(state, GRADE_HARD, NOW)
+    assert state.ease == MIN_EASE
+
+
+def _cards(count):
+    return [{"question": f"Question {i} sur l’organite {i}", "answer": f"Réponse {i}"} for i in range(count)]
+
+
+def _states(store):
+    rows = store._conn.execute("SELECT position, ease, interval, repetitions, lapses, due FROM card_state")
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DeckStore(str(tmp_path / "decks.sqlite3"))
+
+
+def test_session_serves_cards_by_due_date(store):
+    store.replace_cards("u", "bio", _cards(5))
+    session = ReviewSession(store, "u", "bio", prefetch=2)
+    seen = []
+    for _ in range(5):
+        state = session.next_due()
+        seen.append(state.position)
+        session.grade(state.position, GRADE_GOOD, now=NOW)
+    assert seen == [0, 1, 2, 3, 4]
+    # Toutes notées « bien » : la prochaine échéance est dans un jour.
+    assert session.next_due().due == pytest.approx(NOW + DAY)
+
+
+def test_failed_card_comes_back_in_the_session(store):
+    store.replace_cards("u", "bio", _cards(3))
+    session = ReviewSession(store, "u", "bio")
+    session.grade(0, GRADE_AGAIN, now=NOW)
+    session.grade(1, GRADE_GOOD, now=NOW)
+    session.grade(2, GRADE_GOOD, now=NOW)
+    assert session.next_due().position == 0
+
+
+def test_grades_are_written_in_batches(store):
+    store.replace_cards("u", "bio", _cards(5))
+    session = ReviewSession(store, "u", "bio", flush_every=3)
+    session.grade(0, GRADE_GOOD, now=NOW)
+    session.grade(1, GRADE_GOOD, now=NOW)
+    assert store._conn.execute("SELECT COUNT(*) FROM review_log").fetchone()[0] == 0
+    session.grade(2, GRADE_GOOD, now=NOW)
+    assert store._conn.execute("SELECT COUNT(*) FROM review_log").fetchone()[0] == 3
+
+
+def test_flush_if_due_writes_after_the_delay(store, monkeypatch):
+    store.replace_cards("u", "bio", _cards(2))
+    clock = [100.0]
+    monkeypatch.setattr(review.time, "monotonic", lambda: clock[0])
+    session = ReviewSession(store, "u", "bio")
+    session.grade(0, GRADE_GOOD, now=NOW)
+    session.flush_if_due()
+    assert session._events
+    clock[0] += review.FLUSH_AFTER_SECONDS
+    session.flush_if_due()
+    assert not session._events
+    assert _states(store)[0][2] == 1
+
+
+def test_replace_keeps_state_and_history_of_unchanged_cards(store):
+    cards = _cards(6)
+    store.replace_cards("u", "bio", cards)
+    session = ReviewSession(store, "u", "bio")
+    session.grade(2, GRADE_GOOD, now=NOW)
+    session.grade(4, GRADE_AGAIN, now=NOW)
+    session.flush()
+    before = _states(store)
+
+    # Carte 0 retirée, carte 4 modifiée, nouvelle carte en fin de jeu.
+    edited = cards[1:4] + [dict(cards[4], answer="Réponse corrigée")] + cards[5:] + _cards(7)[6:]
+    store.replace_cards("u", "bio", edited)
+    after = _states(store)
+    assert after[1] == before[2]  # carte 2, désormais en position 1
+    assert after[3][2:4] == (0, 0)  # carte modifiée : repart de zéro
+    assert after[5][2] == 0  # nouvelle carte
+    log = sorted(tuple(row) for row in store._conn.execute("SELECT position, grade FROM review_log"))
+    assert log == [(-1, GRADE_AGAIN), (1, GRADE_GOOD)]
+
+
+def test_pending_grades_survive_a_replace_after_flush(store):
+    cards = _cards(3)
+    store.replace_cards("u", "bio", cards)
+    session = ReviewSession(store, "u", "bio")
+    session.grade(1, GRADE_GOOD, now=NOW)
+    session.flush()
+    store.replace_cards("u", "bio", list(reversed(cards)))
+    assert _states(store)[1][2] == 1  # la carte 1 est restée au milieu
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from openai_scheduler import TokenBucket, _retry_after, is_quota_error
+
+
+def test_bucket_serves_a_full_minute_without_waiting():
+    async def scenario():
+        bucket = TokenBucket(120)
+        start = time.monotonic()
+        for _ in range(120):
+            await bucket.acquire(1)
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) < 0.5
+
+
+def test_bucket_waits_for_refill_when_empty():
+    async def scenario():
+        bucket = TokenBucket(600)  # 10 jetons par seconde
+        await bucket.acquire(600)
+        start = time.monotonic()
+        await bucket.acquire(2)
+        return time.monotonic() - start
+
+    assert 0.15 <= asyncio.run(scenario()) < 1.0
+
+
+def test_bucket_clamps_requests_larger_than_capacity():
+    async def scenario():
+        bucket = TokenBucket(60)
+        await asyncio.wait_for(bucket.acquire(10_000), timeout=1)
+        return bucket.tokens
+
+    assert asyncio.run(scenario()) < 1
+
+
+def test_refund_is_capped_at_capacity():
+    async def scenario():
+        bucket = TokenBucket(100)
+        await bucket.acquire(30)
+        bucket.refund(20)
+        tokens_after_refund = bucket.tokens
+        bucket.refund(1_000)
+        return tokens_after_refund, bucket.tokens
+
+    after_refund, capped = asyncio.run(scenario())
+    assert 90 <= after_refund <= 91
+    assert capped == 100
+
+
+def test_quota_errors_are_not_transient():
+    assert is_quota_error(SimpleNamespace(code="insufficient_quota"))
+    assert not is_quota_error(SimpleNamespace(code="rate_limit_exceeded"))
+    assert not is_quota_error(ValueError())
+
+
+def test_retry_after_header():
+    error = SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "2.5"}))
+    assert _retry_after(error) == 2.5
+    assert _retry_after(SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "bientôt"}))) is None
+    assert _retry_after(ValueError()) is None
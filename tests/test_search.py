@@ -0,0 +1,70 @@
+import pytest
+
+from decks import DeckStore
+from search import fts_query, normalize, stem
+
+
+@pytest.mark.parametrize(
+    "word, root",
+    [
+        ("mitochondries", "mitochondri"),
+        ("mitochondrie", "mitochondri"),
+        ("chevaux", "cheval"),
+        ("energetiques", "energetiqu"),
+        ("traduire", "traduir"),
+        ("cellules", "cellul"),
+        ("cellule", "cellul"),
+        ("adn", "adn"),
+    ],
+)
+def test_stem(word, root):
+    assert stem(word) == root
+
+
+def test_normalize_folds_accents_elisions_and_stopwords():
+    assert normalize("L’énergie des Mitochondries") == normalize("energie mitochondrie")
+    assert normalize("qu’il est dans la cellule") == "cellul"
+
+
+def test_fts_query_ands_terms_and_prefixes_the_last():
+    assert fts_query("Les mitochondries produisent") == '"mitochondri" AND "produisent"*'
+    assert fts_query("ADN de la cellule") == '"adn" AND "cellul"*'
+    assert fts_query("la cellule et l’ADN") == '"cellul" AND "adn"*'
+    assert fts_query("de la") is None
+    # Syntaxe FTS5 de l'utilisateur neutralisée : tout terme est entre guillemets.
+    assert fts_query('"noyau" OR adn*') == '"noyau" AND "or" AND "adn"*'
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DeckStore(str(tmp_path / "decks.sqlite3"))
+    if not store.search_enabled:
+        pytest.skip("SQLite sans FTS5")
+    return store
+
+
+def test_search_is_scoped_to_the_user_and_ranked(store):
+    store.replace_cards("alice", "bio", [
+        {"question": "Rôle des mitochondries ?", "answer": "Produire l’ATP."},
+        {"question": "Qu’est-ce qu’un ribosome ?", "answer": "Il traduit l’ARN, près des mitochondries parfois."},
+    ])
+    store.replace_cards("bob", "bio", [{"question": "La mitochondrie", "answer": "Centrale énergétique."}])
+    store.replace_cards("alice", "chimie", [{"question": "Réaction", "answer": "Sans rapport."}])
+    store.replace_sources("alice", "chimie", [("cours.pdf", ["Les mitochondries respirent."])])
+
+    results = store.search("alice", "mitochondrie")
+    assert [(r["deck"], r["kind"], r["position"]) for r in results][0] == ("bio", "card", 0)
+    assert {(r["deck"], r["kind"]) for r in results} == {("bio", "card"), ("chimie", "source")}
+    assert all(r["score"] > 0 for r in results)
+    assert [r["kind"] for r in store.search("alice", "mitochondrie", kinds=("source",))] == ["source"]
+    assert [r["deck"] for r in store.search("bob", "mitoch")] == ["bio"]
+    assert store.search("carol", "mitochondrie") == []
+
+
+def test_search_follows_replace_and_delete(store):
+    store.replace_cards("u", "bio", [{"question": "Le noyau", "answer": "Contient l’ADN."}])
+    store.replace_cards("u", "bio", [{"question": "Le ribosome", "answer": "Traduit l’ARN."}])
+    assert store.search("u", "noyau") == []
+    assert len(store.search("u", "ribosome")) == 1
+    store.delete_deck("u", "bio")
+    assert store.search("u", "ribosome") == []